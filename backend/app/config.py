@@ -26,6 +26,43 @@ class Settings(BaseSettings):
     admin_username: str | None = Field(None, alias="ADMIN_USERNAME")
     admin_password_hash: str | None = Field(None, alias="ADMIN_PASSWORD_HASH")
 
+    # DNS query history ring buffer (rows; ~16 bytes each plus one copy of each distinct name)
+    dns_history_capacity: int = Field(200000, alias="DNS_HISTORY_CAPACITY")
+    # DNS first-seen tracking: exact LRU size, domains per bloom generation, new-domain index bounds
+    dns_recent_domains: int = Field(50000, alias="DNS_RECENT_DOMAINS")
+    dns_seen_capacity: int = Field(500000, alias="DNS_SEEN_CAPACITY")
+    dns_new_domains_max: int = Field(20000, alias="DNS_NEW_DOMAINS_MAX")
+    dns_new_domains_retention: int = Field(24 * 3600, alias="DNS_NEW_DOMAINS_RETENTION")
+    # Persistent DNS query log (hourly segments under APP_DATA_DIR/dnslog)
+    dns_log_enabled: bool = Field(True, alias="DNS_LOG_ENABLED")
+    dns_log_budget_mb: int = Field(64, alias="DNS_LOG_BUDGET_MB")
+    dns_log_retention_days: int = Field(30, alias="DNS_LOG_RETENTION_DAYS")
+
+    # LLM threat analysis pipeline: pending-event queue, events per prompt, request limits
+    llm_queue_size: int = Field(256, alias="LLM_QUEUE_SIZE")
+    llm_batch_size: int = Field(8, alias="LLM_BATCH_SIZE")
+    llm_timeout: float = Field(20.0, alias="LLM_TIMEOUT")
+    llm_max_retries: int = Field(2, alias="LLM_MAX_RETRIES")
+    # Cached LLM verdicts per normalized message signature
+    verdict_cache_ttl: int = Field(6 * 3600, alias="VERDICT_CACHE_TTL")
+    verdict_cache_size: int = Field(5000, alias="VERDICT_CACHE_SIZE")
+    # Alert coalescing per (source, kind, key): aggregation window, token bucket burst and refill period
+    alert_window_seconds: int = Field(60, alias="ALERT_WINDOW_SECONDS")
+    alert_burst: int = Field(3, alias="ALERT_BURST")
+    alert_refill_seconds: float = Field(120.0, alias="ALERT_REFILL_SECONDS")
+    # Persistent threat event store (APP_DATA_DIR/threats.db)
+    threat_retention_days: int = Field(90, alias="THREAT_RETENTION_DAYS")
+    threat_max_events: int = Field(200000, alias="THREAT_MAX_EVENTS")
+    # NIC traffic sampling: seconds between samples, counter source (auto|sysfs|netlink|psutil),
+    # and interface allowlist (fnmatch patterns; empty = all but loopback/virtual, plus router interfaces)
+    stats_sample_interval: float = Field(0.5, alias="STATS_SAMPLE_INTERVAL")
+    stats_counter_source: str = Field("auto", alias="STATS_COUNTER_SOURCE")
+    stats_interfaces: List[str] = Field(default_factory=list, alias="STATS_INTERFACES")
+    # Auto-block TTLs in seconds for the 1st, 2nd, ... offence of an address (0 = permanent)
+    auto_block_ttls: List[int] = Field(default_factory=lambda: [3600, 6 * 3600, 24 * 3600, 7 * 24 * 3600], alias="AUTO_BLOCK_TTLS")
+    # Live dashboard push: queued messages per connection before it is dropped as a slow consumer
+    live_queue_size: int = Field(64, alias="LIVE_QUEUE_SIZE")
+
     def get_wan_credentials(self) -> List[tuple[str, Optional[str]]]:
         pairs: List[tuple[str, Optional[str]]] = []
         for i, ssid in enumerate(self.wifi_wan_ssids):
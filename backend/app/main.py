@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -11,13 +13,22 @@ from .routes.auth import router as auth_router
 from .routes.settings import router as settings_router
 from .routes.stats import router as stats_router
 from .routes.router import router as router_cfg_router
+from .routes.live import router as live_router
 from .services.interface_manager import interface_manager
 from .services.stats_service import stats_service
 from .services.dns_monitor import dns_monitor
+from .services.dns_log_store import dns_log_store
 from .services.suricata_monitor import suricata_monitor
+from .services.threat_detector import threat_detector
+from .services.alert_coalescer import alert_coalescer
+from .services.firewall import firewall
+from .services.blocklist_store import blocklist_store
+from .services.feed_manager import feed_manager
 from .services.flow_monitor import flow_monitor
 from .services.activity_monitor import activity_monitor
 from .services.longterm_service import longterm_service
+from .services.percentile_service import percentile_service
+from .services.live_hub import live_hub
 
 
 app = FastAPI(title="Router Geist 2")
@@ -33,17 +44,28 @@ app.add_middleware(
 
 @app.on_event("startup")
 async def on_startup() -> None:
+    await live_hub.start()
     await interface_manager.start()
     await stats_service.start()
+    await dns_log_store.start()
     await dns_monitor.start()
+    await blocklist_store.start()
+    await firewall.start()
+    # Reboots empty the kernel sets: put the persisted blocklist back in one transaction
+    report = await firewall.reconcile(blocklist_store.collapsed())
+    print(f"[firewall] blocklist restore: {report}")
+    await feed_manager.start()
+    await threat_detector.start()
+    await alert_coalescer.start()
     await suricata_monitor.start()
     await flow_monitor.start()
     await activity_monitor.start()
     await longterm_service.start()
+    await percentile_service.start()
     # Auto-apply router config at boot to bring up AP and NAT
     try:
         from .services.router_apply import apply_router_config
-        apply_router_config()
+        await asyncio.to_thread(apply_router_config, blocklist_store.collapsed())
     except Exception:
         pass
 
@@ -53,10 +75,18 @@ async def on_shutdown() -> None:
     await interface_manager.stop()
     await stats_service.stop()
     await dns_monitor.stop()
+    await dns_log_store.stop()
     await suricata_monitor.stop()
     await flow_monitor.stop()
     await activity_monitor.stop()
     await longterm_service.stop()
+    await percentile_service.stop()
+    await alert_coalescer.stop()
+    await threat_detector.stop()
+    await feed_manager.stop()
+    await firewall.stop()
+    await blocklist_store.stop()
+    await live_hub.stop()
 
 
 app.include_router(interfaces_router, prefix="/api/interfaces", tags=["interfaces"])
@@ -68,6 +98,7 @@ from .routes.security import router as security_router
 app.include_router(security_router, prefix="/api/security", tags=["security"])
 app.include_router(stats_router, prefix="/api/stats", tags=["stats"])
 app.include_router(router_cfg_router, prefix="/api/router", tags=["router"])
+app.include_router(live_router, prefix="/api/live", tags=["live"])
 
 import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -13,6 +13,10 @@ class ThreatEvent(BaseModel):
     ip: Optional[str] = None
     action: Optional[str] = None  # e.g., "blocked_ip", "none"
     context: Optional[Dict[str, Any]] = None
+    # Coalesced alerts: how many occurrences this event stands for, and their time span
+    count: int = 1
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
 
 
 class AnalyzeRequest(BaseModel):
@@ -22,5 +26,8 @@ class AnalyzeRequest(BaseModel):
 
 class ThreatsResponse(BaseModel):
     events: List[ThreatEvent]
+    # Pass back as `cursor` to get only events created or updated since this page
+    cursor: Optional[int] = None
+    more: bool = False
 
 
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Dict
+from urllib.parse import urlparse
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+
+from ..security.auth import SESSION_COOKIE, require_auth, session_user
+from ..services.live_hub import TOPICS, Subscriber, live_hub
+
+
+router = APIRouter()
+
+
+def _same_origin(websocket: WebSocket) -> bool:
+    # Browsers always send Origin on WebSocket handshakes; refuse pages from other sites
+    origin = websocket.headers.get("origin")
+    if not origin:
+        return True
+    return urlparse(origin).netloc == websocket.headers.get("host")
+
+
+async def _send_loop(websocket: WebSocket, sub: Subscriber) -> None:
+    while True:
+        message = await sub.queue.get()
+        if message is None:
+            # Fell behind: the client reconnects and resyncs
+            await websocket.close(code=1013)
+            return
+        await websocket.send_text(message)
+
+
+async def _receive_loop(websocket: WebSocket, sub: Subscriber) -> None:
+    while True:
+        text = await websocket.receive_text()
+        try:
+            msg = json.loads(text)
+        except ValueError:
+            continue
+        if not isinstance(msg, dict):
+            continue
+        live_hub.subscribe(sub, [t for t in msg.get("subscribe") or [] if isinstance(t, str)])
+        live_hub.unsubscribe(sub, [t for t in msg.get("unsubscribe") or [] if isinstance(t, str)])
+
+
+@router.websocket("/ws")
+async def live_ws(websocket: WebSocket) -> None:
+    """Live updates for the dashboard.
+
+    Client sends {"subscribe": [topics]} / {"unsubscribe": [topics]}; the server pushes
+    {"topic": name, "items": [...]} batches. Topics: traffic, activity, threats, dns, interfaces, blocklist.
+    """
+    if not session_user(websocket.cookies.get(SESSION_COOKIE)) or not _same_origin(websocket):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    sub = live_hub.connect()
+    tasks = [
+        asyncio.create_task(_send_loop(websocket, sub)),
+        asyncio.create_task(_receive_loop(websocket, sub)),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        live_hub.disconnect(sub)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, WebSocketDisconnect, Exception):
+                # Socket already closed by either side
+                pass
+
+
+@router.get("/stats", dependencies=[Depends(require_auth)])
+async def live_stats() -> Dict[str, Any]:
+    return {"topics": list(TOPICS), **live_hub.stats()}
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Any, Dict, List
 
 from fastapi import APIRouter, Depends, HTTPException
@@ -8,6 +9,7 @@ from pydantic import BaseModel
 from ..security.auth import require_auth
 from ..services.router_config_store import router_config_store
 from ..services.router_apply import apply_router_config
+from ..services.blocklist_store import blocklist_store
 import subprocess
 import os
 import shutil
@@ -52,7 +54,7 @@ async def remove_forward(index: int) -> Dict[str, Any]:
 
 @router.post("/apply", dependencies=[Depends(require_auth)])
 async def apply() -> Dict[str, Any]:
-    out = apply_router_config()
+    out = await asyncio.to_thread(apply_router_config, blocklist_store.collapsed())
     return {"ok": True, "output": out}
 
 
@@ -119,7 +121,7 @@ async def services_ctl(name: str, action: str) -> Dict[str, Any]:
     # Container mode control: reuse apply_router_config for (re)starts
     try:
         if action in {"start", "restart"}:
-            out = apply_router_config()
+            out = await asyncio.to_thread(apply_router_config, blocklist_store.collapsed())
             return {"ok": True, "out": out}
         if action == "stop":
             if name in {"dnsmasq", "routergeist-dnsmasq"}:
@@ -1,31 +1,94 @@
 from __future__ import annotations
 
+from typing import Literal, Optional
+
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from ..security.auth import require_auth
-from ..services.firewall import block_ip
+from ..services.firewall import firewall
 from ..services.blocklist_store import blocklist_store
+from ..services.feed_manager import feed_manager
 
 
 router = APIRouter()
 
 
 class BlockRequest(BaseModel):
+    # Address or CIDR
     ip: str
+    # Seconds until the block lifts; omitted means permanent
+    duration: Optional[int] = Field(None, ge=1)
 
 
 @router.post("/block", dependencies=[Depends(require_auth)])
 async def block(req: BlockRequest) -> dict:
-    ok = block_ip(req.ip)
-    if not ok:
-        raise HTTPException(status_code=500, detail="Failed to block IP")
-    blocklist_store.add(req.ip)
+    try:
+        entry = blocklist_store.add(req.ip, ttl=req.duration)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid IP or CIDR")
+    return {"ok": True, "entry": entry.ip, "expires_at": entry.expires_at}
+
+
+@router.post("/unblock", dependencies=[Depends(require_auth)])
+async def unblock(req: BlockRequest) -> dict:
+    if not blocklist_store.remove(req.ip):
+        raise HTTPException(status_code=404, detail="Not in blocklist")
     return {"ok": True}
 
 
+@router.get("/blocked", dependencies=[Depends(require_auth)])
+async def is_blocked(ip: str) -> dict:
+    """Whether an address is blocked, and by which blocklist entry."""
+    return {"ip": ip, "entry": blocklist_store.match(ip)}
+
+
+@router.get("/firewall", dependencies=[Depends(require_auth)])
+async def firewall_status() -> dict:
+    """Blocking engine state: live set size, queued changes, last batch timing and error."""
+    return firewall.status()
+
+
 @router.get("/blocklist", dependencies=[Depends(require_auth)])
 async def get_blocklist() -> dict:
-    return {"ips": blocklist_store.list()}
+    return {"ips": blocklist_store.list(), "entries": blocklist_store.entries()}
+
 
+class FeedRequest(BaseModel):
+    name: str
+    # Local file, or a directory whose files are read in name order
+    path: str
+    format: Literal["list", "cidr", "csv"] = "list"
+    # CSV only: column index or header name holding the address/CIDR
+    column: Optional[str] = None
 
+
+@router.get("/feeds", dependencies=[Depends(require_auth)])
+async def list_feeds() -> dict:
+    return {"feeds": feed_manager.list()}
+
+
+@router.post("/feeds", dependencies=[Depends(require_auth)])
+async def add_feed(req: FeedRequest) -> dict:
+    """Register a feed and load it; returns the load stats (entries, delta, timings)."""
+    try:
+        stats = await feed_manager.register(req.name, req.path, req.format, req.column)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"ok": stats.get("ok", False), "stats": stats}
+
+
+@router.post("/feeds/{name}/reload", dependencies=[Depends(require_auth)])
+async def reload_feed(name: str) -> dict:
+    try:
+        stats = await feed_manager.reload(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown feed")
+    return {"ok": stats.get("ok", False), "stats": stats}
+
+
+@router.delete("/feeds/{name}", dependencies=[Depends(require_auth)])
+async def delete_feed(name: str) -> dict:
+    if not await feed_manager.remove(name):
+        raise HTTPException(status_code=404, detail="Unknown feed")
+    return {"ok": True}
@@ -1,25 +1,61 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 
 from ..security.auth import require_auth
 from ..services.stats_service import stats_service
 from ..services.dns_monitor import dns_monitor
+from ..services.dns_log_store import dns_log_store
 import time
 import subprocess
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, List, Literal, Optional
 from ..services.router_config_store import router_config_store
 from ..services.interface_manager import interface_manager
-from ..services.activity_monitor import activity_monitor
+from ..services.activity_monitor import activity_monitor, sorted_items
 from ..services.longterm_service import longterm_service
+from ..services.percentile_service import LEVELS as PERCENTILE_LEVELS, percentile_service
 
 
 router = APIRouter()
 
 
+def _nic_list(nic: Optional[str]) -> Optional[List[str]]:
+    """`nic=eth0,wlan0` -> ["eth0", "wlan0"]; None/empty selects all NICs."""
+    if not nic:
+        return None
+    return [n.strip() for n in nic.split(",") if n.strip()]
+
+
 @router.get("/traffic", dependencies=[Depends(require_auth)])
-async def traffic() -> dict:
-    return {"pernic": await stats_service.get_history()}
+async def traffic(
+    since: Optional[float] = None,
+    nic: Optional[str] = None,
+    window_seconds: Optional[float] = Query(None, gt=0),
+    points: Optional[int] = Query(None, ge=3, le=20000),
+    method: Literal["lttb", "minmax", "avg"] = "lttb",
+) -> Dict[str, Any]:
+    """Per-NIC rate history, or only the points added after `since`.
+
+    Pass the returned cursor back as `since` on the next poll to receive just the new points.
+    With `points`, a full/window read is downsampled server-side to at most that many points per NIC
+    (deltas are small and always raw).
+    Response: { pernic: { nic: [[ts, rx_bps, tx_bps], ...] }, cursor: float }
+    """
+    if points is not None and since is None:
+        # Cursor first: a sample landing meanwhile comes again as a delta, which clients skip by ts
+        cursor = stats_service.last_sample_ts
+        pernic = await stats_service.get_decimated(
+            window_seconds or stats_service.window_seconds, points, method, nics=_nic_list(nic)
+        )
+        return {"pernic": pernic, "cursor": cursor}
+    pernic = await stats_service.get_history(window_seconds=window_seconds, nics=_nic_list(nic), since=since)
+    # From the points themselves: a sample landing while we waited must not be skipped or repeated
+    newest = [series[-1][0] for series in pernic.values() if series]
+    if newest:
+        cursor = max(newest)
+    else:
+        cursor = since if since is not None else stats_service.last_sample_ts
+    return {"pernic": pernic, "cursor": cursor}
 
 
 @router.get("/domains", dependencies=[Depends(require_auth)])
@@ -29,26 +65,26 @@ async def domains(limit: int = 200) -> dict:
 
 @router.get("/top-domains", dependencies=[Depends(require_auth)])
 async def top_domains(limit: int = 10, window_seconds: int = 600) -> Dict[str, Any]:
-    now = time.time()
-    recent: List[Tuple[float, str]] = await dns_monitor.get_recent(limit=2000)
-    counts: Dict[str, int] = {}
-    for ts, domain in recent:
-        if now - ts <= window_seconds:
-            counts[domain] = counts.get(domain, 0) + 1
-    items = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+    items = await dns_monitor.get_top_domains(window_seconds=window_seconds, limit=limit)
     return {"items": items}
 
 
 @router.get("/summary", dependencies=[Depends(require_auth)])
-async def summary(window_seconds: int = 120) -> Dict[str, Any]:
-    """Return short-window averages and dynamic roles per NIC.
+async def summary(window_seconds: int = 120, nic: Optional[str] = None, since: Optional[float] = None) -> Dict[str, Any]:
+    """Return short-window averages, peaks and dynamic roles per NIC.
 
     Role selection precedence:
     1) Real-time roles from interface_manager ("WAN" or "AP" → label "LAN").
     2) Configured interfaces from router_config_store (LAN/WAN).
     3) Fallback to "other".
+
+    With `since` (a previous cursor) and no newer sample, returns { pernic: {}, unchanged: true }
+    so the caller keeps what it has.
     """
-    hist = await stats_service.get_history()
+    cursor = stats_service.last_sample_ts
+    if since is not None and cursor <= since:
+        return {"pernic": {}, "cursor": since, "unchanged": True}
+    averages = await stats_service.get_summary(window_seconds, nics=_nic_list(nic))
     # Gather runtime roles from interface_manager
     roles_map: Dict[str, str] = {}
     try:
@@ -63,25 +99,19 @@ async def summary(window_seconds: int = 120) -> Dict[str, Any]:
     lan_if = cfg.get("lan", {}).get("interface")
     wan_if = cfg.get("wan", {}).get("interface")
 
-    now = time.time()
     pernic: Dict[str, Dict[str, float]] = {}
-    for nic, points in hist.items():
-        rx_vals: List[float] = []
-        tx_vals: List[float] = []
-        for ts, rx, tx in points:
-            if now - ts <= window_seconds:
-                rx_vals.append(rx)
-                tx_vals.append(tx)
-        if rx_vals or tx_vals:
-            role = roles_map.get(nic)
-            if not role:
-                role = "LAN" if nic == lan_if else ("WAN" if nic == wan_if else "other")
-            pernic[nic] = {
-                "rx_bps": sum(rx_vals) / max(1, len(rx_vals)),
-                "tx_bps": sum(tx_vals) / max(1, len(tx_vals)),
-                "role": role,
-            }
-    return {"pernic": pernic}
+    for name, (rx_bps, tx_bps, rx_peak, tx_peak) in averages.items():
+        role = roles_map.get(name)
+        if not role:
+            role = "LAN" if name == lan_if else ("WAN" if name == wan_if else "other")
+        pernic[name] = {
+            "rx_bps": rx_bps,
+            "tx_bps": tx_bps,
+            "rx_peak_bps": rx_peak,
+            "tx_peak_bps": tx_peak,
+            "role": role,
+        }
+    return {"pernic": pernic, "cursor": cursor, "unchanged": False}
 
 
 @router.get("/connections", dependencies=[Depends(require_auth)])
@@ -126,26 +156,39 @@ async def new_domains(window_seconds: int = 3600) -> Dict[str, Any]:
     return {"items": items}
 
 
+@router.get("/dns-log", dependencies=[Depends(require_auth)])
+async def dns_log(
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    client: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=1000),
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Page through persisted DNS queries in [start, end), oldest first.
+
+    Defaults to the last hour. Pass the returned next_cursor to fetch the following page.
+    Response: { items: [{ts, client, domain}, ...], next_cursor: str | null }
+    """
+    end_ts = end if end is not None else time.time()
+    start_ts = start if start is not None else end_ts - 3600
+    try:
+        return await dns_log_store.query(start=start_ts, end=end_ts, client=client, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/dns-log/usage", dependencies=[Depends(require_auth)])
+async def dns_log_usage() -> Dict[str, Any]:
+    return await dns_log_store.disk_usage()
+
+
 @router.get("/clients-by-domain", dependencies=[Depends(require_auth)])
 async def clients_by_domain(limit: int = 10, window_seconds: int = 600) -> Dict[str, Any]:
     """Return top domains with counts of unique client queries within window.
 
     Response: { by_domain: { domain: [[client, count], ...], ... } }
     """
-    by_client = await dns_monitor.get_recent_by_client(window_seconds=window_seconds)
-    # invert to domain -> client -> count
-    per_domain: Dict[str, Dict[str, int]] = {}
-    for client, items in by_client.items():
-        for domain, _ts in items:
-            bucket = per_domain.setdefault(domain, {})
-            bucket[client] = bucket.get(client, 0) + 1
-    # pick top domains by total query count
-    domain_totals: List[Tuple[str, int]] = [(dom, sum(m.values())) for dom, m in per_domain.items()]
-    top = sorted(domain_totals, key=lambda kv: kv[1], reverse=True)[:limit]
-    out: Dict[str, List[Tuple[str, int]]] = {}
-    for dom, _tot in top:
-        clients = per_domain.get(dom, {})
-        out[dom] = sorted(clients.items(), key=lambda kv: kv[1], reverse=True)
+    out = await dns_monitor.get_top_clients_by_domain(window_seconds=window_seconds, limit=limit)
     return {"by_domain": out}
 
 
@@ -174,16 +217,68 @@ async def clients_usage() -> Dict[str, Any]:
 async def activity() -> Dict[str, Any]:
     snap = await activity_monitor.get_snapshot()
     # return as list for stable iteration in UI
-    items = sorted(snap.values(), key=lambda x: (0 if x.get("activity") == "streaming" else 1, -x.get("flows", 0)))
-    return {"items": items}
+    return {"items": sorted_items(snap)}
 
 
 @router.get("/longterm", dependencies=[Depends(require_auth)])
-async def longterm(window_seconds: int = Query(24 * 3600, ge=60), nic: Optional[str] = None) -> Dict[str, Any]:
-    """Return per-minute averages per NIC within the requested window.
+async def longterm(
+    window_seconds: int = Query(24 * 3600, ge=60),
+    nic: Optional[str] = None,
+    points: Optional[int] = Query(None, ge=3, le=20000),
+    method: Literal["lttb", "minmax", "avg"] = "minmax",
+    stat: Literal["max", "avg", "min"] = "max",
+) -> Dict[str, Any]:
+    """Return per-NIC rates within the requested window from the rollup archives.
+
+    The resolution (1s, 1m, 15m or 1h buckets) is the finest that keeps the window within `points`
+    (default: one point per minute); `stat` picks each bucket's peak, average or minimum.
+    With `points`, anything still above the budget is downsampled server-side.
+    Response: { pernic: { nic: [[ts, rx_bps, tx_bps], ...], ... }, resolution: seconds }
+    """
+    resolution = longterm_service.resolution_for(window_seconds, points)
+    if points is not None:
+        data = await longterm_service.get_decimated(window_seconds, points, method, nic=nic, stat=stat)
+    else:
+        data = await longterm_service.get_window(window_seconds=window_seconds, nic=nic, stat=stat)
+    return {"pernic": data, "resolution": resolution}
+
 
-    Response: { pernic: { nic: [[ts, rx_bps, tx_bps], ...], ... } }
+@router.get("/usage", dependencies=[Depends(require_auth)])
+async def usage(nic: Optional[str] = None, months: int = Query(1, ge=1, le=24)) -> Dict[str, Any]:
+    """Byte totals, average and peak rates per calendar month (local time), oldest first.
+
+    Response: { pernic: { nic: [{month, start, end, rx_bytes, tx_bytes, rx_avg_bps, tx_avg_bps,
+    rx_peak_bps, tx_peak_bps}, ...] } }
     """
-    data = await longterm_service.get_window(window_seconds=window_seconds, nic=nic)
-    return {"pernic": data}
+    return {"pernic": longterm_service.monthly_usage(nic=nic, months=months)}
+
 
+PERIODS = {"day": 86400, "week": 7 * 86400, "month": 30 * 86400}
+
+
+@router.get("/percentiles", dependencies=[Depends(require_auth)])
+async def percentiles(
+    period: Literal["day", "week", "month"] = "day",
+    window_seconds: Optional[int] = Query(None, ge=3600, le=400 * 86400),
+    nic: Optional[str] = None,
+    q: str = "50,95,99",
+) -> Dict[str, Any]:
+    """Rate percentiles per NIC over the last day/week/month (or `window_seconds`), for capacity planning.
+
+    `q` is a comma list of percentiles in (0, 100]. Values come from per-hour/per-day sketches and are
+    within 1% of the exact percentile of the sampled rates.
+    Response: { pernic: { nic: { samples, rx: {p95: bps, ...}, tx: {...}, rx_mean_bps, tx_mean_bps } },
+    window_seconds, resolution }
+    """
+    try:
+        quantiles = [float(p) / 100 for p in q.split(",") if p.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="q must be a comma list of percentiles")
+    if not quantiles or any(not 0 < p <= 1 for p in quantiles):
+        raise HTTPException(status_code=400, detail="percentiles must be in (0, 100]")
+    window = window_seconds or PERIODS[period]
+    level = percentile_service.level_for(window)
+    pernic: Dict[str, Any] = {}
+    for name in _nic_list(nic) or [None]:
+        pernic.update(percentile_service.percentiles(window, quantiles, nic=name))
+    return {"pernic": pernic, "window_seconds": window, "resolution": PERCENTILE_LEVELS[level][0]}
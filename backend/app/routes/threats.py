@@ -1,17 +1,53 @@
-from fastapi import APIRouter, Depends
+import asyncio
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
 
 from ..models.threats import AnalyzeRequest, ThreatsResponse
 from ..security.auth import require_auth
+from ..services.alert_coalescer import alert_coalescer
 from ..services.threat_detector import threat_detector
+from ..services.threat_store import threat_store
 
 
 router = APIRouter()
 
 
 @router.get("/", response_model=ThreatsResponse, dependencies=[Depends(require_auth)])
-async def list_threats() -> ThreatsResponse:
-    events = await threat_detector.list_events()
-    return ThreatsResponse(events=events)
+async def list_threats(
+    cursor: Optional[int] = None,
+    since: Optional[float] = None,
+    severity: Optional[Literal["info", "low", "medium", "high", "critical"]] = None,
+    ip: Optional[str] = None,
+    source: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=1000),
+) -> ThreatsResponse:
+    """Threat events, filtered by `since` (epoch seconds), minimum `severity`, `ip` and `source`.
+
+    Without `cursor` returns the newest page; pass the returned `cursor` back to get only events
+    created or updated since (keep paging while `more` is true).
+    """
+    events, next_cursor, more = await threat_detector.list_events(cursor, since, severity, ip, source, limit)
+    return ThreatsResponse(events=events, cursor=next_cursor, more=more)
+
+
+@router.get("/cache", dependencies=[Depends(require_auth)])
+async def cache_stats() -> dict:
+    """Verdict cache counters: hits, misses, hit_rate, entries."""
+    return threat_detector.cache_stats()
+
+
+@router.get("/coalescer", dependencies=[Depends(require_auth)])
+async def coalescer_stats() -> dict:
+    """Alert coalescer counters: open groups, suppressed duplicates."""
+    return alert_coalescer.stats()
+
+
+@router.get("/store", dependencies=[Depends(require_auth)])
+async def store_stats() -> dict:
+    """Threat store counters: rev, bytes on disk, max_events, dropped."""
+    # Sizes the database files: stat calls stay off the loop
+    return await asyncio.to_thread(threat_store.stats)
 
 
 @router.post("/analyze", dependencies=[Depends(require_auth)])
@@ -31,6 +31,16 @@ def clear_session(response: Response) -> None:
     response.delete_cookie(SESSION_COOKIE, path="/")
 
 
+def session_user(token: Optional[str]) -> Optional[str]:
+    """Username for a valid session cookie value, None otherwise (for callers that cannot raise HTTP errors)."""
+    if not token:
+        return None
+    try:
+        return serializer.loads(token, max_age=int(timedelta(hours=24).total_seconds())).get("u")
+    except BadSignature:
+        return None
+
+
 def require_auth(rg_session: Optional[str] = Cookie(default=None, alias=SESSION_COOKIE)) -> str:
     if not rg_session:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
@@ -8,6 +8,12 @@ from typing import Dict, List, Tuple
 
 from .router_config_store import router_config_store
 from .dns_monitor import dns_monitor
+from .live_hub import live_hub
+
+
+def sorted_items(snapshot: Dict[str, Dict[str, object]]) -> List[Dict[str, object]]:
+    """Streaming clients first, then by flow count."""
+    return sorted(snapshot.values(), key=lambda x: (0 if x.get("activity") == "streaming" else 1, -x.get("flows", 0)))  # type: ignore[operator]
 
 
 class ActivityMonitor:
@@ -129,7 +135,13 @@ class ActivityMonitor:
             }
 
         async with self._lock:
+            # Only push when something other than the sample time moved
+            changed = snapshot.keys() != self._snapshot.keys() or any(
+                {**item, "ts": 0} != {**self._snapshot[ip], "ts": 0} for ip, item in snapshot.items()
+            )
             self._snapshot = snapshot
+        if changed:
+            live_hub.publish("activity", {"items": sorted_items(snapshot)}, replace=True)
 
     async def get_snapshot(self) -> Dict[str, Dict[str, object]]:
         async with self._lock:
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+from .threat_detector import threat_detector
+
+
+MAX_KEYS = 10000
+
+
+@dataclass
+class _Group:
+    window_start: float
+    tokens: float
+    token_ts: float
+    # Occurrences folded in since the last emitted event
+    pending: int = 0
+    first_seen: float = 0.0
+    last_seen: float = 0.0
+    message: str = ""
+    meta: Optional[Dict[str, Any]] = field(default=None)
+
+
+class AlertCoalescer:
+    """Coalesce repeated alerts between the monitors and ThreatDetector.
+
+    - Alerts are grouped by (source, kind, key) where key is an IP or signature
+    - The first alert of a group passes straight through; repeats within the window are
+      folded into one aggregated event carrying count and first/last-seen
+    - Each group has a token bucket; without tokens the aggregate keeps growing instead of emitting
+    """
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._stop = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._groups: "OrderedDict[Tuple[str, str, str], _Group]" = OrderedDict()
+        self._window = max(1, settings.alert_window_seconds)
+        self._burst = max(1, settings.alert_burst)
+        self._refill = max(0.001, settings.alert_refill_seconds)
+        self.suppressed = 0
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            await asyncio.wait([self._task])
+        await self._flush(force=True)
+
+    async def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await self._flush()
+            except Exception:
+                pass
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+
+    def _take_token(self, g: _Group, now: float) -> bool:
+        g.tokens = min(float(self._burst), g.tokens + (now - g.token_ts) / self._refill)
+        g.token_ts = now
+        if g.tokens >= 1.0:
+            g.tokens -= 1.0
+            return True
+        return False
+
+    async def submit(self, source: str, kind: str, key: str, message: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        gkey = (source, kind, key)
+        emit = False
+        evicted = None
+        async with self._lock:
+            g = self._groups.get(gkey)
+            if g is None:
+                g = _Group(window_start=now, tokens=float(self._burst), token_ts=now)
+                self._groups[gkey] = g
+                if len(self._groups) > MAX_KEYS:
+                    # Least recently active group goes; its pending aggregate is still reported
+                    old_key, old = self._groups.popitem(last=False)
+                    if old.pending:
+                        evicted = self._aggregate(old_key, old)
+            else:
+                self._groups.move_to_end(gkey)
+            if g.pending == 0 and now - g.window_start >= self._window:
+                # Quiet group: start a new window
+                g.window_start = now
+            if g.window_start == now and self._take_token(g, now):
+                emit = True
+            else:
+                if g.pending == 0:
+                    g.first_seen = now
+                g.pending += 1
+                g.last_seen = now
+                g.message = message
+                g.meta = meta
+                self.suppressed += 1
+        if emit:
+            await threat_detector.analyze(source=source, message=message, meta=meta)
+        if evicted is not None:
+            await self._emit(evicted)
+
+    @staticmethod
+    def _aggregate(gkey: Tuple[str, str, str], g: _Group) -> Tuple[str, int, float, float, str, Optional[Dict[str, Any]]]:
+        item = (gkey[0], g.pending, g.first_seen, g.last_seen, g.message, g.meta)
+        g.pending = 0
+        return item
+
+    async def _emit(self, item: Tuple[str, int, float, float, str, Optional[Dict[str, Any]]]) -> None:
+        source, count, first, last, message, meta = item
+        await threat_detector.analyze(
+            source=source,
+            message=message,
+            meta=meta,
+            count=count,
+            first_seen=datetime.utcfromtimestamp(first),
+            last_seen=datetime.utcfromtimestamp(last),
+        )
+
+    async def _flush(self, force: bool = False) -> None:
+        now = time.time()
+        ready = []
+        async with self._lock:
+            for gkey, g in list(self._groups.items()):
+                if g.pending == 0:
+                    if now - g.window_start >= self._window and g.tokens + (now - g.token_ts) / self._refill >= self._burst:
+                        # Idle and fully refilled: nothing left to remember
+                        del self._groups[gkey]
+                    continue
+                if not force and now - g.window_start < self._window:
+                    continue
+                if not force and not self._take_token(g, now):
+                    continue
+                ready.append(self._aggregate(gkey, g))
+                g.window_start = now
+        for item in ready:
+            await self._emit(item)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"groups": len(self._groups), "suppressed": self.suppressed}
+
+
+alert_coalescer = AlertCoalescer()
@@ -1,49 +1,292 @@
 from __future__ import annotations
 
+import asyncio
+import heapq
+import ipaddress
 import json
 import os
-from typing import List, Set
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
+from ..config import settings
 from ..utils.paths import get_app_data_dir
+from ..utils.prefix_trie import Network, PrefixTrie
+from .firewall import block_ip, normalize_element, unblock_ip
+from .live_hub import live_hub
+
+
+# Changes are written at most this often; a burst of blocks becomes one rewrite
+SAVE_DEBOUNCE_SECONDS = 1.0
+# Auto-block strikes are forgotten after this long without a new offence
+STRIKE_MEMORY_SECONDS = 30 * 86400
+
+
+def _element(net: Network) -> str:
+    return str(net.network_address) if net.num_addresses == 1 else str(net)
+
+
+@dataclass
+class BlockEntry:
+    # Canonical address or CIDR
+    ip: str
+    added_at: float
+    # None: permanent
+    expires_at: Optional[float] = None
+    source: str = "manual"
 
 
 class BlocklistStore:
+    """Blocked addresses, held in memory and persisted write-behind.
+
+    - The in-memory map is authoritative; reads and membership checks never touch disk
+    - Changes mark the store dirty; a background task rewrites blocked_ips.json after a short
+      debounce via temp file + rename, so a crash never leaves a half-written list
+    - Blocks may carry an expiry; a min-heap keyed by expires_at wakes the same task at the next
+      expiry and removes everything due in one go (the firewall batches the removals)
+    - Auto-blocks get an escalating TTL from AUTO_BLOCK_TTLS per repeat offence
+    - Entries may be CIDRs; a prefix trie answers which entry covers an address and keeps the
+      collapsed (merged, de-overlapped) prefix set that the firewall's interval set holds.
+      Every change is pushed to the firewall as the delta of that collapsed set
+    """
+
     def __init__(self) -> None:
         self._dir = get_app_data_dir()
         os.makedirs(self._dir, exist_ok=True)
         self._file = os.path.join(self._dir, "blocked_ips.json")
+        self._entries: Dict[str, BlockEntry] = {}
+        # ip -> (offences, last offence ts)
+        self._strikes: Dict[str, Tuple[int, float]] = {}
+        # (expires_at, ip); stale items are skipped when popped
+        self._heap: List[Tuple[float, str]] = []
+        self._trie = PrefixTrie()
+        self._read()
+        self._dirty = False
+        self._save_due: Optional[float] = None
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task: asyncio.Task | None = None
 
-    def _read(self) -> Set[str]:
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._task:
+            await asyncio.wait([self._task])
+        await self.save()
+
+    async def _run(self) -> None:
+        while not self._stop.is_set():
+            deadlines = [t for t in (self.next_expiry(), self._save_due) if t is not None]
+            timeout = max(0.0, min(deadlines) - time.time()) if deadlines else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                self.pop_expired()
+                if self._dirty and self._save_due is None:
+                    self._save_due = time.time() + SAVE_DEBOUNCE_SECONDS
+                if self._save_due is not None and time.time() >= self._save_due:
+                    self._save_due = None
+                    await self.save()
+            except Exception as exc:  # noqa: BLE001
+                # Expiry and write-behind share this task: one failure must not end either
+                print(f"[blocklist_store] error: {exc}")
+                await asyncio.sleep(1.0)
+                # Run the iteration again so a pending save is not left waiting for the next change
+                self._wake.set()
+
+    # ---- persistence ----
+    def _read(self) -> None:
         try:
             if not os.path.exists(self._file):
-                return set()
+                return
             with open(self._file, "r", encoding="utf-8") as f:
                 data = json.load(f)
-            return set(data or [])
         except Exception:
-            return set()
+            return
+        if isinstance(data, list):
+            # Original format: plain list of permanently blocked IPs
+            data = {"entries": [{"ip": str(ip), "added_at": 0.0} for ip in data]}
+        for item in (data or {}).get("entries", []):
+            try:
+                entry = BlockEntry(**item)
+            except TypeError:
+                continue
+            key = normalize_element(entry.ip)
+            if key is None:
+                continue
+            entry.ip = key
+            self._entries[key] = entry
+            self._trie.add(ipaddress.ip_network(key), key)
+            if entry.expires_at is not None:
+                self._heap.append((entry.expires_at, key))
+        heapq.heapify(self._heap)
+        for ip, (count, last) in ((data or {}).get("strikes") or {}).items():
+            self._strikes[ip] = (int(count), float(last))
+
+    async def save(self) -> None:
+        """Write pending changes. The payload is built here on the event loop, where the entries are
+        mutated; only the write, fsync and rename run in a thread."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        cutoff = time.time() - STRIKE_MEMORY_SECONDS
+        payload = {
+            "version": 2,
+            "entries": [asdict(e) for e in sorted(self._entries.values(), key=lambda e: e.ip)],
+            "strikes": {ip: [c, last] for ip, (c, last) in self._strikes.items() if last >= cutoff},
+        }
+        if not await asyncio.to_thread(self._write, payload):
+            # Retry on the next change or at shutdown
+            self._dirty = True
+
+    def _write(self, payload: Dict[str, Any]) -> bool:
+        try:
+            tmp = self._file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self._file)
+            return True
+        except Exception:
+            return False
 
-    def _write(self, ips: Set[str]) -> None:
-        with open(self._file, "w", encoding="utf-8") as f:
-            json.dump(sorted(list(ips)), f)
-        os.chmod(self._file, 0o600)
+    def _changed(self) -> None:
+        self._dirty = True
+        self._wake.set()
 
+    # ---- reads ----
     def list(self) -> List[str]:
-        return sorted(list(self._read()))
+        return sorted(self._entries)
 
-    def add(self, ip: str) -> None:
-        ips = self._read()
-        if ip not in ips:
-            ips.add(ip)
-            self._write(ips)
+    def entries(self) -> List[Dict[str, Any]]:
+        return [asdict(e) for e in sorted(self._entries.values(), key=lambda e: e.ip)]
 
-    def remove(self, ip: str) -> None:
-        ips = self._read()
-        if ip in ips:
-            ips.remove(ip)
-            self._write(ips)
+    def get(self, ip: str) -> Optional[BlockEntry]:
+        key = normalize_element(ip)
+        return self._entries.get(key) if key else None
 
+    def match(self, ip: str) -> Optional[str]:
+        """The entry blocking address `ip` (most specific covering prefix), if any."""
+        try:
+            addr = ipaddress.ip_address(str(ip).strip())
+        except ValueError:
+            key = normalize_element(ip)
+            return key if key in self._entries else None
+        hit = self._trie.lookup(addr)
+        return hit[1] if hit else None
 
-blocklist_store = BlocklistStore()
+    def contains(self, ip: str) -> bool:
+        return self.match(ip) is not None
+
+    def collapsed(self) -> List[str]:
+        """Minimal prefix set covering all entries, as firewall set elements."""
+        return [_element(n) for n in self._trie.collapsed()]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ---- changes ----
+    @staticmethod
+    def _push(diff: Tuple[List[Network], List[Network]]) -> None:
+        removed, added = diff
+        for net in removed:
+            unblock_ip(_element(net))
+        for net in added:
+            block_ip(_element(net))
+
+    def add(self, ip: str, ttl: Optional[float] = None, source: str = "manual") -> BlockEntry:
+        """Block an address or CIDR for `ttl` seconds (None: permanently).
+
+        Re-adding only ever extends a block. Raises ValueError for anything that is not an address/CIDR.
+        """
+        key = normalize_element(ip)
+        if key is None:
+            raise ValueError(f"invalid address or CIDR: {ip!r}")
+        ip = key
+        now = time.time()
+        expires_at = None if ttl is None else now + ttl
+        entry = self._entries.get(ip)
+        if entry is None:
+            entry = BlockEntry(ip=ip, added_at=now, expires_at=expires_at, source=source)
+            self._entries[ip] = entry
+            self._push(self._trie.add(ipaddress.ip_network(ip), ip))
+        elif entry.expires_at is None or (expires_at is not None and expires_at <= entry.expires_at):
+            return entry
+        else:
+            entry.expires_at = expires_at
+        if expires_at is not None:
+            heapq.heappush(self._heap, (expires_at, ip))
+        self._changed()
+        live_hub.publish("blocklist", {"op": "add", "entry": asdict(entry)})
+        return entry
 
+    def add_auto(self, ip: str) -> BlockEntry:
+        """Auto-block with a TTL that grows with each offence remembered for `ip`.
 
+        Only a single host address is accepted; ranges are for manual entries and feeds.
+        """
+        try:
+            addr = ipaddress.ip_address(str(ip).strip())
+        except ValueError:
+            raise ValueError(f"auto-block needs a single host address: {ip!r}") from None
+        key = normalize_element(str(addr))
+        if key is None:
+            raise ValueError(f"invalid address: {ip!r}")
+        ip = key
+        now = time.time()
+        count, last = self._strikes.get(ip, (0, now))
+        if now - last > STRIKE_MEMORY_SECONDS:
+            count = 0
+        self._strikes[ip] = (count + 1, now)
+        ttls = settings.auto_block_ttls
+        ttl = ttls[min(count, len(ttls) - 1)] if ttls else 0
+        return self.add(ip, ttl=ttl if ttl > 0 else None, source="auto")
+
+    def remove(self, ip: str) -> bool:
+        key = normalize_element(ip)
+        if key is None or self._entries.pop(key, None) is None:
+            return False
+        # Any heap item for the entry is now stale and gets skipped
+        self._push(self._trie.remove(ipaddress.ip_network(key)))
+        self._changed()
+        live_hub.publish("blocklist", {"op": "remove", "ip": key})
+        return True
+
+    # ---- expiry ----
+    def next_expiry(self) -> Optional[float]:
+        while self._heap:
+            expires_at, ip = self._heap[0]
+            entry = self._entries.get(ip)
+            if entry is not None and entry.expires_at == expires_at:
+                return expires_at
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_expired(self, now: Optional[float] = None) -> List[str]:
+        now = time.time() if now is None else now
+        expired: List[str] = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, ip = heapq.heappop(self._heap)
+            entry = self._entries.get(ip)
+            if entry is not None and entry.expires_at == expires_at:
+                del self._entries[ip]
+                self._push(self._trie.remove(ipaddress.ip_network(ip)))
+                live_hub.publish("blocklist", {"op": "remove", "ip": ip})
+                expired.append(ip)
+        if expired:
+            self._dirty = True
+        return expired
+
+
+blocklist_store = BlocklistStore()
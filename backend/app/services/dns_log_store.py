@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..utils.paths import get_app_data_dir
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS q (id INTEGER PRIMARY KEY, ts REAL NOT NULL, client TEXT NOT NULL, domain TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS q_ts ON q(ts)",
+    "CREATE INDEX IF NOT EXISTS q_client_ts ON q(client, ts)",
+)
+
+
+def _segment_key(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y%m%d%H")
+
+
+def _segment_start(key: str) -> float:
+    return datetime.strptime(key, "%Y%m%d%H").replace(tzinfo=timezone.utc).timestamp()
+
+
+class DNSLogStore:
+    """Persistent DNS query log split into hourly SQLite segments.
+
+    - Ingest hands rows to a writer thread through a bounded queue and never blocks
+    - Each segment indexes queries by time and by (client, time); the open hour runs in WAL mode
+    - Closed hours are checkpointed and vacuumed into compact read-mostly files
+    - Retention drops the oldest segments past the age limit or the disk budget
+    """
+
+    def __init__(self) -> None:
+        self._dir = os.path.join(get_app_data_dir(), "dnslog")
+        self._budget_bytes = max(1, settings.dns_log_budget_mb) * 1024 * 1024
+        self._retention_seconds = max(1, settings.dns_log_retention_days) * 86400
+        self._queue: "queue.Queue[Optional[List[Tuple[float, str, str]]]]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._conns: Dict[str, sqlite3.Connection] = {}
+        self._last_retention_ts = 0.0
+        self.dropped = 0
+
+    # ---- lifecycle ----
+    async def start(self) -> None:
+        if not settings.dns_log_enabled:
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        os.makedirs(self._dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer, name="dns-log-writer", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if not self._thread:
+            return
+        self._queue.put(None)
+        await asyncio.to_thread(self._thread.join, 10.0)
+        self._thread = None
+
+    def append(self, rows: List[Tuple[float, str, str]]) -> None:
+        """Queue (ts, client, domain) rows for persistence; drops the batch if the writer is behind."""
+        if not rows or not self._thread:
+            return
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            self.dropped += len(rows)
+
+    # ---- writer thread ----
+    def _connect(self, key: str) -> sqlite3.Connection:
+        conn = self._conns.get(key)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self._dir, f"{key}.db"), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in SCHEMA:
+                conn.execute(stmt)
+            self._conns[key] = conn
+        return conn
+
+    def _writer(self) -> None:
+        running = True
+        while running:
+            batches: List[List[Tuple[float, str, str]]] = []
+            try:
+                item = self._queue.get(timeout=1.0)
+                if item is None:
+                    running = False
+                else:
+                    batches.append(item)
+                while running:
+                    item = self._queue.get_nowait()
+                    if item is None:
+                        running = False
+                    else:
+                        batches.append(item)
+            except queue.Empty:
+                pass
+            try:
+                self._write(batches)
+                self._close_finished(force=not running)
+                self._apply_retention(force=not running)
+            except Exception as exc:  # noqa: BLE001
+                print(f"[dns_log_store] error: {exc}")
+
+    def _write(self, batches: List[List[Tuple[float, str, str]]]) -> None:
+        per_segment: Dict[str, List[Tuple[float, str, str]]] = {}
+        for rows in batches:
+            for row in rows:
+                per_segment.setdefault(_segment_key(row[0]), []).append(row)
+        for key, rows in per_segment.items():
+            conn = self._connect(key)
+            with conn:
+                conn.executemany("INSERT INTO q (ts, client, domain) VALUES (?, ?, ?)", rows)
+
+    def _close_finished(self, force: bool = False) -> None:
+        current = _segment_key(time.time())
+        for key in [k for k in self._conns if force or k < current]:
+            conn = self._conns.pop(key)
+            try:
+                if key < current:
+                    # Compact the closed hour: fold the WAL back and drop free pages
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    conn.execute("PRAGMA journal_mode=DELETE")
+                    conn.execute("VACUUM")
+            finally:
+                conn.close()
+
+    def _segments(self) -> List[str]:
+        try:
+            names = os.listdir(self._dir)
+        except OSError:
+            return []
+        return sorted(n[:-3] for n in names if n.endswith(".db") and len(n) == 13 and n[:-3].isdigit())
+
+    def _segment_size(self, key: str) -> int:
+        total = 0
+        for suffix in (".db", ".db-wal", ".db-shm"):
+            try:
+                total += os.path.getsize(os.path.join(self._dir, key + suffix))
+            except OSError:
+                pass
+        return total
+
+    def _apply_retention(self, force: bool = False) -> None:
+        now = time.time()
+        if not force and (now - self._last_retention_ts) < 60.0:
+            return
+        self._last_retention_ts = now
+        keys = self._segments()
+        sizes = {k: self._segment_size(k) for k in keys}
+        total = sum(sizes.values())
+        oldest_allowed = _segment_key(now - self._retention_seconds)
+        for key in keys:
+            if key in self._conns:
+                break
+            if key >= oldest_allowed and total <= self._budget_bytes:
+                break
+            for suffix in (".db", ".db-wal", ".db-shm"):
+                try:
+                    os.remove(os.path.join(self._dir, key + suffix))
+                except OSError:
+                    pass
+            total -= sizes[key]
+
+    # ---- reads ----
+    def _query(self, start: float, end: float, client: Optional[str], limit: int, cursor: Optional[str]) -> Dict[str, Any]:
+        after_key, after_id = "", 0
+        if cursor:
+            after_key, _, raw_id = cursor.partition(":")
+            after_id = int(raw_id or 0)
+        items: List[Dict[str, Any]] = []
+        next_cursor: Optional[str] = None
+        first_key, last_key = _segment_key(start), _segment_key(end)
+        for key in self._segments():
+            if key < first_key or key > last_key or key < after_key:
+                continue
+            min_id = after_id if key == after_key else 0
+            sql = "SELECT id, ts, client, domain FROM q WHERE id > ? AND ts >= ? AND ts < ?"
+            args: List[Any] = [min_id, start, end]
+            if client:
+                sql += " AND client = ?"
+                args.append(client)
+            sql += " ORDER BY id LIMIT ?"
+            args.append(limit - len(items) + 1)
+            try:
+                conn = sqlite3.connect(f"file:{os.path.join(self._dir, key + '.db')}?mode=ro", uri=True)
+                try:
+                    rows = conn.execute(sql, args).fetchall()
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                continue
+            for row_id, ts, cli, dom in rows:
+                if len(items) == limit:
+                    return {"items": items, "next_cursor": next_cursor}
+                items.append({"ts": ts, "client": cli, "domain": dom})
+                next_cursor = f"{key}:{row_id}"
+        return {"items": items, "next_cursor": None}
+
+    async def query(
+        self,
+        start: float,
+        end: float,
+        client: Optional[str] = None,
+        limit: int = 200,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Page through queries in [start, end) in time order.
+
+        Response: { items: [{ts, client, domain}, ...], next_cursor: str | None }
+        """
+        return await asyncio.to_thread(self._query, start, end, client, max(1, limit), cursor)
+
+    def _disk_usage(self) -> Dict[str, Any]:
+        keys = self._segments()
+        return {
+            "segments": len(keys),
+            "bytes": sum(self._segment_size(k) for k in keys),
+            "budget_bytes": self._budget_bytes,
+            "oldest": _segment_start(keys[0]) if keys else None,
+            "dropped": self.dropped,
+        }
+
+    async def disk_usage(self) -> Dict[str, Any]:
+        """Segment count, bytes on disk against the budget, and the oldest segment start."""
+        # Lists the directory and stats every segment file: keep it off the event loop
+        return await asyncio.to_thread(self._disk_usage)
+
+
+dns_log_store = DNSLogStore()
@@ -1,18 +1,31 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
 import os
 import re
-from typing import Deque, Dict, List, Tuple
-from collections import deque
-
+from operator import itemgetter
+from typing import Dict, List, Tuple
+from contextlib import aclosing
+
+from ..config import settings
+from .dns_log_store import dns_log_store
+from .first_seen_store import FirstSeenStore
+from .live_hub import live_hub
+from ..utils.log_follower import LogFollower
 from ..utils.paths import get_app_data_dir
+from ..utils.query_ring import QueryRing
+from ..utils.window_counter import SlidingWindowCounter
 
 
 RESOLVED_LOG = "/var/log/dnsmasq.log"  # common path if using dnsmasq logging
 ALT_JOURNALCTL = ["journalctl", "-u", "systemd-resolved", "-o", "cat", "-f"]
 # Example: "query[A] example.com from 192.168.50.51"
 DOMAIN_RE = re.compile(r"query\[[A-Z]+\]\s+([a-zA-Z0-9_.-]+)\s+from\s+([0-9a-fA-F:.]+)")
+# Query counters: 10s buckets, running totals kept for these windows (seconds)
+COUNT_BUCKET_SECONDS = 10
+COUNT_WINDOWS = (60, 300, 600, 3600)
+FIRST_SEEN_SAVE_SECONDS = 300
 
 
 class DNSMonitor:
@@ -20,12 +33,18 @@ class DNSMonitor:
         self._task: asyncio.Task | None = None
         self._stop = asyncio.Event()
         self._lock = asyncio.Lock()
-        self._visited: Deque[Tuple[float, str, str]] = deque(maxlen=5000)
-        self._first_seen: Dict[str, float] = {}
+        self._visited = QueryRing(settings.dns_history_capacity)
+        # Bounded "seen before" memory backing the new-domain signal
+        self._first_seen = FirstSeenStore()
+        self._first_seen_saved_ts = 0.0
+        # Incrementally maintained counts per domain and per (client, domain)
+        self._domain_counts = SlidingWindowCounter(COUNT_BUCKET_SECONDS, COUNT_WINDOWS)
+        self._pair_counts = SlidingWindowCounter(COUNT_BUCKET_SECONDS, COUNT_WINDOWS)
 
     async def start(self) -> None:
         if self._task and not self._task.done():
             return
+        await asyncio.to_thread(self._first_seen.load)
         self._stop.clear()
         self._task = asyncio.create_task(self._run_best_effort())
 
@@ -33,6 +52,14 @@ class DNSMonitor:
         self._stop.set()
         if self._task:
             await asyncio.wait([self._task])
+        await self._save_first_seen()
+
+    async def _save_first_seen(self) -> None:
+        async with self._lock:
+            if not self._first_seen.dirty:
+                return
+            blob, order = self._first_seen.snapshot()
+        await asyncio.to_thread(self._first_seen.write, blob, order)
 
     async def _run_best_effort(self) -> None:
         # Best-effort: tail dnsmasq log if present; otherwise do nothing
@@ -42,67 +69,94 @@ class DNSMonitor:
         # Could add journalctl parsing here if resolved is used
 
     async def _tail_file(self, path: str) -> None:
-        import aiofiles
+        # Rotation-aware follow; restart the follower after errors instead of giving up
+        while not self._stop.is_set():
+            follower = LogFollower(path, state_name="dnsmasq")
+            try:
+                async with aclosing(follower.batches(self._stop)) as batches:
+                    async for lines in batches:
+                        await self._ingest(lines)
+            except Exception:
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=2.0)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _ingest(self, lines: List[str]) -> None:
         import time
 
-        # Simple tail-f style follow
-        try:
-            async with aiofiles.open(path, "r") as f:
-                await f.seek(0, os.SEEK_END)
-                while not self._stop.is_set():
-                    line = await f.readline()
-                    if not line:
-                        await asyncio.sleep(0.5)
-                        continue
-                    m = DOMAIN_RE.search(line)
-                    if m:
-                        domain = m.group(1).lower()
-                        client = m.group(2)
-                        now = time.time()
-                        async with self._lock:
-                            self._visited.append((now, domain, client))
-                            if domain not in self._first_seen:
-                                self._first_seen[domain] = now
-        except Exception:
+        parsed: List[Tuple[str, str]] = []
+        for line in lines:
+            m = DOMAIN_RE.search(line)
+            if m:
+                parsed.append((m.group(1).lower(), m.group(2)))
+        if not parsed:
             return
+        now = time.time()
+        async with self._lock:
+            for domain, client in parsed:
+                self._visited.append(now, domain, client)
+                self._domain_counts.add(domain, now)
+                self._pair_counts.add((client, domain), now)
+                self._first_seen.observe(domain, now)
+        dns_log_store.append([(now, client, domain) for domain, client in parsed])
+        # Same shape as /domains "recent" rows
+        live_hub.publish("dns", [[now, domain] for domain, _ in parsed])
+        # The filters are a few MB; persist them at most every 5 minutes
+        if (now - self._first_seen_saved_ts) >= FIRST_SEEN_SAVE_SECONDS:
+            self._first_seen_saved_ts = now
+            await self._save_first_seen()
 
     async def get_recent(self, limit: int = 200) -> List[Tuple[float, str]]:
         async with self._lock:
-            return [(ts, dom) for ts, dom, _ in list(self._visited)[-limit:]]
+            return [(ts, dom) for ts, dom, _ in self._visited.tail(limit)]
 
     async def get_recent_by_client(self, window_seconds: int = 600) -> Dict[str, List[Tuple[str, float]]]:
         import time
         cutoff = time.time() - window_seconds
         out: Dict[str, List[Tuple[str, float]]] = {}
         async with self._lock:
-            for ts, dom, client in self._visited:
-                if ts < cutoff:
-                    continue
+            for ts, dom, client in self._visited.since(cutoff):
                 out.setdefault(client, []).append((dom, ts))
         return out
 
+    async def get_top_domains(self, window_seconds: int = 600, limit: int = 10) -> List[Tuple[str, int]]:
+        import time
+        async with self._lock:
+            return self._domain_counts.top(window_seconds, limit, time.time())  # type: ignore[return-value]
+
     async def get_top_by_client(self, window_seconds: int = 600, limit: int = 10) -> Dict[str, List[Tuple[str, int]]]:
         import time
-        cutoff = time.time() - window_seconds
-        counts: Dict[str, Dict[str, int]] = {}
+        per_client: Dict[str, Dict[str, int]] = {}
+        async with self._lock:
+            for (client, dom), n in self._pair_counts.counts(window_seconds, time.time()).items():
+                per_client.setdefault(client, {})[dom] = n
+        return {
+            client: heapq.nlargest(limit, m.items(), key=itemgetter(1))
+            for client, m in per_client.items()
+        }
+
+    async def get_top_clients_by_domain(self, window_seconds: int = 600, limit: int = 10) -> Dict[str, List[Tuple[str, int]]]:
+        """Top domains by query count, each with its clients sorted by query count."""
+        import time
+        now = time.time()
         async with self._lock:
-            for ts, dom, client in self._visited:
-                if ts < cutoff:
-                    continue
-                bucket = counts.setdefault(client, {})
-                bucket[dom] = bucket.get(dom, 0) + 1
-        top: Dict[str, List[Tuple[str, int]]] = {}
-        for client, m in counts.items():
-            items = sorted(m.items(), key=lambda kv: kv[1], reverse=True)[:limit]
-            top[client] = items
-        return top
+            top = self._domain_counts.top(window_seconds, limit, now)
+            wanted = {dom for dom, _ in top}
+            per_domain: Dict[str, Dict[str, int]] = {}
+            for (client, dom), n in self._pair_counts.counts(window_seconds, now).items():
+                if dom in wanted:
+                    per_domain.setdefault(dom, {})[client] = n
+        return {
+            dom: sorted(per_domain.get(dom, {}).items(), key=lambda kv: kv[1], reverse=True)
+            for dom, _ in top
+        }
 
     async def get_new_domains(self, window_seconds: int = 3600) -> List[Tuple[float, str]]:
         import time
         cutoff = time.time() - window_seconds
         async with self._lock:
-            items = [(ts, dom) for dom, ts in self._first_seen.items() if ts >= cutoff]
-        return sorted(items, key=lambda x: x[0], reverse=True)
+            return self._first_seen.new_since(cutoff)
 
 
 dns_monitor = DNSMonitor()
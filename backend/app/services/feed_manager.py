@@ -0,0 +1,426 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import heapq
+import ipaddress
+import json
+import os
+import re
+import socket
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ..utils.paths import get_app_data_dir
+from .firewall import TABLE, nft_set_exists, run_nft_script
+
+
+FORMATS = ("list", "cidr", "csv")
+_NAME_RE = re.compile(r"^[a-z0-9_]{1,20}$")
+
+# Range record: version (1 byte) + start (16) + end (16), big-endian, so byte order is numeric order
+RECORD_SIZE = 33
+# Records sorted in memory before spilling a run to disk
+SORT_CHUNK_RECORDS = 200000
+# Set elements per nft transaction, and per `element` statement inside it
+CHUNK_ELEMENTS = 20000
+ELEMENTS_PER_LINE = 1000
+
+
+def _set_names(name: str) -> Tuple[str, str]:
+    return f"feed_{name}_v4", f"feed_{name}_v6"
+
+
+def _pack(version: int, start: int, end: int) -> bytes:
+    return bytes((version,)) + start.to_bytes(16, "big") + end.to_bytes(16, "big")
+
+
+def _unpack(rec: bytes) -> Tuple[int, int, int]:
+    return rec[0], int.from_bytes(rec[1:17], "big"), int.from_bytes(rec[17:], "big")
+
+
+def _parse_addr(text: str) -> Optional[Tuple[int, int]]:
+    family, version = (socket.AF_INET6, 6) if ":" in text else (socket.AF_INET, 4)
+    try:
+        return version, int.from_bytes(socket.inet_pton(family, text), "big")
+    except OSError:
+        return None
+
+
+def parse_token(token: str) -> Optional[bytes]:
+    """Address, CIDR or "a-b" range -> range record; None if invalid."""
+    if "-" in token:
+        lo_text, _, hi_text = token.partition("-")
+        lo, hi = _parse_addr(lo_text.strip()), _parse_addr(hi_text.strip())
+        if lo is None or hi is None or lo[0] != hi[0] or lo[1] > hi[1]:
+            return None
+        return _pack(lo[0], lo[1], hi[1])
+    addr_text, _, plen_text = token.partition("/")
+    parsed = _parse_addr(addr_text)
+    if parsed is None:
+        return None
+    version, value = parsed
+    if not plen_text:
+        return _pack(version, value, value)
+    bits = 32 if version == 4 else 128
+    if not plen_text.isdigit() or int(plen_text) > bits:
+        return None
+    host = (1 << (bits - int(plen_text))) - 1
+    return _pack(version, value & ~host, (value & ~host) | host)
+
+
+def format_element(rec: bytes) -> str:
+    version, start, end = _unpack(rec)
+    bits = 32 if version == 4 else 128
+    to_str = (lambda v: str(ipaddress.IPv4Address(v))) if version == 4 else (lambda v: str(ipaddress.IPv6Address(v)))
+    size = end - start + 1
+    if size & (size - 1) == 0 and start % size == 0:
+        plen = bits - (size.bit_length() - 1)
+        return to_str(start) if plen == bits else f"{to_str(start)}/{plen}"
+    return f"{to_str(start)}-{to_str(end)}"
+
+
+def _read_records(path: str, size: int = RECORD_SIZE) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(size * 4096)
+            if not block:
+                return
+            for i in range(0, len(block) - size + 1, size):
+                yield block[i:i + size]
+
+
+def _collapse(records: Iterable[bytes]) -> Iterator[bytes]:
+    """Merge overlapping and adjacent ranges of a sorted record stream."""
+    cur: Optional[List[int]] = None
+    for rec in records:
+        version, start, end = _unpack(rec)
+        if cur is not None and version == cur[0] and start <= cur[2] + 1:
+            if end > cur[2]:
+                cur[2] = end
+            continue
+        if cur is not None:
+            yield _pack(*cur)
+        cur = [version, start, end]
+    if cur is not None:
+        yield _pack(*cur)
+
+
+def _diff(old: Iterator[bytes], new: Iterator[bytes]) -> Iterator[Tuple[bool, bytes]]:
+    """Merge-join two sorted record streams into (True: add / False: remove, record)."""
+    a, b = next(old, None), next(new, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a < b):
+            yield False, a  # type: ignore[misc]
+            a = next(old, None)
+        elif a is None or b < a:
+            yield True, b
+            b = next(new, None)
+        else:
+            a, b = next(old, None), next(new, None)
+
+
+class FeedManager:
+    """Threat-intel feeds (local files or directories) loaded into per-feed nft interval sets.
+
+    - Streaming parse into fixed-size range records; runs are sorted in bounded chunks and
+      spilled to disk, then k-way merged (external sort)
+    - The merged stream is collapsed into non-overlapping ranges and merge-joined against the
+      previous load's snapshot, so only the delta reaches the kernel
+    - The delta is applied in chunked `nft -f` transactions, each holding the removals and additions
+      of one address span, so a range that changed shape is never left unblocked in between
+    - If the kernel set is missing or a previous apply failed, the set is flushed and reloaded
+    """
+
+    def __init__(self) -> None:
+        self._dir = os.path.join(get_app_data_dir(), "feeds")
+        self._config_path = os.path.join(get_app_data_dir(), "feeds.json")
+        self._feeds: Dict[str, Dict[str, Any]] = self._read_config()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        # Feeds this process has loaded into the kernel. The sets are created empty by _sync_rules()
+        # and a reboot empties them, so until a feed is in here its snapshot says nothing about them
+        self._synced: Set[str] = set()
+
+    # ---- config ----
+    def _read_config(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._config_path, "r", encoding="utf-8") as f:
+                return dict((json.load(f) or {}).get("feeds", {}))
+        except Exception:
+            return {}
+
+    def _save_config(self) -> None:
+        try:
+            tmp = self._config_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"feeds": self._feeds}, f, indent=2)
+            os.replace(tmp, self._config_path)
+        except Exception:
+            # ignore save errors
+            pass
+
+    def _snapshot_path(self, name: str) -> str:
+        return os.path.join(self._dir, f"{name}.snap")
+
+    # ---- lifecycle ----
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._load_all())
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.wait([self._task])
+
+    async def _load_all(self) -> None:
+        await self._sync_rules()
+        for name, feed in list(self._feeds.items()):
+            if feed.get("enabled", True):
+                try:
+                    await self.reload(name)
+                except Exception as exc:  # noqa: BLE001
+                    print(f"[feed_manager] {name}: {exc}")
+
+    # ---- nft sets and rules ----
+    def _rules_script(self, dropped: Iterable[str] = ()) -> str:
+        lines = [
+            f"add table {TABLE}",
+            f"add chain {TABLE} feeds_pre {{ type filter hook prerouting priority -150; policy accept; }}",
+            f"add chain {TABLE} feeds_out {{ type filter hook output priority -150; policy accept; }}",
+            f"flush chain {TABLE} feeds_pre",
+            f"flush chain {TABLE} feeds_out",
+        ]
+        for name, feed in sorted(self._feeds.items()):
+            if not feed.get("enabled", True):
+                continue
+            v4, v6 = _set_names(name)
+            lines += [
+                f"add set {TABLE} {v4} {{ type ipv4_addr; flags interval; }}",
+                f"add set {TABLE} {v6} {{ type ipv6_addr; flags interval; }}",
+                f"add rule {TABLE} feeds_pre ip saddr @{v4} drop",
+                f"add rule {TABLE} feeds_pre ip daddr @{v4} drop",
+                f"add rule {TABLE} feeds_pre ip6 saddr @{v6} drop",
+                f"add rule {TABLE} feeds_pre ip6 daddr @{v6} drop",
+                f"add rule {TABLE} feeds_out ip daddr @{v4} drop",
+                f"add rule {TABLE} feeds_out ip6 daddr @{v6} drop",
+            ]
+        for name in dropped:
+            for set_name in _set_names(name):
+                lines.append(f"delete set {TABLE} {set_name}")
+        return "\n".join(lines) + "\n"
+
+    async def _sync_rules(self, dropped: Iterable[str] = ()) -> Tuple[bool, str]:
+        return await asyncio.to_thread(run_nft_script, self._rules_script(dropped))
+
+    # ---- registration ----
+    def list(self) -> List[Dict[str, Any]]:
+        return [{"name": name, **feed} for name, feed in sorted(self._feeds.items())]
+
+    async def register(self, name: str, path: str, fmt: str = "list", column: Optional[str] = None) -> Dict[str, Any]:
+        """Add or replace a feed and load it. Raises ValueError for a bad name, format or path."""
+        if not _NAME_RE.match(name):
+            raise ValueError("feed name must be 1-20 characters of a-z, 0-9, _")
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        if not os.path.exists(path):
+            raise ValueError(f"path not found: {path}")
+        async with self._lock:
+            feed = self._feeds.setdefault(name, {})
+            feed.update({"path": path, "format": fmt, "column": column, "enabled": True})
+            self._save_config()
+            await self._sync_rules()
+        return await self.reload(name)
+
+    async def remove(self, name: str) -> bool:
+        async with self._lock:
+            if self._feeds.pop(name, None) is None:
+                return False
+            self._synced.discard(name)
+            self._save_config()
+            await self._sync_rules(dropped=[name])
+            try:
+                os.remove(self._snapshot_path(name))
+            except OSError:
+                pass
+        return True
+
+    async def reload(self, name: str) -> Dict[str, Any]:
+        async with self._lock:
+            feed = self._feeds.get(name)
+            if feed is None:
+                raise KeyError(name)
+            # First load in this process: the kernel sets may be empty whatever the snapshot says
+            full = bool(feed.get("needs_full")) or name not in self._synced
+            stats = await asyncio.to_thread(self._load, name, dict(feed, needs_full=full))
+            if stats.get("ok"):
+                self._synced.add(name)
+            feed["stats"] = stats
+            # A feed that failed before reaching nft left the sets and snapshot as they were
+            if stats.get("ok") or stats.get("transactions"):
+                feed["needs_full"] = not stats.get("ok", False)
+            self._save_config()
+            return stats
+
+    # ---- loading ----
+    def _tokens(self, feed: Dict[str, Any], stats: Dict[str, Any]) -> Iterator[str]:
+        path = feed["path"]
+        files = [path]
+        if os.path.isdir(path):
+            files = [os.path.join(path, n) for n in sorted(os.listdir(path)) if not n.startswith(".")]
+            files = [p for p in files if os.path.isfile(p)]
+        column = feed.get("column")
+        for file_path in files:
+            with open(file_path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+                if feed.get("format") == "csv":
+                    reader = csv.reader(f)
+                    index = 0
+                    if column is not None and str(column).isdigit():
+                        index = int(column)
+                    elif column is not None:
+                        header = next(reader, [])
+                        stats["lines"] += 1
+                        if column not in header:
+                            raise ValueError(f"column {column!r} not in CSV header of {file_path}")
+                        index = header.index(column)
+                    for row in reader:
+                        stats["lines"] += 1
+                        if row and not row[0].startswith("#"):
+                            yield row[index].strip() if index < len(row) else ""
+                    continue
+                for line in f:
+                    stats["lines"] += 1
+                    line = line.split("#", 1)[0].split(";", 1)[0].strip()
+                    if line:
+                        yield line.replace(",", " ").split(None, 1)[0]
+
+    def _sorted_records(self, feed: Dict[str, Any], stats: Dict[str, Any], tmp_dir: str) -> Iterator[bytes]:
+        runs: List[str] = []
+        chunk: List[bytes] = []
+        for token in self._tokens(feed, stats):
+            rec = parse_token(token)
+            if rec is None:
+                stats["invalid"] += 1
+                continue
+            chunk.append(rec)
+            if len(chunk) >= SORT_CHUNK_RECORDS:
+                chunk.sort()
+                run_path = os.path.join(tmp_dir, f"run{len(runs)}")
+                with open(run_path, "wb") as f:
+                    f.write(b"".join(chunk))
+                runs.append(run_path)
+                chunk = []
+        chunk.sort()
+        if not runs:
+            return iter(chunk)
+        return heapq.merge(iter(chunk), *(_read_records(p) for p in runs))
+
+    def _apply_chunk(self, name: str, ops: List[Tuple[bool, bytes]], prefix: str = "") -> Tuple[bool, str]:
+        """One transaction: `prefix`, then the chunk's removals, then its additions."""
+        v4, v6 = _set_names(name)
+        lines = [prefix] if prefix else []
+        for verb, want in (("delete", False), ("add", True)):
+            by_set: Dict[str, List[str]] = {v4: [], v6: []}
+            for add, rec in ops:
+                if add is want:
+                    by_set[v4 if rec[0] == 4 else v6].append(format_element(rec))
+            for set_name, items in by_set.items():
+                for i in range(0, len(items), ELEMENTS_PER_LINE):
+                    lines.append(f"{verb} element {TABLE} {set_name} {{ {', '.join(items[i:i + ELEMENTS_PER_LINE])} }}")
+        if not lines:
+            return True, ""
+        return run_nft_script("\n".join(lines) + "\n", timeout=120.0)
+
+    def _load(self, name: str, feed: Dict[str, Any]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        stats: Dict[str, Any] = {"lines": 0, "invalid": 0, "entries": 0, "added": 0, "removed": 0,
+                                 "transactions": 0, "ok": False, "error": None, "full": False}
+        os.makedirs(self._dir, exist_ok=True)
+        snap_path = self._snapshot_path(name)
+        full = bool(feed.get("needs_full")) or not os.path.exists(snap_path) or not nft_set_exists(_set_names(name)[0])
+        stats["full"] = full
+        parse_seconds = 0.0
+        apply_seconds = 0.0
+        ok, err = True, ""
+        with tempfile.TemporaryDirectory(dir=self._dir) as tmp_dir:
+
+            def parsed() -> Iterator[bytes]:
+                # Parsing, run sorting and the lazy k-way merge all happen while this is pulled: time that
+                nonlocal parse_seconds
+                ta = time.perf_counter()
+                stream = self._sorted_records(feed, stats, tmp_dir)
+                while True:
+                    rec = next(stream, None)
+                    parse_seconds += time.perf_counter() - ta
+                    if rec is None:
+                        return
+                    yield rec
+                    ta = time.perf_counter()
+
+            new_snap = os.path.join(tmp_dir, "snapshot")
+            ops_path = os.path.join(tmp_dir, "ops")
+            t1 = time.perf_counter()
+            try:
+                with open(new_snap, "wb") as snap_out, open(ops_path, "wb") as ops_out:
+                    def tee(stream: Iterator[bytes]) -> Iterator[bytes]:
+                        for rec in stream:
+                            snap_out.write(rec)
+                            stats["entries"] += 1
+                            yield rec
+
+                    old: Iterator[bytes] = iter(()) if full else _read_records(snap_path)
+                    # Delta in address order, removals and additions interleaved: one flag byte + record
+                    for add, rec in _diff(old, tee(_collapse(parsed()))):
+                        ops_out.write(b"\x01" + rec if add else b"\x00" + rec)
+            except ValueError as exc:
+                ok, err = False, str(exc)
+            stats["parse_ms"] = round(parse_seconds * 1000, 1)
+            stats["merge_ms"] = round((time.perf_counter() - t1 - parse_seconds) * 1000, 1)
+
+            # The first transaction of a full load also empties the sets
+            v4, v6 = _set_names(name)
+            prefix = f"flush set {TABLE} {v4}\nflush set {TABLE} {v6}" if full else ""
+
+            def apply(chunk: List[Tuple[bool, bytes]]) -> None:
+                nonlocal ok, err, apply_seconds, prefix
+                ta = time.perf_counter()
+                ok, err = self._apply_chunk(name, chunk, prefix)
+                apply_seconds += time.perf_counter() - ta
+                stats["transactions"] += 1
+                if ok:
+                    stats["added"] += sum(1 for add, _rec in chunk if add)
+                    stats["removed"] += sum(1 for add, _rec in chunk if not add)
+                prefix = ""
+
+            if ok:
+                chunk: List[Tuple[bool, bytes]] = []
+                # Highest (version, end) the chunk covers: a chunk only ends where the next op starts past it,
+                # so the removal and re-addition of a reshaped range share a transaction
+                reach: Optional[Tuple[int, int]] = None
+                for op in _read_records(ops_path, RECORD_SIZE + 1):
+                    add, rec = op[0] == 1, op[1:]
+                    version, start, end = _unpack(rec)
+                    if len(chunk) >= CHUNK_ELEMENTS and (reach is None or version != reach[0] or start > reach[1]):
+                        apply(chunk)
+                        chunk = []
+                        reach = None
+                        if not ok:
+                            break
+                    chunk.append((add, rec))
+                    reach = (version, max(end, reach[1])) if reach is not None and reach[0] == version else (version, end)
+                if ok and (chunk or prefix):
+                    apply(chunk)
+
+            if ok:
+                os.replace(new_snap, snap_path)
+        stats["ok"] = ok
+        stats["error"] = None if ok else (err or "nft transaction failed")[:500]
+        stats["apply_ms"] = round(apply_seconds * 1000, 1)
+        stats["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        stats["loaded_at"] = time.time()
+        return stats
+
+
+feed_manager = FeedManager()
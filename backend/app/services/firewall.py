@@ -1,26 +1,367 @@
 from __future__ import annotations
 
+import asyncio
+import ipaddress
+import json
+import os
 import subprocess
-from typing import Optional
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 
-def block_ip(ip: str) -> bool:
-    # nftables preferred; fall back to iptables
+TABLE = "inet routergeist_filter"
+SET_V4 = "blocked_v4"
+SET_V6 = "blocked_v6"
+# Elements per `add/delete element` statement; a batch is still one transaction
+ELEMENTS_PER_LINE = 1000
+# How long the flush loop waits for more changes to share one transaction
+BATCH_WAIT_SECONDS = 0.2
+
+# Named interval sets referenced by one drop rule per direction. The chains are our own,
+# so apply_router.sh flushing input/forward never touches them.
+SETUP = f"""add table {TABLE}
+add set {TABLE} {SET_V4} {{ type ipv4_addr; flags interval; }}
+add set {TABLE} {SET_V6} {{ type ipv6_addr; flags interval; }}
+add chain {TABLE} blocklist_pre {{ type filter hook prerouting priority -150; policy accept; }}
+add chain {TABLE} blocklist_out {{ type filter hook output priority -150; policy accept; }}
+flush chain {TABLE} blocklist_pre
+flush chain {TABLE} blocklist_out
+add rule {TABLE} blocklist_pre ip saddr @{SET_V4} drop
+add rule {TABLE} blocklist_pre ip daddr @{SET_V4} drop
+add rule {TABLE} blocklist_pre ip6 saddr @{SET_V6} drop
+add rule {TABLE} blocklist_pre ip6 daddr @{SET_V6} drop
+add rule {TABLE} blocklist_out ip daddr @{SET_V4} drop
+add rule {TABLE} blocklist_out ip6 daddr @{SET_V6} drop
+"""
+
+
+def _is_root() -> bool:
     try:
-        subprocess.run(["sudo", "/bin/bash", "/opt/routergeist/scripts/privileged/assign_roles.sh", "block_ip", ip], check=False)
-        return True
+        return os.geteuid() == 0  # type: ignore[attr-defined]
     except Exception:
-        try:
-            subprocess.run(["sudo", "nft", "add", "rule", "inet", "filter", "input", "ip", "saddr", ip, "drop"], check=False)
-            subprocess.run(["sudo", "nft", "add", "rule", "inet", "filter", "forward", "ip", "saddr", ip, "drop"], check=False)
-            return True
-        except Exception:
+        return False
+
+
+def _nft_cmd(*args: str) -> List[str]:
+    # If we are root (e.g., inside the Docker container) run directly without sudo
+    return ["nft", *args] if _is_root() else ["sudo", "-n", "nft", *args]
+
+
+def run_nft_script(script: str, timeout: float = 60.0) -> Tuple[bool, str]:
+    """Apply `script` as one atomic `nft -f -` transaction; returns (ok, stderr)."""
+    try:
+        p = subprocess.run(_nft_cmd("-f", "-"), input=script, capture_output=True, text=True, check=False, timeout=timeout)
+    except Exception as exc:  # noqa: BLE001
+        return False, str(exc)
+    return p.returncode == 0, (p.stderr or "").strip()
+
+
+def nft_set_exists(set_name: str) -> bool:
+    try:
+        # -t: terse, leave out the elements
+        p = subprocess.run(_nft_cmd("-t", "list", "set", *TABLE.split(), set_name),
+                           capture_output=True, text=True, check=False, timeout=30)
+        return p.returncode == 0
+    except Exception:
+        return False
+
+
+def normalize_element(value: str) -> Optional[str]:
+    """Canonical set element for an address or CIDR ("1.2.3.4", "10.0.0.0/8"); None if invalid."""
+    try:
+        net = ipaddress.ip_network(str(value).strip(), strict=False)
+    except ValueError:
+        return None
+    if net.num_addresses == 1:
+        return str(net.network_address)
+    return str(net)
+
+
+def _set_for(element: str) -> str:
+    return SET_V6 if ":" in element else SET_V4
+
+
+def _element_lines(verb: str, elements: Iterable[str]) -> List[str]:
+    lines: List[str] = []
+    by_set: Dict[str, List[str]] = {SET_V4: [], SET_V6: []}
+    for e in elements:
+        by_set[_set_for(e)].append(e)
+    for set_name, items in by_set.items():
+        for i in range(0, len(items), ELEMENTS_PER_LINE):
+            lines.append(f"{verb} element {TABLE} {set_name} {{ {', '.join(items[i:i + ELEMENTS_PER_LINE])} }}")
+    return lines
+
+
+def _parse_set_elements(payload: Dict[str, Any]) -> Set[str]:
+    out: Set[str] = set()
+    for item in payload.get("nftables", []):
+        elems = (item.get("set") or {}).get("elem") or []
+        for e in elems:
+            if isinstance(e, dict) and "elem" in e:
+                e = e["elem"].get("val", e["elem"])
+            if isinstance(e, str):
+                out.add(e)
+            elif isinstance(e, dict) and "prefix" in e:
+                out.add(f"{e['prefix']['addr']}/{e['prefix']['len']}")
+            elif isinstance(e, dict) and "range" in e:
+                out.add(f"{e['range'][0]}-{e['range'][1]}")
+    return out
+
+
+class Firewall:
+    """Block addresses through nftables named sets.
+
+    - One interval set per family in the routergeist_filter table, matched by a single drop rule,
+      so lookups stay O(1)-ish per packet however many addresses are blocked
+    - block()/unblock() only queue the change; a flush loop applies everything queued since the
+      last run as one `nft -f -` transaction
+    - The live set contents are mirrored in memory so removals only name present elements
+      (a missing element would fail the whole transaction)
+    """
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._stop = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        # Serialises nft transactions and _live updates between the flush loop and reconcile
+        self._apply_lock = threading.Lock()
+        # element -> True (add) / False (remove); last request wins
+        self._pending: Dict[str, bool] = {}
+        self._live: Set[str] = set()
+        self._ready = False
+        self.last_error: Optional[str] = None
+        self.last_batch: Dict[str, Any] = {}
+        self.last_reconcile: Dict[str, Any] = {}
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop.clear()
+        await self.ensure()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._task:
+            await asyncio.wait([self._task])
+        await self.flush()
+
+    # ---- nft plumbing ----
+    def _run_script(self, script: str) -> Tuple[bool, str]:
+        return run_nft_script(script)
+
+    def _list_live(self) -> Optional[Set[str]]:
+        live: Set[str] = set()
+        for set_name in (SET_V4, SET_V6):
             try:
-                subprocess.run(["sudo", "iptables", "-I", "INPUT", "-s", ip, "-j", "DROP"], check=False)
-                subprocess.run(["sudo", "iptables", "-I", "FORWARD", "-s", ip, "-j", "DROP"], check=False)
-                return True
+                p = subprocess.run(_nft_cmd("-j", "list", "set", *TABLE.split(), set_name),
+                                   capture_output=True, text=True, check=False, timeout=30)
+                if p.returncode != 0:
+                    return None
+                live |= _parse_set_elements(json.loads(p.stdout or "{}"))
             except Exception:
-                return False
+                return None
+        return live
+
+    def _ensure_sync(self) -> bool:
+        ok, err = self._run_script(SETUP)
+        if not ok:
+            self.last_error = err or "nft setup failed"
+            return False
+        live = self._list_live()
+        if live is not None:
+            self._live = live
+        self._ready = True
+        return True
+
+    async def ensure(self) -> bool:
+        """Create the sets and drop rules if missing and reload the live set contents."""
+        return await asyncio.to_thread(self._ensure_sync)
+
+    # ---- queueing ----
+    def block(self, value: str) -> bool:
+        element = normalize_element(value)
+        if element is None:
+            return False
+        self._pending[element] = True
+        self._wake.set()
+        return True
+
+    def unblock(self, value: str) -> bool:
+        element = normalize_element(value)
+        if element is None:
+            return False
+        self._pending[element] = False
+        self._wake.set()
+        return True
+
+    def is_live(self, value: str) -> bool:
+        element = normalize_element(value)
+        return element is not None and element in self._live
+
+    # ---- flushing ----
+    async def _run(self) -> None:
+        while not self._stop.is_set():
+            await self._wake.wait()
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            # Let a burst of changes accumulate into one transaction
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=BATCH_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as exc:  # noqa: BLE001
+                self.last_error = str(exc)[:500]
+
+    def _apply(self, adds: List[str], removes: List[str]) -> Tuple[bool, str]:
+        script = "\n".join(_element_lines("delete", removes) + _element_lines("add", adds)) + "\n"
+        return self._run_script(script)
+
+    def _flush_sync(self, pending: Dict[str, bool]) -> Tuple[Dict[str, bool], List[str]]:
+        with self._apply_lock:
+            return self._flush_locked(pending)
 
+    def _apply_split(self, ops: List[Tuple[str, bool]]) -> Tuple[List[Tuple[str, bool]], List[str], str]:
+        """Apply `ops` in halves until every failure is pinned to a single element.
+
+        Returns (applied ops, rejected elements, last error); costs O(k log n) transactions for k bad elements.
+        """
+        if not ops:
+            return [], [], ""
+        ok, err = self._apply([e for e, add in ops if add], [e for e, add in ops if not add])
+        if ok:
+            return ops, [], ""
+        if len(ops) == 1:
+            return [], [ops[0][0]], err
+        mid = len(ops) // 2
+        applied, rejected, err_lo = self._apply_split(ops[:mid])
+        applied_hi, rejected_hi, err_hi = self._apply_split(ops[mid:])
+        return applied + applied_hi, rejected + rejected_hi, err_hi or err_lo
+
+    def _flush_locked(self, pending: Dict[str, bool]) -> Tuple[Dict[str, bool], List[str]]:
+        """Apply `pending`; returns (changes to queue again, elements nft rejected and that were dropped)."""
+        if not self._ready and not self._ensure_sync():
+            return pending, []
+        adds = [e for e, add in pending.items() if add and e not in self._live]
+        removes = [e for e, add in pending.items() if not add and e in self._live]
+        if not adds and not removes:
+            return {}, []
+        t0 = time.perf_counter()
+        ok, err = self._apply(adds, removes)
+        if not ok:
+            # Our mirror may be stale (set flushed or edited outside): resync and retry once
+            live = self._list_live()
+            if live is not None:
+                self._live = live
+                adds = [e for e in adds if e not in live]
+                removes = [e for e in removes if e in live]
+                ok, err = self._apply(adds, removes) if (adds or removes) else (True, "")
+        rejected: List[str] = []
+        retry: Dict[str, bool] = {}
+        if not ok:
+            # Still failing: split the batch so one bad element does not hold back the others
+            applied, rejected, err = self._apply_split([(e, True) for e in adds] + [(e, False) for e in removes])
+            if applied:
+                adds = [e for e, add in applied if add]
+                removes = [e for e, add in applied if not add]
+                ok = True
+            else:
+                # Nothing went through: nft itself is failing, not an element. Keep it all for the next attempt
+                retry = {e: True for e in adds}
+                retry.update({e: False for e in removes})
+                adds, removes, rejected = [], [], []
+        self.last_batch = {
+            "added": len(adds),
+            "removed": len(removes),
+            "rejected": rejected,
+            "ok": ok and not rejected,
+            "duration_ms": round((time.perf_counter() - t0) * 1000, 2),
+            "ts": time.time(),
+        }
+        self._live.difference_update(removes)
+        self._live.update(adds)
+        if rejected:
+            self.last_error = f"nft rejected {', '.join(rejected[:5])}: {err}"[:500]
+        elif retry:
+            self.last_error = err or "nft transaction failed"
+        else:
+            self.last_error = None
+        return retry, rejected
+
+    async def flush(self) -> bool:
+        """Apply all queued adds/removes now, as a single transaction.
+
+        Returns False when something was not applied: changes nft could not take at all stay queued,
+        elements it rejects individually are dropped (see last_batch["rejected"]).
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return True
+            pending, self._pending = self._pending, {}
+            retry, rejected = await asyncio.to_thread(self._flush_sync, pending)
+            # Newer requests for the same element win over the requeued ones
+            for element, add in retry.items():
+                self._pending.setdefault(element, add)
+            return not retry and not rejected
+
+    def reconcile_sync(self, expected: Iterable[str]) -> Dict[str, Any]:
+        """Make the kernel sets hold exactly `expected` (set elements) in one transaction.
+
+        Used at startup and after a router apply: restores what a reboot or ruleset reload dropped
+        and clears anything not in the persisted blocklist.
+        """
+        t0 = time.perf_counter()
+        want = {e for e in (normalize_element(x) for x in expected) if e is not None}
+        report: Dict[str, Any] = {"elements": len(want), "restored": 0, "removed": 0, "ok": False, "error": None}
+        with self._apply_lock:
+            if not self._ensure_sync():
+                report["error"] = self.last_error
+            else:
+                live = self._list_live()
+                if live is None:
+                    report["error"] = "could not list blocklist sets"
+                else:
+                    adds = sorted(want - live)
+                    removes = sorted(live - want)
+                    ok, err = self._apply(adds, removes) if (adds or removes) else (True, "")
+                    if ok:
+                        self._live = want
+                        report.update(restored=len(adds), removed=len(removes), ok=True)
+                    else:
+                        self._live = live
+                        report["error"] = err or "nft transaction failed"
+        report["duration_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        report["ts"] = time.time()
+        self.last_reconcile = report
+        return report
+
+    async def reconcile(self, expected: Iterable[str]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.reconcile_sync, list(expected))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self._ready,
+            "elements": len(self._live),
+            "pending": len(self._pending),
+            "last_batch": self.last_batch,
+            "last_reconcile": self.last_reconcile,
+            "last_error": self.last_error,
+        }
+
+
+firewall = Firewall()
+
+
+def block_ip(ip: str) -> bool:
+    """Queue an address for blocking; False if it is not a valid address."""
+    return firewall.block(ip)
 
 
+def unblock_ip(ip: str) -> bool:
+    return firewall.unblock(ip)
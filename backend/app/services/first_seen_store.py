@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import time
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+
+from ..config import settings
+from ..utils.bloom import BloomFilter
+from ..utils.paths import get_app_data_dir
+
+
+_FILE_HEADER = struct.Struct("<4sBB")  # magic, version, generations
+_FILE_MAGIC = b"RGFS"
+
+
+class FirstSeenStore:
+    """Bounded memory of which domains have been seen, for the "new domain" signal.
+
+    - Exact LRU of recently seen domains absorbs the hot set without hashing into the filter
+    - Two generations of bloom filters remember older history; when the current one fills up
+      the previous one is dropped, so memory stays capped at two filters
+    - A domain found only in the previous generation is copied into the current one, and a new
+      generation starts with every domain in the LRU, so anything seen since the current generation
+      began survives the rotation. A domain last seen before that is forgotten when its generation
+      is dropped and is reported as first seen again: after a long silence, a rarely queried
+      domain can be flagged as new a second time
+    - First-seen events are kept in arrival order, so window reads walk back from the newest
+    """
+
+    def __init__(self) -> None:
+        self._recent_cap = max(1, settings.dns_recent_domains)
+        self._capacity = max(1000, settings.dns_seen_capacity)
+        self._retention = max(60, settings.dns_new_domains_retention)
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._current = BloomFilter(self._capacity)
+        self._previous: Optional[BloomFilter] = None
+        self._order: Deque[Tuple[float, str]] = deque(maxlen=max(1, settings.dns_new_domains_max))
+        run_dir = os.path.join(get_app_data_dir(), "run")
+        self._bloom_path = os.path.join(run_dir, "dns_seen.bin")
+        self._index_path = os.path.join(run_dir, "dns_first_seen.json")
+        self._dirty = False
+
+    def observe(self, domain: str, now: float) -> bool:
+        """Record a query for domain; return True if it was never seen before."""
+        recent = self._recent
+        if domain in recent:
+            recent.move_to_end(domain)
+            return False
+        recent[domain] = None
+        if len(recent) > self._recent_cap:
+            recent.popitem(last=False)
+        if domain in self._current:
+            return False
+        if self._previous is not None and domain in self._previous:
+            # Still in use: carry it over so dropping the previous generation does not forget it
+            self._remember(domain)
+            self._dirty = True
+            return False
+        self._remember(domain)
+        self._order.append((now, domain))
+        self._trim(now)
+        self._dirty = True
+        return True
+
+    def _remember(self, domain: str) -> None:
+        if self._current.full:
+            self._previous = self._current
+            self._current = BloomFilter(self._capacity)
+            # Recently seen domains (the caller's included) start out in the new generation
+            for recent in self._recent:
+                self._current.add(recent)
+        self._current.add(domain)
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self._retention
+        order = self._order
+        while order and order[0][0] < cutoff:
+            order.popleft()
+
+    def new_since(self, cutoff: float) -> List[Tuple[float, str]]:
+        """First-seen (ts, domain) pairs at or after cutoff, newest first."""
+        out: List[Tuple[float, str]] = []
+        for ts, dom in reversed(self._order):
+            if ts < cutoff:
+                break
+            out.append((ts, dom))
+        return out
+
+    # ---- persistence ----
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def snapshot(self) -> Tuple[bytes, List[Tuple[float, str]]]:
+        """Serialize state for writing outside the caller's lock."""
+        gens = [self._current] + ([self._previous] if self._previous is not None else [])
+        blob = _FILE_HEADER.pack(_FILE_MAGIC, 1, len(gens)) + b"".join(g.to_bytes() for g in gens)
+        self._dirty = False
+        return blob, list(self._order)
+
+    def write(self, blob: bytes, order: List[Tuple[float, str]]) -> None:
+        try:
+            os.makedirs(os.path.dirname(self._bloom_path), exist_ok=True)
+            tmp = self._bloom_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, self._bloom_path)
+            tmp = self._index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "items": order}, f)
+            os.replace(tmp, self._index_path)
+        except Exception:
+            # ignore save errors
+            pass
+
+    def load(self) -> None:
+        try:
+            if os.path.exists(self._bloom_path):
+                with open(self._bloom_path, "rb") as f:
+                    data = f.read()
+                magic, _version, ngen = _FILE_HEADER.unpack_from(data, 0)
+                if magic == _FILE_MAGIC and ngen >= 1:
+                    offset = _FILE_HEADER.size
+                    gens: List[BloomFilter] = []
+                    for _ in range(ngen):
+                        gens.append(BloomFilter.from_bytes(data, offset))
+                        offset += BloomFilter.serialized_size(data, offset)
+                    self._current = gens[0]
+                    self._previous = gens[1] if len(gens) > 1 else None
+        except Exception:
+            self._current = BloomFilter(self._capacity)
+            self._previous = None
+        try:
+            if os.path.exists(self._index_path):
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    payload = json.load(f)
+                self._order.clear()
+                for ts, dom in payload.get("items", []):
+                    self._order.append((float(ts), str(dom)))
+                self._trim(time.time())
+        except Exception:
+            self._order.clear()
@@ -11,7 +11,7 @@ try:
 except Exception:  # pragma: no cover
     psutil = None  # type: ignore
 
-from .threat_detector import threat_detector
+from .alert_coalescer import alert_coalescer
 
 
 class FlowMonitor:
@@ -96,11 +96,11 @@ class FlowMonitor:
         for ip, count in counts_per_ip.items():
             if count >= self._rate_threshold:
                 msg = f"Flow anomaly: high outbound connection rate to {ip} count={count} in ~{int(self._window)}s"
-                await threat_detector.analyze(source="flow_monitor", message=msg)
+                await alert_coalescer.submit("flow_monitor", "rate", ip, msg)
         for ip, c in suspicious_ports.items():
             if c >= 5:
                 msg = f"Flow anomaly: repeated connections to uncommon service from local host to {ip} occurrences={c}"
-                await threat_detector.analyze(source="flow_monitor", message=msg)
+                await alert_coalescer.submit("flow_monitor", "uncommon_port", ip, msg)
 
 
 flow_monitor = FlowMonitor()
@@ -4,12 +4,14 @@ import asyncio
 import json
 import os
 import subprocess
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from typing import Dict, List, Optional
 
 from ..config import settings
 from ..utils.paths import get_app_data_dir
 from ..services.router_apply import apply_router_config
+from ..services.blocklist_store import blocklist_store
+from .live_hub import live_hub
 
 
 WIRELESS_SYS_PATH = "/sys/class/net/{iface}/wireless"
@@ -35,6 +37,8 @@ class InterfaceManager:
         self._roles: Dict[str, str] = {}
         # Track which iface we last applied AP stack for, to avoid flapping
         self._ap_applied_iface: Optional[str] = None
+        # Last status pushed to live dashboards
+        self._published: List[Dict[str, object]] = []
 
     async def start(self) -> None:
         if self._task and not self._task.done():
@@ -51,11 +55,18 @@ class InterfaceManager:
         while not self._stop_event.is_set():
             try:
                 await self._scan_and_assign()
+                self._publish_status()
             except Exception as exc:  # noqa: BLE001
                 # Logged to stderr; keep running
                 print(f"[interface_manager] error: {exc}")
             await asyncio.sleep(5)
 
+    def _publish_status(self) -> None:
+        status = [asdict(i) for i in self._interfaces.values()]
+        if status != self._published:
+            self._published = status
+            live_hub.publish("interfaces", {"interfaces": status}, replace=True)
+
     async def get_status(self) -> List[InterfaceInfo]:
         async with self._lock:
             return list(self._interfaces.values())
@@ -69,11 +80,13 @@ class InterfaceManager:
                 raise ValueError("Invalid role; must be 'AP' or 'WAN'")
             info.role = role
             self._roles[interface_name] = role
+            self._publish_status()
         # Apply role out-of-lock
         if role == "WAN":
             self._bring_up_wan(interface_name)
         elif role == "AP":
-            self._bring_up_ap(interface_name)
+            # The apply script and blocklist restore run nft/ip subprocesses: keep them off the loop
+            await asyncio.to_thread(self._bring_up_ap, interface_name, blocklist_store.collapsed())
 
     async def _scan_and_assign(self) -> None:
         interfaces = self._scan_interfaces()
@@ -174,12 +187,12 @@ class InterfaceManager:
             except Exception as exc:  # noqa: BLE001
                 print(f"[interface_manager] WAN connect error: {exc}")
 
-    def _bring_up_ap(self, iface: str) -> None:
+    def _bring_up_ap(self, iface: str, blocklist: List[str]) -> None:
         # Delegate to systemd-managed apply script once to avoid flapping
         if self._ap_applied_iface == iface:
             return
         try:
-            apply_router_config()
+            apply_router_config(blocklist)
             self._ap_applied_iface = iface
             print(f"[interface_manager] ensured AP via apply_router_config on {iface}")
         except Exception as exc:  # noqa: BLE001
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from ..config import settings
+
+
+TOPICS = ("traffic", "activity", "threats", "dns", "interfaces", "blocklist")
+# Updates published within this interval share one message per topic
+FLUSH_INTERVAL = 0.25
+
+
+class Subscriber:
+    """One dashboard connection: its topics and a bounded queue of encoded messages."""
+
+    def __init__(self, queue_size: int) -> None:
+        self.topics: Set[str] = set()
+        # Encoded messages; None tells the sender the connection fell behind and must close
+        self.queue: asyncio.Queue[Optional[str]] = asyncio.Queue(maxsize=max(1, queue_size))
+        self.slow = False
+
+
+class LiveHub:
+    """Push service updates to dashboard WebSocket connections.
+
+    - Services call publish(topic, item) when something changes; items are buffered per topic and a
+      flush loop turns each topic's batch into one {"topic", "items"} message every FLUSH_INTERVAL
+    - A message is encoded once and the same string is queued for every subscribed connection, so
+      the cost of an update does not grow with the number of open dashboards
+    - Nothing is encoded for topics nobody subscribes to
+    - Each connection has a bounded queue (LIVE_QUEUE_SIZE messages). A connection that falls that far
+      behind is dropped as a slow consumer; the client reconnects and resyncs over HTTP instead of the
+      server buffering for it without bound
+    """
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._stop = asyncio.Event()
+        self._subs: Set[Subscriber] = set()
+        # topic -> number of subscribed connections
+        self._counts: Dict[str, int] = {t: 0 for t in TOPICS}
+        # topic -> JSON-encoded items waiting for the next flush
+        self._pending: Dict[str, List[str]] = {t: [] for t in TOPICS}
+        self.messages = 0
+        self.slow_dropped = 0
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            await asyncio.wait([self._task])
+        for sub in list(self._subs):
+            self._drop(sub)
+
+    async def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.flush()
+
+    # ---- publishing (event loop only) ----
+    def wants(self, topic: str) -> bool:
+        return self._counts.get(topic, 0) > 0
+
+    def publish(self, topic: str, item: Any, replace: bool = False) -> None:
+        """Queue `item` for subscribers of `topic`; with `replace`, only the latest item is kept (snapshots)."""
+        if self.wants(topic):
+            self.publish_json(topic, json.dumps(item, default=str), replace=replace)
+
+    def publish_json(self, topic: str, encoded: str, replace: bool = False) -> None:
+        """Like publish() for an item that is already JSON text."""
+        if not self.wants(topic):
+            return
+        if replace:
+            self._pending[topic] = [encoded]
+        else:
+            self._pending[topic].append(encoded)
+
+    def flush(self) -> None:
+        for topic, items in self._pending.items():
+            if not items:
+                continue
+            self._pending[topic] = []
+            message = f'{{"topic":{json.dumps(topic)},"items":[{",".join(items)}]}}'
+            self.messages += 1
+            for sub in list(self._subs):
+                if topic not in sub.topics or sub.slow:
+                    continue
+                try:
+                    sub.queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    self._drop(sub)
+                    self.slow_dropped += 1
+
+    # ---- connections ----
+    def connect(self) -> Subscriber:
+        sub = Subscriber(settings.live_queue_size)
+        self._subs.add(sub)
+        return sub
+
+    def subscribe(self, sub: Subscriber, topics: Iterable[str]) -> None:
+        for topic in topics:
+            if topic in self._counts and topic not in sub.topics:
+                sub.topics.add(topic)
+                self._counts[topic] += 1
+
+    def unsubscribe(self, sub: Subscriber, topics: Iterable[str]) -> None:
+        for topic in topics:
+            if topic in sub.topics:
+                sub.topics.discard(topic)
+                self._counts[topic] -= 1
+                if not self._counts[topic]:
+                    self._pending[topic] = []
+
+    def disconnect(self, sub: Subscriber) -> None:
+        if sub in self._subs:
+            self._subs.discard(sub)
+            self.unsubscribe(sub, list(sub.topics))
+
+    def _drop(self, sub: Subscriber) -> None:
+        # Whatever is queued is stale by now: replace it with the close signal
+        sub.slow = True
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+        self.disconnect(sub)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self._subs),
+            "subscribers": dict(self._counts),
+            "messages": self.messages,
+            "slow_dropped": self.slow_dropped,
+        }
+
+
+live_hub = LiveHub()
@@ -4,126 +4,306 @@ import asyncio
 import json
 import os
 import time
-from collections import deque
-from typing import Deque, Dict, List, Optional, Tuple
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
 from .stats_service import stats_service
+from ..utils.decimate import DecimationCache, Point, decimate
 from ..utils.paths import get_app_data_dir
+from ..utils.rrd import (
+    COUNT,
+    RX_BYTES,
+    RX_MAX,
+    RX_SUM,
+    START,
+    TX_BYTES,
+    TX_MAX,
+    TX_SUM,
+    Archive,
+    Bucket,
+    add_sample,
+    bucket_value,
+    merge,
+    new_bucket,
+)
+
+
+# (resolution, retention) in seconds, finest first; each level is consolidated from the one before
+LEVELS: Tuple[Tuple[int, int], ...] = ((1, 3600), (60, 7 * 86400), (900, 90 * 86400), (3600, 2 * 365 * 86400))
+# How often the archives are synced to disk and the open buckets saved
+FLUSH_SECONDS = 60.0
+
+
+class NicRollup:
+    """One NIC's archives, finest first, plus the bucket each level is currently filling."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.archives = [Archive(os.path.join(directory, f"{res}.rrd"), res, ret // res) for res, ret in LEVELS]
+        self.open: List[Optional[Bucket]] = [None] * len(LEVELS)
+        self._load_open()
+
+    def add(self, ts: float, rx: float, tx: float, rx_bytes: float, tx_bytes: float) -> None:
+        start = ts - ts % LEVELS[0][0]
+        cur = self.open[0]
+        if cur is not None and start > cur[START]:
+            self._close(0)
+            cur = None
+        if cur is None:
+            cur = self.open[0] = new_bucket(start)
+        add_sample(cur, rx, tx, rx_bytes, tx_bytes)
+
+    def add_closed(self, level: int, b: Bucket) -> None:
+        """Store an already complete bucket at `level` (imports) and consolidate it upwards."""
+        self.archives[level].append(b)
+        self._consolidate(level + 1, b)
+
+    def _close(self, level: int) -> None:
+        b = self.open[level]
+        self.open[level] = None
+        if b is not None:
+            self.add_closed(level, b)
+
+    def _consolidate(self, level: int, b: Bucket) -> None:
+        # Fold a closed finer bucket into this level's open bucket, closing that one first once b is past it
+        if level >= len(LEVELS):
+            return
+        res = LEVELS[level][0]
+        start = b[START] - b[START] % res
+        cur = self.open[level]
+        if cur is not None and start > cur[START]:
+            self._close(level)
+            cur = None
+        if cur is None:
+            cur = self.open[level] = new_bucket(start)
+        merge(cur, b)
+
+    def buckets(self, level: int, start: float, end: Optional[float] = None) -> List[Bucket]:
+        """Closed buckets starting in [start, end), then the partial one still filling."""
+        rows = self.archives[level].rows(start, end)
+        cur = self.open[level]
+        if cur is not None and cur[START] >= start and (end is None or cur[START] < end):
+            rows.append(list(cur))
+        return rows
+
+    def version(self, level: int) -> Tuple[int, Optional[float], float]:
+        cur = self.open[level]
+        return len(self.archives[level]), self.archives[level].last_start(), cur[COUNT] if cur else 0.0
+
+    # ---- persistence ----
+    def _open_path(self) -> str:
+        return os.path.join(self.directory, "open.json")
+
+    def _load_open(self) -> None:
+        try:
+            with open(self._open_path(), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if isinstance(saved, list) and len(saved) == len(LEVELS):
+                self.open = [list(map(float, b)) if b else None for b in saved]
+        except Exception:
+            pass
+
+    def save(self) -> None:
+        for archive in self.archives:
+            archive.flush()
+        try:
+            tmp = self._open_path() + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.open, f)
+            os.replace(tmp, self._open_path())
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self.save()
+        for archive in self.archives:
+            archive.close()
 
 
 class LongTermService:
-    """Persist per-minute per-NIC rx/tx averages for up to 7 days.
+    """Multi-resolution per-NIC traffic history, round-robin (RRD) style.
 
-    Stores data in a small JSON file under the app data directory so it survives restarts.
+    - Fed by every StatsService sample and consolidated into 1s/1h, 1m/7d, 15m/90d and 1h/2y levels
+    - A bucket keeps the rate's sum (for the average), min and max plus the byte total per direction.
+      When a bucket closes it is written to its level's archive and folded into the next coarser open
+      bucket, so nothing is ever recomputed from raw samples
+    - Archives are fixed-size memory-mapped files under run/rollups/<nic>/ (see utils.rrd); the open
+      buckets are saved alongside so a restart continues them
+    - Queries pick the resolution from the window and the point budget, so a year reads ~9k rows, not 500k
     """
 
     def __init__(self) -> None:
         self._task: Optional[asyncio.Task] = None
         self._stop = asyncio.Event()
-        self._lock = asyncio.Lock()
-        # per-nic minute samples: (ts_seconds, rx_bps, tx_bps)
-        self._mins: Dict[str, Deque[Tuple[float, float, float]]] = {}
-        self._max_minutes: int = 7 * 24 * 60  # 7d
-        # Persist under app data directory "run" subfolder to align with deployment layout
-        self._path: str = os.path.join(get_app_data_dir(), "run", "longterm.json")
+        self._dir: str = os.path.join(get_app_data_dir(), "run", "rollups")
+        # Minute peaks from the previous single-resolution store, imported once
+        self._legacy_path: str = os.path.join(get_app_data_dir(), "run", "longterm.json")
+        self._nics: Dict[str, NicRollup] = {}
+        self._decimated = DecimationCache()
 
     async def start(self) -> None:
         if self._task and not self._task.done():
             return
-        await self._load()
+        self._open_existing()
+        self._import_legacy()
+        stats_service.subscribe(self._on_sample)
         self._stop.clear()
         self._task = asyncio.create_task(self._run())
 
     async def stop(self) -> None:
+        stats_service.unsubscribe(self._on_sample)
         self._stop.set()
         if self._task:
             await asyncio.wait([self._task])
-        await self._save()
+        for rollup in self._nics.values():
+            rollup.close()
+        self._nics = {}
 
     async def _run(self) -> None:
-        # Align roughly to minute boundaries, but don't be strict
         while not self._stop.is_set():
             try:
-                await self._sample_minute()
-                # sleep the remainder of the minute
-                await asyncio.wait_for(self._stop.wait(), timeout=60.0)
+                await asyncio.wait_for(self._stop.wait(), timeout=FLUSH_SECONDS)
             except asyncio.TimeoutError:
-                continue
-            except Exception:
-                # best-effort: don't crash background task
-                await asyncio.sleep(5)
-
-    async def _sample_minute(self) -> None:
-        now_ts = time.time()
-        # compute per-minute peaks over last 60 seconds using stats_service history
-        hist = await stats_service.get_history()
-        cutoff = now_ts - 60.0
-        pernic_peaks: Dict[str, Tuple[float, float]] = {}
-        for nic, points in hist.items():
-            recent = [p for p in points if p[0] >= cutoff]
-            if not recent:
-                continue
-            # Use peak within the minute to better capture bursty traffic
-            rx = max(p[1] for p in recent)
-            tx = max(p[2] for p in recent)
-            pernic_peaks[nic] = (rx, tx)
-        if not pernic_peaks:
-            return
-        async with self._lock:
-            for nic, (rx, tx) in pernic_peaks.items():
-                dq = self._mins.setdefault(nic, deque(maxlen=self._max_minutes))
-                dq.append((now_ts, rx, tx))
-            # trim any over-long deques (maxlen should handle it)
-            for dq in self._mins.values():
-                while len(dq) > self._max_minutes:
-                    dq.popleft()
-        await self._save()
-
-    async def get_window(self, window_seconds: int, nic: Optional[str] = None) -> Dict[str, List[Tuple[float, float, float]]]:
-        now = time.time()
-        start = now - max(0, window_seconds)
-        async with self._lock:
-            if nic is not None:
-                data = list(self._mins.get(nic, []))
-                return {nic: [p for p in data if p[0] >= start]}
-            result: Dict[str, List[Tuple[float, float, float]]] = {}
-            for name, dq in self._mins.items():
-                result[name] = [p for p in dq if p[0] >= start]
-            return result
-
-    async def _load(self) -> None:
+                pass
+            for rollup in list(self._nics.values()):
+                try:
+                    await asyncio.to_thread(rollup.save)
+                except Exception:
+                    pass
+
+    # ---- ingest ----
+    def _rollup(self, nic: str) -> Optional[NicRollup]:
+        rollup = self._nics.get(nic)
+        if rollup is None:
+            if not nic or "/" in nic or nic.startswith("."):
+                return None
+            try:
+                rollup = self._nics[nic] = NicRollup(os.path.join(self._dir, nic))
+            except OSError:
+                return None
+        return rollup
+
+    def _on_sample(self, ts: float, samples: Dict[str, Tuple[float, float, int, int]]) -> None:
+        for nic, (rx, tx, rx_bytes, tx_bytes) in samples.items():
+            rollup = self._rollup(nic)
+            if rollup is not None:
+                rollup.add(ts, rx, tx, rx_bytes, tx_bytes)
+
+    def _open_existing(self) -> None:
         try:
-            if not os.path.exists(self._path):
-                return
-            with open(self._path, "r", encoding="utf-8") as f:
-                payload = json.load(f)
-            mins = payload.get("pernic", {})
-            async with self._lock:
-                self._mins = {
-                    nic: deque([(float(ts), float(rx), float(tx)) for ts, rx, tx in lst], maxlen=self._max_minutes)
-                    for nic, lst in mins.items()
-                }
-        except Exception:
-            # ignore load errors
-            self._mins = {}
+            names = os.listdir(self._dir)
+        except OSError:
+            return
+        for name in names:
+            if os.path.isdir(os.path.join(self._dir, name)):
+                self._rollup(name)
 
-    async def _save(self) -> None:
+    def _import_legacy(self) -> None:
         try:
-            os.makedirs(os.path.dirname(self._path), exist_ok=True)
-            async with self._lock:
-                payload = {
-                    "version": 1,
-                    "pernic": {nic: list(dq) for nic, dq in self._mins.items()},
-                }
-            tmp = self._path + ".tmp"
-            with open(tmp, "w", encoding="utf-8") as f:
-                json.dump(payload, f)
-            os.replace(tmp, self._path)
+            if not os.path.exists(self._legacy_path):
+                return
+            with open(self._legacy_path, "r", encoding="utf-8") as f:
+                pernic = json.load(f).get("pernic", {})
+            level = next(i for i, (res, _ret) in enumerate(LEVELS) if res == 60)
+            for nic, points in pernic.items():
+                rollup = self._rollup(nic)
+                if rollup is None or len(rollup.archives[level]):
+                    continue
+                for ts, rx, tx in sorted(points):
+                    b = new_bucket(float(ts) - float(ts) % 60)
+                    # Peaks only; byte totals were never recorded
+                    add_sample(b, float(rx), float(tx), 0.0, 0.0)
+                    rollup.add_closed(level, b)
+            os.replace(self._legacy_path, self._legacy_path + ".migrated")
         except Exception:
-            # ignore save errors
             pass
 
+    # ---- queries ----
+    @staticmethod
+    def resolution_for(window_seconds: float, points: Optional[int] = None) -> int:
+        """Finest resolution that keeps `window_seconds` within `points` (default: one per minute) and retention."""
+        budget = points if points else max(1, int(window_seconds // 60))
+        covering = [res for res, ret in LEVELS if ret >= window_seconds] or [LEVELS[-1][0]]
+        for res in covering:
+            if window_seconds / res <= budget:
+                return res
+        return covering[-1]
 
-longterm_service = LongTermService()
+    @staticmethod
+    def _level(resolution: int) -> int:
+        return next(i for i, (res, _ret) in enumerate(LEVELS) if res == resolution)
+
+    def _names(self, nic: Optional[str]) -> List[str]:
+        return [nic] if nic is not None else list(self._nics)
+
+    async def get_window(
+        self, window_seconds: int, nic: Optional[str] = None, points: Optional[int] = None, stat: str = "max"
+    ) -> Dict[str, List[Tuple[float, float, float]]]:
+        """Per-NIC (bucket start, rx, tx) for `stat` ("max", "avg", "min") at resolution_for(window, points)."""
+        level = self._level(self.resolution_for(window_seconds, points))
+        start = time.time() - max(0, window_seconds)
+        out: Dict[str, List[Tuple[float, float, float]]] = {}
+        for name in self._names(nic):
+            rollup = self._nics.get(name)
+            out[name] = [bucket_value(b, stat) for b in rollup.buckets(level, start)] if rollup else []
+        return out
+
+    async def get_decimated(
+        self, window_seconds: int, points: int, method: str = "minmax", nic: Optional[str] = None, stat: str = "max"
+    ) -> Dict[str, List[Point]]:
+        """Like get_window(), reduced to at most `points` points per NIC; cached until the level changes."""
+        level = self._level(self.resolution_for(window_seconds, points))
+        start = time.time() - max(0, window_seconds)
+        out: Dict[str, List[Point]] = {}
+        for name in self._names(nic):
+            rollup = self._nics.get(name)
+            if rollup is None:
+                out[name] = []
+                continue
 
+            def compute(rollup: NicRollup = rollup) -> List[Point]:
+                window = [bucket_value(b, stat) for b in rollup.buckets(level, start)]
+                if len(window) <= points:
+                    return window
+                ts, rx, tx = zip(*window)
+                return decimate(ts, rx, tx, points, method)
 
+            out[name] = self._decimated.get((name, window_seconds, points, method, stat), rollup.version(level), compute)
+        return out
+
+    def usage(self, nic: str, start: float, end: float) -> Dict[str, float]:
+        """Byte totals, average and peak rates for [start, end), from the hourly level plus the open buckets."""
+        rollup = self._nics.get(nic)
+        if rollup is None:
+            return {"rx_bytes": 0, "tx_bytes": 0, "rx_avg_bps": 0.0, "tx_avg_bps": 0.0, "rx_peak_bps": 0.0, "tx_peak_bps": 0.0}
+        # Every sample is in exactly one of: a closed top-level bucket or one of the open buckets
+        buckets = rollup.archives[-1].rows(start, end)
+        buckets += [b for b in rollup.open if b is not None and start <= b[START] < end]
+        count = sum(b[COUNT] for b in buckets)
+        return {
+            "rx_bytes": int(sum(b[RX_BYTES] for b in buckets)),
+            "tx_bytes": int(sum(b[TX_BYTES] for b in buckets)),
+            "rx_avg_bps": sum(b[RX_SUM] for b in buckets) / count if count else 0.0,
+            "tx_avg_bps": sum(b[TX_SUM] for b in buckets) / count if count else 0.0,
+            "rx_peak_bps": max((b[RX_MAX] for b in buckets if b[COUNT]), default=0.0),
+            "tx_peak_bps": max((b[TX_MAX] for b in buckets if b[COUNT]), default=0.0),
+        }
+
+    def monthly_usage(self, nic: Optional[str] = None, months: int = 1) -> Dict[str, List[Dict[str, Any]]]:
+        """Per-NIC usage for the current and previous calendar months (local time), oldest first."""
+        now = datetime.now()
+        year, month = now.year, now.month
+        periods: List[Tuple[str, float, float]] = []
+        for _ in range(max(1, months)):
+            start = datetime(year, month, 1).timestamp()
+            end = datetime(year + (month == 12), month % 12 + 1, 1).timestamp()
+            periods.append((f"{year:04d}-{month:02d}", start, end))
+            year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        periods.reverse()
+        return {
+            name: [{"month": label, "start": start, "end": end, **self.usage(name, start, end)} for label, start, end in periods]
+            for name in self._names(nic)
+        }
+
+
+longterm_service = LongTermService()
@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from .stats_service import stats_service
+from ..utils.ddsketch import DDSketch
+from ..utils.decimate import DecimationCache
+from ..utils.paths import get_app_data_dir
+
+
+# (resolution, retention) in seconds: hours answer day and week queries, days answer months
+LEVELS: Tuple[Tuple[int, int], ...] = ((3600, 8 * 86400), (86400, 400 * 86400))
+LEVEL_NAMES = ("hour", "day")
+# How often the open sketches are saved
+FLUSH_SECONDS = 60.0
+
+# (bucket start, rx sketch, tx sketch)
+SketchBucket = Tuple[float, DDSketch, DDSketch]
+
+
+def _encode(b: SketchBucket) -> Dict[str, Any]:
+    return {"start": b[0], "rx": b[1].to_dict(), "tx": b[2].to_dict()}
+
+
+def _decode(d: Dict[str, Any]) -> SketchBucket:
+    return float(d["start"]), DDSketch.from_dict(d["rx"]), DDSketch.from_dict(d["tx"])
+
+
+class NicSketches:
+    """One NIC's rate sketches per hour and per day (UTC), plus the bucket each level is filling.
+
+    Closed buckets are kept in memory until save() appends them to <level>.jsonl; save() runs off the
+    event loop, so sampling never waits on disk. Expired lines are dropped by rewriting the file once
+    they outnumber the live ones, so writes stay proportional to closed buckets.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.closed: List[Deque[SketchBucket]] = [deque() for _ in LEVELS]
+        self.open: List[Optional[SketchBucket]] = [None] * len(LEVELS)
+        self._stale = [0] * len(LEVELS)
+        # Closed buckets not yet appended to disk
+        self._unwritten: List[List[SketchBucket]] = [[] for _ in LEVELS]
+        # Guards the above between the sampling callback and save() in a worker thread
+        self._lock = threading.Lock()
+        for level in range(len(LEVELS)):
+            self._load_closed(level)
+        self._load_open()
+
+    def add(self, ts: float, rx: float, tx: float) -> None:
+        start = ts - ts % LEVELS[0][0]
+        with self._lock:
+            cur = self.open[0]
+            if cur is not None and start > cur[0]:
+                self._close(0)
+                cur = None
+            if cur is None:
+                cur = self.open[0] = (start, DDSketch(), DDSketch())
+            cur[1].add(rx)
+            cur[2].add(tx)
+
+    def _close(self, level: int) -> None:
+        b = self.open[level]
+        self.open[level] = None
+        if b is None:
+            return
+        closed = self.closed[level]
+        if closed and b[0] <= closed[-1][0]:
+            return
+        closed.append(b)
+        self._unwritten[level].append(b)
+        self._expire(level, b[0])
+        if level + 1 < len(LEVELS):
+            self._consolidate(level + 1, b)
+
+    def _consolidate(self, level: int, b: SketchBucket) -> None:
+        res = LEVELS[level][0]
+        start = b[0] - b[0] % res
+        cur = self.open[level]
+        if cur is not None and start > cur[0]:
+            self._close(level)
+            cur = None
+        if cur is None:
+            cur = self.open[level] = (start, DDSketch(), DDSketch())
+        cur[1].merge(b[1])
+        cur[2].merge(b[2])
+
+    def _expire(self, level: int, now: float) -> None:
+        closed = self.closed[level]
+        cutoff = now - LEVELS[level][1]
+        while closed and closed[0][0] < cutoff:
+            closed.popleft()
+            self._stale[level] += 1
+
+    def buckets(self, level: int, start: float) -> List[SketchBucket]:
+        """Closed buckets of `level` overlapping [start, now)."""
+        res = LEVELS[level][0]
+        return [b for b in self.closed[level] if b[0] + res > start]
+
+    def partial(self, level: int) -> List[SketchBucket]:
+        """Open buckets not yet folded into `level`: its own and every finer one."""
+        return [b for b in self.open[: level + 1] if b is not None]
+
+    def version(self, level: int) -> Tuple[int, float]:
+        closed = self.closed[level]
+        return len(closed), closed[-1][0] if closed else 0.0
+
+    # ---- persistence ----
+    def _path(self, level: int) -> str:
+        return os.path.join(self.directory, f"{LEVEL_NAMES[level]}.jsonl")
+
+    def _write_closed(self, level: int) -> None:
+        # Snapshot under the lock, write outside it; buckets are immutable once closed
+        with self._lock:
+            pending, self._unwritten[level] = self._unwritten[level], []
+            stale = self._stale[level]
+            rewrite = stale > len(self.closed[level])
+            live = list(self.closed[level]) if rewrite else []
+        try:
+            if rewrite:
+                tmp = self._path(level) + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for b in live:
+                        f.write(json.dumps(_encode(b)) + "\n")
+                os.replace(tmp, self._path(level))
+                with self._lock:
+                    self._stale[level] -= stale
+            elif pending:
+                with open(self._path(level), "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(_encode(b)) + "\n" for b in pending))
+        except OSError:
+            # Try again on the next save
+            with self._lock:
+                if not rewrite:
+                    self._unwritten[level][:0] = pending
+
+    def _load_closed(self, level: int) -> None:
+        try:
+            with open(self._path(level), "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        closed = self.closed[level]
+        for line in lines:
+            try:
+                b = _decode(json.loads(line))
+            except Exception:
+                # A torn last line from a crash mid-append
+                continue
+            if not closed or b[0] > closed[-1][0]:
+                closed.append(b)
+        self._stale[level] = len(lines) - len(closed)
+        self._expire(level, time.time())
+
+    def _open_path(self) -> str:
+        return os.path.join(self.directory, "open.json")
+
+    def _load_open(self) -> None:
+        try:
+            with open(self._open_path(), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if isinstance(saved, list) and len(saved) == len(LEVELS):
+                self.open = [_decode(b) if b else None for b in saved]
+        except Exception:
+            pass
+
+    def save(self) -> None:
+        """Append closed buckets and save the open ones; blocking, run it off the event loop."""
+        for level in range(len(LEVELS)):
+            self._write_closed(level)
+        with self._lock:
+            payload = [_encode(b) if b else None for b in self.open]
+        try:
+            tmp = self._open_path() + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp, self._open_path())
+        except Exception:
+            pass
+
+
+class PercentileService:
+    """Per-NIC rate percentiles (p95/p99 and friends) over days, weeks and months.
+
+    - Every StatsService sample goes into the NIC's current hourly DDSketch (1% relative error); a
+      closed hour is persisted and merged into its day
+    - A query merges the hour (window up to 8 days) or day sketches overlapping the window plus the
+      ones still open, so its cost depends on the number of buckets, never on the sample count
+    - Memory per NIC is bounded by retention: at most 192 hour and 400 day sketches of a few KB each
+    """
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+        self._dir: str = os.path.join(get_app_data_dir(), "run", "percentiles")
+        self._nics: Dict[str, NicSketches] = {}
+        # Merged closed buckets per (nic, level, window); valid until that level closes another bucket
+        self._merged = DecimationCache()
+
+    async def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        await asyncio.to_thread(self._open_existing)
+        stats_service.subscribe(self._on_sample)
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        stats_service.unsubscribe(self._on_sample)
+        self._stop.set()
+        if self._task:
+            await asyncio.wait([self._task])
+        for sketches in self._nics.values():
+            try:
+                await asyncio.to_thread(sketches.save)
+            except Exception:
+                pass
+        self._nics = {}
+
+    async def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            for sketches in list(self._nics.values()):
+                try:
+                    await asyncio.to_thread(sketches.save)
+                except Exception:
+                    pass
+
+    # ---- ingest ----
+    def _sketches(self, nic: str) -> Optional[NicSketches]:
+        sketches = self._nics.get(nic)
+        if sketches is None:
+            if not nic or "/" in nic or nic.startswith("."):
+                return None
+            try:
+                sketches = self._nics[nic] = NicSketches(os.path.join(self._dir, nic))
+            except OSError:
+                return None
+        return sketches
+
+    def _on_sample(self, ts: float, samples: Dict[str, Tuple[float, float, int, int]]) -> None:
+        for nic, (rx, tx, _rx_bytes, _tx_bytes) in samples.items():
+            sketches = self._sketches(nic)
+            if sketches is not None:
+                sketches.add(ts, rx, tx)
+
+    def _open_existing(self) -> None:
+        try:
+            names = os.listdir(self._dir)
+        except OSError:
+            return
+        for name in names:
+            if os.path.isdir(os.path.join(self._dir, name)):
+                self._sketches(name)
+
+    # ---- queries ----
+    @staticmethod
+    def level_for(window_seconds: float) -> int:
+        return next((i for i, (_res, ret) in enumerate(LEVELS) if window_seconds <= ret), len(LEVELS) - 1)
+
+    def percentiles(
+        self, window_seconds: float, quantiles: Sequence[float], nic: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Per-NIC rx/tx values at each quantile (0..1) over the last `window_seconds`, plus sample count and mean.
+
+        Windows are widened to whole buckets of the level used (see resolution in the result).
+        """
+        level = self.level_for(window_seconds)
+        start = time.time() - window_seconds
+        out: Dict[str, Dict[str, Any]] = {}
+        for name in [nic] if nic is not None else list(self._nics):
+            sketches = self._nics.get(name)
+            if sketches is None:
+                continue
+
+            def merge_closed(sketches: NicSketches = sketches) -> Tuple[DDSketch, DDSketch]:
+                rx, tx = DDSketch(), DDSketch()
+                for _start, b_rx, b_tx in sketches.buckets(level, start):
+                    rx.merge(b_rx)
+                    tx.merge(b_tx)
+                return rx, tx
+
+            # Cached per hour of window start so a polling client keeps hitting the same entry
+            key = (name, level, window_seconds, int(start // LEVELS[0][0]))
+            closed_rx, closed_tx = self._merged.get(key, sketches.version(level), merge_closed)
+            rx, tx = closed_rx.copy(), closed_tx.copy()
+            for _start, b_rx, b_tx in sketches.partial(level):
+                rx.merge(b_rx)
+                tx.merge(b_tx)
+            out[name] = {
+                "samples": int(rx.count),
+                "rx": {f"p{q * 100:g}": rx.quantile(q) for q in quantiles},
+                "tx": {f"p{q * 100:g}": tx.quantile(q) for q in quantiles},
+                "rx_mean_bps": rx.mean,
+                "tx_mean_bps": tx.mean,
+            }
+        return out
+
+
+percentile_service = PercentileService()
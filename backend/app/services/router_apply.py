@@ -3,14 +3,34 @@ from __future__ import annotations
 import json
 import os
 import subprocess
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from .router_config_store import router_config_store
+from .firewall import firewall
 from ..utils.paths import get_app_data_dir
 from pathlib import Path
 
 
-def apply_router_config() -> str:
+def _restore_blocklist(expected: List[str]) -> str:
+    # The apply script rebuilds the ruleset around our sets; make sure every persisted block is live
+    try:
+        report = firewall.reconcile_sync(expected)
+    except Exception as exc:  # noqa: BLE001
+        return f"blocklist restore failed: {exc}\n"
+    if not report.get("ok"):
+        return f"blocklist restore failed: {report.get('error')}\n"
+    return (
+        f"blocklist restore: {report['elements']} elements, {report['restored']} restored, "
+        f"{report['removed']} removed in {report['duration_ms']} ms\n"
+    )
+
+
+def apply_router_config(blocklist: List[str]) -> str:
+    """Blocking (runs the apply script and nft): call it through asyncio.to_thread.
+
+    `blocklist` is blocklist_store.collapsed(), taken on the event loop since the store is not
+    thread-safe.
+    """
     cfg: Dict[str, Any] = router_config_store.load()
     # Auto-detect Wi‑Fi AP interface if configured one is missing. Prefer any wireless iface not equal to WAN iface.
     try:
@@ -66,7 +86,7 @@ def apply_router_config() -> str:
         p = subprocess.run(cmd, capture_output=True, text=True, check=False)
         if not is_root and p.returncode != 0 and "password" in (p.stderr or "").lower():
             return "sudo requires a password. Configure passwordless sudo for apply_router.sh or run `sudo -v` before starting.\n" + (p.stderr or "")
-        return (p.stdout or "") + (p.stderr or "")
+        return (p.stdout or "") + (p.stderr or "") + _restore_blocklist(blocklist)
     except Exception as exc:  # noqa: BLE001
         return f"failed to invoke apply script: {exc}"
 
@@ -2,13 +2,32 @@ from __future__ import annotations
 
 import asyncio
 import time
-from collections import deque
-from typing import Deque, Dict, List, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 import json
 import os
+from fnmatch import fnmatch
 
-import psutil
+from ..config import settings
+from ..utils.decimate import DecimationCache, Point, decimate
+from ..utils.nic_counters import CounterSource, counter_delta, open_counter_source
 from ..utils.paths import get_app_data_dir
+from ..utils.seglog import SegmentLog
+from ..utils.timeseries import RingSeries
+from .live_hub import live_hub
+from .router_config_store import router_config_store
+
+
+# Per-sample callback: (ts, {nic: (rx_bps, tx_bps, rx_bytes, tx_bytes)})
+SampleCallback = Callable[[float, Dict[str, Tuple[float, float, int, int]]], None]
+
+# How often buffered samples are appended to disk, and expired segments removed
+FLUSH_SECONDS = 5.0
+COMPACT_SECONDS = 60.0
+# Windows (seconds) whose mean and peak every series keeps up to date as samples arrive
+SUMMARY_WINDOWS = (10, 120, 600, 3600)
+
+# Interfaces not sampled unless allow-listed: loopback, containers, VMs, bridges of other stacks
+IGNORED_PREFIXES = ("lo", "veth", "docker", "br-", "virbr", "vnet", "ifb", "tap", "dummy", "cali", "flannel", "cni")
 
 
 class StatsService:
@@ -16,13 +35,46 @@ class StatsService:
         self._task: asyncio.Task | None = None
         self._stop = asyncio.Event()
         self._lock = asyncio.Lock()
-        # per-nic history: list of (ts, rx_bytes, tx_bytes per second)
-        self._history: Dict[str, Deque[Tuple[float, float, float]]] = {}
+        # per-nic history: (ts, rx_bytes, tx_bytes per second) columns
+        self._history: Dict[str, RingSeries] = {}
         # Keep 1 hour of history for long-horizon charts
         self._window_seconds = 60 * 60
-        # Persist short-term window on disk for continuity across restarts
-        self._path: str = os.path.join(get_app_data_dir(), "run", "shortterm.json")
-        self._last_save_ts: float = 0.0
+        # Persist short-term window on disk for continuity across restarts: one append-only log per NIC
+        self._dir: str = os.path.join(get_app_data_dir(), "run", "shortterm")
+        # Whole-window JSON snapshot written by earlier versions, imported once
+        self._legacy_path: str = os.path.join(get_app_data_dir(), "run", "shortterm.json")
+        self._logs: Dict[str, SegmentLog] = {}
+        self._last_flush_ts: float = 0.0
+        self._last_compact_ts: float = 0.0
+        self._interval = max(0.05, settings.stats_sample_interval)
+        # Room for the window at the configured rate plus jitter; points are also trimmed by time
+        self._capacity = int(self._window_seconds / self._interval * 1.2) + 1
+        self._allow: List[str] = list(settings.stats_interfaces)
+        # Interfaces named in the router config are always sampled
+        self._managed: Set[str] = set()
+        self._managed_ts = 0.0
+        self.source_name = ""
+        # Timestamp shared by all points of the latest sample; clients resume from it with `since`
+        self.last_sample_ts = 0.0
+        self._decimated = DecimationCache()
+        self._subscribers: List[SampleCallback] = []
+
+    def _refresh_managed(self) -> None:
+        self._managed_ts = time.time()
+        try:
+            cfg = router_config_store.load()
+            self._managed = {
+                str(cfg.get(k, {}).get("interface")) for k in ("lan", "wan", "wifi") if cfg.get(k, {}).get("interface")
+            }
+        except Exception:
+            pass
+
+    def _wanted(self, name: str) -> bool:
+        if name in self._managed:
+            return True
+        if self._allow:
+            return any(fnmatch(name, pattern) for pattern in self._allow)
+        return not name.startswith(IGNORED_PREFIXES)
 
     async def start(self) -> None:
         if self._task and not self._task.done():
@@ -35,80 +87,237 @@ class StatsService:
         self._stop.set()
         if self._task:
             await asyncio.wait([self._task])
+        logs, self._logs = self._logs, {}
+        for log in logs.values():
+            try:
+                await asyncio.to_thread(log.close)
+            except Exception:
+                pass
 
     async def _run(self) -> None:
-        prev = psutil.net_io_counters(pernic=True)
+        self._refresh_managed()
+        source = open_counter_source(settings.stats_counter_source, self._wanted)
+        self.source_name = source.name
+        try:
+            await self._sample_loop(source)
+        finally:
+            source.close()
+
+    async def _sample_loop(self, source: CounterSource) -> None:
+        # Baselines keyed by ifindex so a renamed interface keeps its counters
+        prev: Dict[object, Tuple[int, int]] = {}
+        for name, (ifindex, rx, tx) in source.read().items():
+            prev[ifindex if ifindex > 0 else name] = (rx, tx)
         prev_ts = time.time()
         while not self._stop.is_set():
-            # Sample at 2 Hz for smoother frontend graphs
-            await asyncio.sleep(0.5)
+            await asyncio.sleep(self._interval)
             now_ts = time.time()
-            now = psutil.net_io_counters(pernic=True)
+            if now_ts - self._managed_ts >= 30.0:
+                self._refresh_managed()
+            try:
+                now = source.read()
+            except Exception:
+                continue
             dt = max(1e-3, now_ts - prev_ts)
+            current: Dict[object, Tuple[int, int]] = {}
+            fresh: Dict[str, List[Tuple[float, float, float]]] = {}
+            samples: Dict[str, Tuple[float, float, int, int]] = {}
             async with self._lock:
-                for nic, counters in now.items():
-                    if nic not in prev:
+                for nic, (ifindex, rx, tx) in now.items():
+                    key = ifindex if ifindex > 0 else nic
+                    current[key] = (rx, tx)
+                    if key not in prev:
                         continue
-                    rx_rate = (counters.bytes_recv - prev[nic].bytes_recv) / dt
-                    tx_rate = (counters.bytes_sent - prev[nic].bytes_sent) / dt
-                    # Keep enough capacity for higher sample rate; trimming by time below
-                    dq = self._history.setdefault(nic, deque(maxlen=int(self._window_seconds * 6)))
-                    dq.append((now_ts, rx_rate, tx_rate))
-                # Trim old points beyond window (in case maxlen not sufficient)
+                    d_rx = counter_delta(prev[key][0], rx)
+                    d_tx = counter_delta(prev[key][1], tx)
+                    if d_rx is None or d_tx is None:
+                        # Counter reset (device re-created): this reading becomes the new baseline
+                        continue
+                    rx_rate = d_rx / dt
+                    tx_rate = d_tx / dt
+                    series = self._history.get(nic)
+                    if series is None:
+                        series = self._history[nic] = RingSeries(self._capacity, SUMMARY_WINDOWS)
+                    series.append(now_ts, rx_rate, tx_rate)
+                    log = self._log(nic)
+                    if log is not None:
+                        log.append(now_ts, rx_rate, tx_rate)
+                    fresh[nic] = [(now_ts, rx_rate, tx_rate)]
+                    samples[nic] = (rx_rate, tx_rate, d_rx, d_tx)
+                # Trim old points beyond window (in case capacity not sufficient)
                 cutoff = now_ts - self._window_seconds
-                for dq in self._history.values():
-                    while dq and dq[0][0] < cutoff:
-                        dq.popleft()
-                # Persist to disk at most every 5 seconds
-                if (now_ts - self._last_save_ts) >= 5.0:
-                    # Build a snapshot while holding the lock, then write outside
-                    payload = {
-                        "version": 1,
-                        "pernic": {nic: list(dq) for nic, dq in self._history.items()},
-                    }
-                    # End of locked section
-            if (now_ts - self._last_save_ts) >= 5.0:
+                for series in self._history.values():
+                    series.drop_before(cutoff)
+                self.last_sample_ts = now_ts
+            # Same shape as a /traffic delta
+            live_hub.publish("traffic", {"pernic": fresh, "cursor": now_ts})
+            for callback in self._subscribers:
                 try:
-                    await self._save_snapshot(payload)
-                    self._last_save_ts = now_ts
+                    callback(now_ts, samples)
                 except Exception:
+                    # A consumer must not stop sampling
                     pass
-            prev = now
+            # Only the samples taken since the last flush are written; the file I/O runs off the event loop
+            if (now_ts - self._last_flush_ts) >= FLUSH_SECONDS:
+                self._last_flush_ts = now_ts
+                compact = (now_ts - self._last_compact_ts) >= COMPACT_SECONDS
+                if compact:
+                    self._last_compact_ts = now_ts
+                try:
+                    await asyncio.to_thread(self._persist, list(self._logs.values()), cutoff if compact else None)
+                except Exception:
+                    pass
+            prev = current
             prev_ts = now_ts
 
-    async def get_history(self) -> Dict[str, List[Tuple[float, float, float]]]:
+    def subscribe(self, callback: SampleCallback) -> None:
+        """Call `callback(ts, {nic: (rx_bps, tx_bps, rx_bytes, tx_bytes)})` after every sample, on the event loop."""
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: SampleCallback) -> None:
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    async def get_history(
+        self,
+        window_seconds: Optional[float] = None,
+        nics: Optional[Iterable[str]] = None,
+        since: Optional[float] = None,
+    ) -> Dict[str, List[Tuple[float, float, float]]]:
+        """Materialized points per NIC.
+
+        Limited to the last `window_seconds` when given, and to points strictly newer than `since`
+        (a previous last_sample_ts) so pollers only receive what they have not seen.
+        """
+        cutoff = time.time() - window_seconds if window_seconds is not None else float("-inf")
         async with self._lock:
-            return {k: list(v) for k, v in self._history.items()}
+            out: Dict[str, List[Tuple[float, float, float]]] = {}
+            for name, series in self._select(nics):
+                if since is not None and since >= cutoff:
+                    first = series.bisect_ts(since, after=True)
+                else:
+                    first = series.bisect_ts(cutoff)
+                out[name] = series.points(first)
+            return out
 
-    async def _load(self) -> None:
+    async def get_summary(
+        self, window_seconds: float, nics: Optional[Iterable[str]] = None
+    ) -> Dict[str, Tuple[float, float, float, float]]:
+        """(rx mean, tx mean, rx peak, tx peak) per NIC over the last `window_seconds`, NICs without samples left out.
+
+        SUMMARY_WINDOWS come from the accumulators each series maintains (O(1)) while sampling is current;
+        other windows cost two binary searches plus prefix sums. History is never copied.
+        """
+        now = time.time()
+        # The accumulators are anchored at the newest sample; if sampling stalled, anchor at now instead
+        current = now - self.last_sample_ts <= 2 * self._interval
+        async with self._lock:
+            out: Dict[str, Tuple[float, float, float, float]] = {}
+            for name, series in self._select(nics):
+                stats = series.stats(window_seconds) if current else None
+                if stats is None:
+                    stats = series.aggregate(now - window_seconds)
+                n, rx_avg, tx_avg, rx_peak, tx_peak = stats
+                if n:
+                    out[name] = (rx_avg, tx_avg, rx_peak, tx_peak)
+            return out
+
+    async def get_decimated(
+        self, window_seconds: float, points: int, method: str = "lttb", nics: Optional[Iterable[str]] = None
+    ) -> Dict[str, List[Point]]:
+        """Each NIC's last `window_seconds` reduced to at most `points` points (see utils.decimate).
+
+        Results are cached per (nic, window, points, method) until that NIC gets a new sample.
+        """
+        cutoff = time.time() - window_seconds
+        async with self._lock:
+            out: Dict[str, List[Point]] = {}
+            for name, series in self._select(nics):
+                last = series.last()
+                out[name] = self._decimated.get(
+                    (name, window_seconds, points, method),
+                    (len(series), last[0] if last else 0.0),
+                    lambda series=series: decimate(*series.window(cutoff), points, method),
+                )
+            return out
+
+    @property
+    def window_seconds(self) -> int:
+        return self._window_seconds
+
+    def _select(self, nics: Optional[Iterable[str]]) -> List[Tuple[str, RingSeries]]:
+        if nics is None:
+            return list(self._history.items())
+        return [(nic, self._history[nic]) for nic in nics if nic in self._history]
+
+    def _log(self, nic: str) -> Optional[SegmentLog]:
+        log = self._logs.get(nic)
+        if log is None:
+            if not nic or "/" in nic or nic.startswith("."):
+                return None
+            try:
+                log = self._logs[nic] = SegmentLog(os.path.join(self._dir, nic))
+            except OSError:
+                return None
+        return log
+
+    @staticmethod
+    def _persist(logs: List[SegmentLog], cutoff: Optional[float]) -> None:
+        for log in logs:
+            try:
+                log.flush()
+                if cutoff is not None:
+                    log.compact(cutoff)
+            except OSError:
+                pass
+
+    def _read_logs(self, cutoff: float) -> Dict[str, RingSeries]:
+        history: Dict[str, RingSeries] = {}
+        try:
+            names = [n for n in os.listdir(self._dir) if os.path.isdir(os.path.join(self._dir, n))]
+        except OSError:
+            names = []
+        for nic in names:
+            log = self._log(nic)
+            if log is None:
+                continue
+            series = history[nic] = RingSeries(self._capacity, SUMMARY_WINDOWS)
+            for ts, rx, tx in log.load(cutoff):
+                series.append(ts, rx, tx)
+        self._import_legacy(history, cutoff)
+        return history
+
+    def _import_legacy(self, history: Dict[str, RingSeries], cutoff: float) -> None:
         try:
-            if not os.path.exists(self._path):
+            if not os.path.exists(self._legacy_path):
                 return
-            with open(self._path, "r", encoding="utf-8") as f:
-                payload = json.load(f)
-            pernic = payload.get("pernic", {})
-            now_ts = time.time()
-            cutoff = now_ts - self._window_seconds
-            async with self._lock:
-                self._history = {
-                    nic: deque([(float(ts), float(rx), float(tx)) for ts, rx, tx in lst if float(ts) >= cutoff],
-                               maxlen=int(self._window_seconds * 6))
-                    for nic, lst in pernic.items()
-                }
+            with open(self._legacy_path, "r", encoding="utf-8") as f:
+                pernic = json.load(f).get("pernic", {})
+            for nic, lst in pernic.items():
+                log = self._log(nic)
+                if log is None or nic in history and len(history[nic]):
+                    continue
+                series = history[nic] = RingSeries(self._capacity, SUMMARY_WINDOWS)
+                for ts, rx, tx in lst:
+                    if float(ts) >= cutoff:
+                        series.append(float(ts), float(rx), float(tx))
+                        log.append(float(ts), float(rx), float(tx))
+                log.flush()
+            os.replace(self._legacy_path, self._legacy_path + ".migrated")
         except Exception:
-            # ignore load errors
-            self._history = {}
+            pass
 
-    async def _save_snapshot(self, payload: Dict[str, object]) -> None:
+    async def _load(self) -> None:
         try:
-            os.makedirs(os.path.dirname(self._path), exist_ok=True)
-            tmp = self._path + ".tmp"
-            with open(tmp, "w", encoding="utf-8") as f:
-                json.dump(payload, f)
-            os.replace(tmp, self._path)
+            cutoff = time.time() - self._window_seconds
+            history = await asyncio.to_thread(self._read_logs, cutoff)
+            async with self._lock:
+                self._history = history
+                self.last_sample_ts = max((ser.last()[0] for ser in history.values() if len(ser)), default=0.0)
         except Exception:
-            # ignore save errors
-            pass
+            # ignore load errors
+            self._history = {}
 
 
 stats_service = StatsService()
@@ -3,11 +3,12 @@ from __future__ import annotations
 import asyncio
 import json
 import os
-from typing import Optional
+from contextlib import aclosing
+from typing import Awaitable, Callable
 
-import aiofiles
-
-from .threat_detector import threat_detector
+from .alert_coalescer import alert_coalescer
+from .verdict_cache import message_signature
+from ..utils.log_follower import LogFollower
 
 
 EVE_JSON = "/var/log/suricata/eve.json"
@@ -36,44 +37,58 @@ class SuricataMonitor:
         elif os.path.exists(FAST_LOG):
             await self._tail_fast(FAST_LOG)
 
+    async def _follow(self, path: str, state_name: str, handle: Callable[[str], Awaitable[None]]) -> None:
+        # Rotation-aware follow; restart the follower after errors instead of giving up
+        while not self._stop.is_set():
+            follower = LogFollower(path, state_name=state_name)
+            try:
+                async with aclosing(follower.batches(self._stop)) as batches:
+                    async for lines in batches:
+                        for line in lines:
+                            try:
+                                await handle(line)
+                            except Exception:
+                                continue
+            except Exception:
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=2.0)
+                except asyncio.TimeoutError:
+                    pass
+
     async def _tail_eve(self, path: str) -> None:
-        try:
-            async with aiofiles.open(path, "r") as f:
-                await f.seek(0, os.SEEK_END)
-                while not self._stop.is_set():
-                    line = await f.readline()
-                    if not line:
-                        await asyncio.sleep(0.5)
-                        continue
-                    try:
-                        obj = json.loads(line)
-                    except Exception:
-                        continue
-                    if obj.get("event_type") == "alert":
-                        alert = obj.get("alert", {})
-                        sig = alert.get("signature")
-                        sev = alert.get("severity")  # 1 high, 2 medium, 3 low
-                        src = obj.get("src_ip")
-                        dst = obj.get("dest_ip")
-                        msg = f"Suricata alert: {sig} (sev={sev}) src={src} dst={dst}"
-                        await threat_detector.analyze(source="suricata", message=msg)
-        except Exception:
-            return
+        await self._follow(path, "suricata_eve", self._handle_eve_line)
 
     async def _tail_fast(self, path: str) -> None:
+        await self._follow(path, "suricata_fast", self._handle_fast_line)
+
+    async def _handle_eve_line(self, line: str) -> None:
         try:
-            async with aiofiles.open(path, "r") as f:
-                await f.seek(0, os.SEEK_END)
-                while not self._stop.is_set():
-                    line = await f.readline()
-                    if not line:
-                        await asyncio.sleep(0.5)
-                        continue
-                    # FAST format: timestamp [**] [gid:sid:rev] signature [Classification] [Priority] {proto} SRC:SPT -> DST:DPT
-                    # We pass line as-is to the detector
-                    await threat_detector.analyze(source="suricata", message=line.strip())
+            obj = json.loads(line)
         except Exception:
             return
+        if obj.get("event_type") == "alert":
+            alert = obj.get("alert", {})
+            sig = alert.get("signature")
+            sev = alert.get("severity")  # 1 high, 2 medium, 3 low
+            src = obj.get("src_ip")
+            dst = obj.get("dest_ip")
+            msg = f"Suricata alert: {sig} (sev={sev}) src={src} dst={dst}"
+            meta = {
+                "signature": sig,
+                "signature_id": alert.get("signature_id"),
+                "alert_severity": sev,
+                "category": alert.get("category"),
+                "src_ip": src,
+                "dest_ip": dst,
+            }
+            await alert_coalescer.submit("suricata", "alert", f"{alert.get('signature_id') or sig}|{src}", msg, meta=meta)
+
+    async def _handle_fast_line(self, line: str) -> None:
+        # FAST format: timestamp [**] [gid:sid:rev] signature [Classification] [Priority] {proto} SRC:SPT -> DST:DPT
+        # We pass line as-is to the detector, grouped by its normalized signature
+        line = line.strip()
+        if line:
+            await alert_coalescer.submit("suricata", "fast", message_signature("suricata", line), line)
 
 
 suricata_monitor = SuricataMonitor()
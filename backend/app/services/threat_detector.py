@@ -1,109 +1,311 @@
 from __future__ import annotations
 
 import asyncio
+import ipaddress
+import json
 import uuid
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 from ..config import settings
 from .settings_store import settings_store
 from ..models.threats import ThreatEvent
-from .firewall import block_ip
+from .blocklist_store import blocklist_store
+from .threat_rules import threat_rules
+from .threat_store import threat_store
+from .verdict_cache import message_signature, verdict_cache
+
+
+LLM_MODEL = "gpt-5"
+SEVERITIES = ("info", "low", "medium", "high", "critical")
+# How long a worker waits for more events to share one prompt
+BATCH_WAIT_SECONDS = 0.25
+
+
+def _severity_from_text(text: str) -> str:
+    lowered = text.lower()
+    if any(k in lowered for k in ["critical", "severe", "urgent"]):
+        return "critical"
+    if "high" in lowered:
+        return "high"
+    if "medium" in lowered:
+        return "medium"
+    return "low"
+
+
+def host_address(value: Any) -> Optional[str]:
+    """Canonical text of a single IPv4/IPv6 host address; None for networks, ranges and anything else."""
+    try:
+        return str(ipaddress.ip_address(str(value).strip()))
+    except ValueError:
+        return None
+
+
+def _normalize_severity(value: Any, default: str) -> str:
+    sev = str(value or "").strip().lower()
+    return sev if sev in SEVERITIES else default
 
 
 class ThreatDetector:
+    """Classify events locally right away and enrich them with an LLM in the background.
+
+    - Tiers: verdict cache, then local rules; only events the rules are unsure about reach the LLM
+    - analyze() never waits on the network: it stores and returns a provisional event
+    - A bounded queue feeds worker tasks that batch pending events into one prompt
+    - One persistent async client is reused (timeouts and retries configured once)
+    - When the queue is full, events stay with the local classification
+    """
+
     def __init__(self) -> None:
-        self._events: List[ThreatEvent] = []
-        self._lock = asyncio.Lock()
+        self._queue: asyncio.Queue[ThreatEvent] = asyncio.Queue(maxsize=max(1, settings.llm_queue_size))
+        self._workers: List[asyncio.Task] = []
+        self._client: Any = None
+        self._client_key: Optional[str] = None
 
-    async def analyze(self, source: str, message: str) -> ThreatEvent:
-        severity = "info"
-        explanation = None
-        # Prefer stored key; fall back to env
-        api_key = settings_store.get_openai_api_key() or settings.openai_api_key
-        if api_key:
+    async def start(self) -> None:
+        if self._workers and not all(w.done() for w in self._workers):
+            return
+        await asyncio.to_thread(verdict_cache.load)
+        await threat_store.start()
+        self._workers = [asyncio.create_task(self._worker())]
+
+    async def stop(self) -> None:
+        for w in self._workers:
+            w.cancel()
+        if self._workers:
+            await asyncio.wait(self._workers)
+        self._workers = []
+        if self._client is not None:
             try:
-                from openai import OpenAI
-
-                client = OpenAI(api_key=api_key, base_url=settings.openai_api_base)
-                prompt = (
-                    "You are a network security assistant on a router. "
-                    "Classify the following event by severity (low, medium, high, critical), explain briefly why it's suspicious, and extract any suspicious IP if present as JSON fields: {severity, explanation, ip}.\n\n"
-                    f"Event: {message}\n"
-                )
-                resp = client.chat.completions.create(
-                    model="gpt-5",
-                    messages=[{"role": "system", "content": "You are a concise security analyst."}, {"role": "user", "content": prompt}],
-                    temperature=0.0,
-                )
-                text = resp.choices[0].message.content or ""
-                explanation = text.strip()[:1500]
-                lowered = explanation.lower()
-                if any(k in lowered for k in ["critical", "severe", "urgent"]):
-                    severity = "critical"
-                elif "high" in lowered:
-                    severity = "high"
-                elif "medium" in lowered:
-                    severity = "medium"
-                else:
-                    severity = "low"
-                # Extract ip if formatted JSON appears
-                try:
-                    import json as _json
-                    jstart = text.find('{')
-                    jend = text.rfind('}')
-                    if jstart != -1 and jend != -1 and jend > jstart:
-                        j = _json.loads(text[jstart:jend+1])
-                        if isinstance(j, dict):
-                            if j.get('severity'):
-                                severity = str(j['severity']).lower()
-                            if j.get('explanation'):
-                                explanation = str(j['explanation'])[:1500]
-                            if j.get('ip'):
-                                ip_in_msg = str(j['ip'])
-                except Exception:
-                    pass
+                await self._client.close()
             except Exception:
-                explanation = None
-                severity = "info"
+                pass
+            self._client = None
+            self._client_key = None
+        await asyncio.to_thread(verdict_cache.save, True)
+        await threat_store.stop()
 
-        ip_in_msg = None
-        try:
-            import re
-            m = re.search(r"\b(?:\d{1,3}\.){3}\d{1,3}\b", message)
-            if m:
-                ip_in_msg = m.group(0)
-        except Exception:
-            pass
+    def _api_key(self) -> Optional[str]:
+        # Prefer stored key; fall back to env
+        return settings_store.get_openai_api_key() or settings.openai_api_key
+
+    def _get_client(self, api_key: str) -> Any:
+        if self._client is None or self._client_key != api_key:
+            from openai import AsyncOpenAI
+
+            self._client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=settings.openai_api_base,
+                timeout=settings.llm_timeout,
+                max_retries=settings.llm_max_retries,
+            )
+            self._client_key = api_key
+        return self._client
 
+    async def analyze(
+        self,
+        source: str,
+        message: str,
+        meta: Optional[Dict[str, Any]] = None,
+        count: int = 1,
+        first_seen: Optional[datetime] = None,
+        last_seen: Optional[datetime] = None,
+    ) -> ThreatEvent:
+        """Classify an event. `meta` carries structured fields when the source has them
+        (Suricata: signature_id, alert_severity, signature, category, src_ip, dest_ip).
+        `count`/`first_seen`/`last_seen` describe an aggregate built by the alert coalescer."""
+        rule = threat_rules.classify(source, message, meta)
         event = ThreatEvent(
             id=str(uuid.uuid4()),
             timestamp=datetime.utcnow(),
             source=source,
             message=message,
-            severity=severity,
-            explanation=explanation,
-            ip=ip_in_msg,
+            severity=rule.severity,
+            explanation=None,
+            ip=rule.ip,
             action=None,
-            context={"analyzer": "llm" if api_key else "local"}
+            context={"analyzer": "rules", "reason": rule.reason},
+            count=max(1, count),
+            first_seen=first_seen,
+            last_seen=last_seen,
         )
-        async with self._lock:
-            self._events.append(event)
-            self._events = self._events[-500:]
-        # Auto-block heuristic: if a source string includes an IP and severity high/critical
+        cached = None if rule.confident else verdict_cache.get(message_signature(source, message))
+        if cached is not None:
+            event.severity, event.explanation = cached
+            event.context = {"analyzer": "cache"}
+        elif not rule.confident and self._api_key():
+            try:
+                self._queue.put_nowait(event)
+                event.context = {"analyzer": "pending", "reason": rule.reason}
+            except asyncio.QueueFull:
+                # Backpressure: keep the local verdict rather than stalling the caller
+                event.context = {"analyzer": "rules", "reason": rule.reason, "degraded": True}
+        # An unsure rule verdict (e.g. pattern and priority disagree, max severity taken) is provisional:
+        # only a confident rule or a cache/LLM verdict may block
+        if rule.confident or cached is not None:
+            self._maybe_block(event)
+        threat_store.put(event)
+        return event
+
+    def _maybe_block(self, event: ThreatEvent) -> None:
+        # Auto-block heuristic: offending host known and severity high/critical; never our own networks.
+        # A CIDR is never auto-blocked, and is not "in" trusted either, so it must not get this far
         try:
-            if event.ip and severity in ("high", "critical"):
-                if block_ip(event.ip):
-                    event.action = "blocked_ip"
+            if not event.ip or event.severity not in ("high", "critical") or event.action is not None:
+                return
+            addr = host_address(event.ip)
+            if addr is None or addr in threat_rules.trusted:
+                return
+            if not blocklist_store.contains(addr):
+                blocklist_store.add_auto(addr)
+            event.action = "blocked_ip"
         except Exception:
             event.action = event.action or None
-        return event
 
-    async def list_events(self) -> List[ThreatEvent]:
-        async with self._lock:
-            return list(self._events)
+    async def _next_batch(self) -> List[ThreatEvent]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + BATCH_WAIT_SECONDS
+        while len(batch) < max(1, settings.llm_batch_size):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
 
+    async def _worker(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._enrich(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                for event in batch:
+                    event.context = {**(event.context or {}), "analyzer": "rules", "error": str(exc)[:200]}
+                    threat_store.put(event)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
 
-threat_detector = ThreatDetector()
+    async def _enrich(self, batch: List[ThreatEvent]) -> None:
+        api_key = self._api_key()
+        if not api_key:
+            # Key removed while events were queued: they keep the rule verdict
+            for event in batch:
+                event.context = {**(event.context or {}), "analyzer": "rules"}
+                threat_store.put(event)
+            return
+        client = self._get_client(api_key)
+        # Repeats of one signature share a single prompt line; ones answered meanwhile use the cache
+        groups: Dict[str, List[ThreatEvent]] = {}
+        for event in batch:
+            sig = message_signature(event.source, event.message)
+            cached = verdict_cache.get(sig, record=False)
+            if cached is not None:
+                event.severity, event.explanation = cached
+                event.context = {"analyzer": "cache"}
+                self._maybe_block(event)
+                threat_store.put(event)
+                continue
+            groups.setdefault(sig, []).append(event)
+        if not groups:
+            return
+        uniques = [(sig, events[0]) for sig, events in groups.items()]
+        listing = "\n".join(f"{i}. [{e.source}] {e.message}" for i, (_sig, e) in enumerate(uniques))
+        prompt = (
+            "You are a network security assistant on a router. "
+            "For each numbered event below, classify its severity (low, medium, high, critical), explain briefly why it's suspicious, "
+            "and extract any suspicious IP if present. Answer with only a JSON array of objects: "
+            "[{\"id\": <event number>, \"severity\": ..., \"explanation\": ..., \"ip\": ...}].\n\n"
+            f"Events:\n{listing}\n"
+        )
+        resp = await client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=[{"role": "system", "content": "You are a concise security analyst."}, {"role": "user", "content": prompt}],
+            temperature=0.0,
+        )
+        text = resp.choices[0].message.content or ""
+        verdicts = self._parse_verdicts(text, len(uniques))
+        for i, (sig, _first) in enumerate(uniques):
+            verdict = verdicts.get(i)
+            if verdict is None:
+                for event in groups[sig]:
+                    event.context = {**(event.context or {}), "analyzer": "rules", "error": "no verdict in LLM response"}
+                    threat_store.put(event)
+                continue
+            verdict_cache.put(sig, verdict["severity"], verdict["explanation"])
+            for event in groups[sig]:
+                event.severity = verdict["severity"]
+                event.explanation = verdict["explanation"]
+                if not event.ip and verdict.get("ip"):
+                    event.ip = verdict["ip"]
+                event.context = {"analyzer": "llm"}
+                self._maybe_block(event)
+                threat_store.put(event)
+        verdict_cache.save()
 
+    def _parse_verdicts(self, text: str, count: int) -> Dict[int, Dict[str, Any]]:
+        out: Dict[int, Dict[str, Any]] = {}
+        try:
+            jstart = text.find('[')
+            jend = text.rfind(']')
+            if jstart != -1 and jend > jstart:
+                items = json.loads(text[jstart:jend + 1])
+                for pos, item in enumerate(items if isinstance(items, list) else []):
+                    if not isinstance(item, dict):
+                        continue
+                    try:
+                        idx = int(item.get("id", pos))
+                    except (TypeError, ValueError):
+                        idx = pos
+                    if not 0 <= idx < count:
+                        continue
+                    explanation = str(item.get("explanation") or "")[:1500]
+                    out[idx] = {
+                        "severity": _normalize_severity(item.get("severity"), _severity_from_text(explanation)),
+                        "explanation": explanation or None,
+                        # Model output must not pick what gets blocked: host addresses only
+                        "ip": host_address(item["ip"]) if item.get("ip") else None,
+                    }
+        except Exception:
+            out = {}
+        if not out and count == 1 and text.strip():
+            # Single event and free-form answer: fall back to keyword/JSON-object heuristics
+            explanation = text.strip()[:1500]
+            verdict: Dict[str, Any] = {"severity": _severity_from_text(explanation), "explanation": explanation, "ip": None}
+            try:
+                jstart = text.find('{')
+                jend = text.rfind('}')
+                if jstart != -1 and jend > jstart:
+                    j = json.loads(text[jstart:jend + 1])
+                    if isinstance(j, dict):
+                        verdict["severity"] = _normalize_severity(j.get("severity"), verdict["severity"])
+                        if j.get("explanation"):
+                            verdict["explanation"] = str(j["explanation"])[:1500]
+                        if j.get("ip"):
+                            verdict["ip"] = host_address(j["ip"])
+            except Exception:
+                pass
+            out[0] = verdict
+        return out
 
+    def cache_stats(self) -> Dict[str, Any]:
+        return verdict_cache.stats()
+
+    async def list_events(
+        self,
+        cursor: Optional[int] = None,
+        since: Optional[float] = None,
+        min_severity: Optional[str] = None,
+        ip: Optional[str] = None,
+        source: Optional[str] = None,
+        limit: int = 200,
+    ) -> Tuple[List[ThreatEvent], Optional[int], bool]:
+        return await threat_store.query(cursor, since, min_severity, ip, source, limit)
+
+
+threat_detector = ThreatDetector()
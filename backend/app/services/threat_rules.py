@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import bisect
+import ipaddress
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.paths import get_app_data_dir
+
+
+SEVERITY_RANK = {"info": 0, "low": 1, "medium": 2, "high": 3, "critical": 4}
+
+# Suricata alert.severity / fast.log Priority: 1 is the most severe
+SURICATA_SEVERITY = {1: "high", 2: "medium", 3: "low", 4: "info"}
+
+# Signature ids whose verdict we already know, independent of the ruleset's priority
+SID_SEVERITY: Dict[int, str] = {
+    2013028: "info",      # ET POLICY curl User-Agent Outbound
+    2013504: "info",      # ET POLICY GNU/Linux APT User-Agent Outbound
+    2001219: "medium",    # ET SCAN Potential SSH Scan
+    2003068: "medium",    # ET SCAN Potential SSH Scan OUTBOUND
+    2010935: "medium",    # ET SCAN Suspicious inbound to MSSQL port 1433
+    2010937: "medium",    # ET SCAN Suspicious inbound to mySQL port 3306
+    2008578: "high",      # ET SCAN Sipvicious Scan
+}
+
+# Signature text patterns, checked in order; first match wins
+SIGNATURE_PATTERNS: Tuple[Tuple[re.Pattern[str], str], ...] = tuple(
+    (re.compile(p, re.IGNORECASE), sev)
+    for p, sev in (
+        (r"\b(ransomware|cobalt ?strike|meterpreter|shellcode|backdoor)\b", "critical"),
+        (r"\bET (EXPLOIT|TROJAN|MALWARE|CNC|WORM)\b|\b(exploit|trojan|botnet|c2|command and control|cnc)\b", "high"),
+        (r"\bET (SCAN|DOS|WEB_SERVER|ATTACK_RESPONSE)\b|\b(brute ?force|scan|nmap|masscan)\b", "medium"),
+        (r"\bET (POLICY|INFO|GAMES|CHAT|P2P|USER_AGENTS)\b|\bSURICATA (STREAM|HTTP|TLS|DNS)\b", "info"),
+    )
+)
+
+_FAST_SID_RE = re.compile(r"\[(\d+):(\d+):\d+\]")
+_FAST_PRIORITY_RE = re.compile(r"\[Priority:\s*(\d+)\]")
+_EVE_SEV_RE = re.compile(r"\(sev=(\d+)\)")
+_FLOW_RATE_RE = re.compile(r"high outbound connection rate to (\S+) count=(\d+)")
+_FLOW_PORT_RE = re.compile(r"uncommon service .* to (\S+) occurrences=(\d+)")
+_IPV4_RE = re.compile(r"(?<![\d.])(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)(?![\d.])")
+_IPV6_RE = re.compile(r"(?<![0-9A-Fa-f:])(?:[0-9A-Fa-f]{0,4}:){2,7}[0-9A-Fa-f]{0,4}(?![0-9A-Fa-f:])")
+
+
+class CIDRSet:
+    """Sorted interval list for IPv4/IPv6 membership in O(log n)."""
+
+    def __init__(self, cidrs: Iterable[str] = ()) -> None:
+        self._starts: Dict[int, List[int]] = {4: [], 6: []}
+        self._ends: Dict[int, List[int]] = {4: [], 6: []}
+        nets = []
+        for c in cidrs:
+            try:
+                nets.append(ipaddress.ip_network(str(c).strip(), strict=False))
+            except ValueError:
+                continue
+        for net in ipaddress.collapse_addresses([n for n in nets if n.version == 4]):
+            self._starts[4].append(int(net.network_address))
+            self._ends[4].append(int(net.broadcast_address))
+        for net in ipaddress.collapse_addresses([n for n in nets if n.version == 6]):
+            self._starts[6].append(int(net.network_address))
+            self._ends[6].append(int(net.broadcast_address))
+
+    def __contains__(self, ip: object) -> bool:
+        try:
+            addr = ip if isinstance(ip, (ipaddress.IPv4Address, ipaddress.IPv6Address)) else ipaddress.ip_address(str(ip))
+        except ValueError:
+            return False
+        value = int(addr)
+        starts = self._starts[addr.version]
+        i = bisect.bisect_right(starts, value) - 1
+        return i >= 0 and value <= self._ends[addr.version][i]
+
+
+TRUSTED_CIDRS = ("127.0.0.0/8", "::1/128", "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16",
+                 "169.254.0.0/16", "fe80::/10", "fc00::/7", "224.0.0.0/4", "ff00::/8", "0.0.0.0/32")
+
+
+@dataclass
+class RuleVerdict:
+    severity: str
+    reason: str
+    ips: List[str] = field(default_factory=list)
+    # Offending address: first external one, else first extracted
+    ip: Optional[str] = None
+    # False means the rules had no strong opinion and the event should go to the LLM
+    confident: bool = False
+
+
+class ThreatRules:
+    """Precompiled local classifier run before (and usually instead of) the LLM.
+
+    - Suricata severity/priority and signature-id tables
+    - Compiled signature and flow-message regexes
+    - CIDR sets for trusted (never blocked) and known-bad networks
+    Tables can be extended from APP_DATA_DIR/threat_rules.json:
+    {"bad_cidrs": [...], "trusted_cidrs": [...], "sid_severity": {"<sid>": "<severity>"}}
+    """
+
+    def __init__(self) -> None:
+        extra: Dict[str, Any] = {}
+        try:
+            path = os.path.join(get_app_data_dir(), "threat_rules.json")
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    extra = json.load(f) or {}
+        except Exception:
+            extra = {}
+        self.trusted = CIDRSet(list(TRUSTED_CIDRS) + list(extra.get("trusted_cidrs", [])))
+        self.known_bad = CIDRSet(extra.get("bad_cidrs", []))
+        self._sid_severity = dict(SID_SEVERITY)
+        for sid, sev in (extra.get("sid_severity") or {}).items():
+            if sev in SEVERITY_RANK:
+                self._sid_severity[int(sid)] = sev
+
+    @staticmethod
+    def extract_ips(text: str) -> List[str]:
+        out: List[str] = []
+        for m in _IPV4_RE.finditer(text):
+            if m.group(0) not in out:
+                out.append(m.group(0))
+        for m in _IPV6_RE.finditer(text):
+            candidate = m.group(0)
+            try:
+                ipaddress.IPv6Address(candidate)
+            except ValueError:
+                continue
+            if candidate not in out:
+                out.append(candidate)
+        return out
+
+    def _pick_ip(self, ips: List[str]) -> Optional[str]:
+        for ip in ips:
+            if ip not in self.trusted:
+                return ip
+        return ips[0] if ips else None
+
+    def classify(self, source: str, message: str, meta: Optional[Dict[str, Any]] = None) -> RuleVerdict:
+        meta = meta or {}
+        ips = self.extract_ips(message)
+        for key in ("src_ip", "dest_ip"):
+            if meta.get(key) and str(meta[key]) not in ips:
+                ips.append(str(meta[key]))
+        verdict = RuleVerdict(severity="info", reason="no rule matched", ips=ips, ip=self._pick_ip(ips))
+
+        bad = [ip for ip in ips if ip in self.known_bad]
+        if bad:
+            verdict.severity, verdict.reason, verdict.ip, verdict.confident = "high", "address in known-bad list", bad[0], True
+            return verdict
+
+        if source == "suricata":
+            return self._classify_suricata(message, meta, verdict)
+        if source == "flow_monitor":
+            return self._classify_flow(message, verdict)
+        return verdict
+
+    def _classify_suricata(self, message: str, meta: Dict[str, Any], verdict: RuleVerdict) -> RuleVerdict:
+        sid = meta.get("signature_id")
+        if sid is None:
+            m = _FAST_SID_RE.search(message)
+            if m:
+                sid = int(m.group(2))
+        if sid is not None and int(sid) in self._sid_severity:
+            verdict.severity, verdict.reason, verdict.confident = self._sid_severity[int(sid)], f"signature id {sid}", True
+            return verdict
+
+        text = " ".join([message] + [str(meta.get(k) or "") for k in ("signature", "category")])
+        pattern_sev: Optional[str] = None
+        for pattern, sev in SIGNATURE_PATTERNS:
+            if pattern.search(text):
+                pattern_sev = sev
+                break
+
+        prio = meta.get("alert_severity")
+        if prio is None:
+            m = _FAST_PRIORITY_RE.search(message) or _EVE_SEV_RE.search(message)
+            if m:
+                prio = int(m.group(1))
+        prio_sev = SURICATA_SEVERITY.get(int(prio)) if prio is not None else None
+
+        if pattern_sev and prio_sev:
+            # Both opinions: take the higher; confident when they roughly agree
+            hi = max(pattern_sev, prio_sev, key=SEVERITY_RANK.__getitem__)
+            verdict.severity = hi
+            verdict.reason = f"signature pattern ({pattern_sev}) and priority {prio} ({prio_sev})"
+            verdict.confident = abs(SEVERITY_RANK[pattern_sev] - SEVERITY_RANK[prio_sev]) <= 1
+        elif pattern_sev or prio_sev:
+            verdict.severity = pattern_sev or prio_sev or "info"
+            verdict.reason = f"signature pattern ({pattern_sev})" if pattern_sev else f"priority {prio}"
+            # Priority alone is the ruleset's own verdict; a lone text match is weaker
+            verdict.confident = prio_sev is not None or verdict.severity in ("info", "critical")
+        return verdict
+
+    def _classify_flow(self, message: str, verdict: RuleVerdict) -> RuleVerdict:
+        m = _FLOW_RATE_RE.search(message)
+        if m:
+            count = int(m.group(2))
+            verdict.severity = "medium" if count >= 200 else "low"
+            verdict.reason = f"outbound connection rate {count}/min"
+            verdict.confident = count < 200
+            return verdict
+        m = _FLOW_PORT_RE.search(message)
+        if m:
+            verdict.severity = "medium"
+            verdict.reason = f"repeated connections to uncommon service ({m.group(2)})"
+            verdict.confident = False
+        return verdict
+
+
+threat_rules = ThreatRules()
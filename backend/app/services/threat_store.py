@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..models.threats import ThreatEvent
+from ..utils.paths import get_app_data_dir
+from .live_hub import live_hub
+from .threat_rules import SEVERITY_RANK
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS events ("
+    " id TEXT PRIMARY KEY, rev INTEGER NOT NULL, ts REAL NOT NULL, sev INTEGER NOT NULL,"
+    " source TEXT NOT NULL, ip TEXT, data TEXT NOT NULL)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS events_rev ON events(rev)",
+    "CREATE INDEX IF NOT EXISTS events_ts ON events(ts)",
+    "CREATE INDEX IF NOT EXISTS events_sev_ts ON events(sev, ts)",
+    "CREATE INDEX IF NOT EXISTS events_source_ts ON events(source, ts)",
+    "CREATE INDEX IF NOT EXISTS events_ip_ts ON events(ip, ts)",
+)
+
+# (rev, id, ts, sev, source, ip, json)
+_Row = Tuple[int, str, float, int, str, Optional[str], str]
+
+
+class ThreatStore:
+    """Durable threat event log in a single SQLite WAL database.
+
+    - Every insert or update of an event gets the next revision number; the revision is the cursor,
+      so a poll with the last cursor returns new events and ones enriched since (LLM verdict, block)
+    - Writes go to a writer thread in revision order; the event loop never waits on disk
+    - Indexed by time, severity, source and IP for filtered queries
+    - Retention drops events past the age limit, then the oldest past the row limit
+    """
+
+    def __init__(self) -> None:
+        self._path = os.path.join(get_app_data_dir(), "threats.db")
+        self._retention_seconds = max(1, settings.threat_retention_days) * 86400
+        self._max_events = max(1, settings.threat_max_events)
+        self._queue: "queue.Queue[Optional[_Row]]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._rev = 0
+        self._last_retention_ts = 0.0
+        self.dropped = 0
+
+    # ---- lifecycle ----
+    async def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._rev = await asyncio.to_thread(self._init_db)
+        self._thread = threading.Thread(target=self._writer, name="threat-store-writer", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if not self._thread:
+            return
+        self._queue.put(None)
+        await asyncio.to_thread(self._thread.join, 10.0)
+        self._thread = None
+
+    def _init_db(self) -> int:
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT MAX(rev) FROM events").fetchone()
+            return int(row[0] or 0)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+        return conn
+
+    def put(self, event: ThreatEvent) -> None:
+        """Record the current state of an event (insert or replace); call again after changing it."""
+        if not self._thread:
+            return
+        self._rev += 1
+        data = event.model_dump_json()
+        # Pushed as-is: the same JSON the events API returns for it
+        live_hub.publish_json("threats", data)
+        row = (
+            self._rev,
+            event.id,
+            # Event timestamps are naive UTC
+            event.timestamp.replace(tzinfo=timezone.utc).timestamp(),
+            SEVERITY_RANK.get(event.severity, 0),
+            event.source,
+            event.ip,
+            data,
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    # ---- writer thread ----
+    def _writer(self) -> None:
+        conn = self._connect()
+        running = True
+        try:
+            while running:
+                rows: List[_Row] = []
+                try:
+                    item = self._queue.get(timeout=1.0)
+                    if item is None:
+                        running = False
+                    else:
+                        rows.append(item)
+                    while running:
+                        item = self._queue.get_nowait()
+                        if item is None:
+                            running = False
+                        else:
+                            rows.append(item)
+                except queue.Empty:
+                    pass
+                try:
+                    if rows:
+                        with conn:
+                            conn.executemany(
+                                "INSERT INTO events (rev, id, ts, sev, source, ip, data) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                                "ON CONFLICT(id) DO UPDATE SET rev=excluded.rev, sev=excluded.sev, ip=excluded.ip, data=excluded.data",
+                                rows,
+                            )
+                    self._apply_retention(conn, force=not running)
+                except Exception as exc:  # noqa: BLE001
+                    print(f"[threat_store] error: {exc}")
+        finally:
+            conn.close()
+
+    def _apply_retention(self, conn: sqlite3.Connection, force: bool = False) -> None:
+        now = time.time()
+        if not force and (now - self._last_retention_ts) < 60.0:
+            return
+        self._last_retention_ts = now
+        with conn:
+            conn.execute("DELETE FROM events WHERE ts < ?", (now - self._retention_seconds,))
+            conn.execute(
+                "DELETE FROM events WHERE ts < (SELECT ts FROM events ORDER BY ts DESC LIMIT 1 OFFSET ?)",
+                (self._max_events - 1,),
+            )
+
+    # ---- reads ----
+    def _query(
+        self,
+        cursor: Optional[int],
+        since: Optional[float],
+        min_severity: Optional[str],
+        ip: Optional[str],
+        source: Optional[str],
+        limit: int,
+    ) -> Tuple[List[ThreatEvent], Optional[int], bool]:
+        where: List[str] = []
+        args: List[Any] = []
+        if cursor is not None:
+            where.append("rev > ?")
+            args.append(cursor)
+        if since is not None:
+            where.append("ts >= ?")
+            args.append(since)
+        if min_severity:
+            where.append("sev >= ?")
+            args.append(SEVERITY_RANK.get(min_severity, 0))
+        if ip:
+            where.append("ip = ?")
+            args.append(ip)
+        if source:
+            where.append("source = ?")
+            args.append(source)
+        sql = "SELECT rev, data FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # With a cursor: oldest changes first. Without: the newest page, returned in ascending order
+        sql += " ORDER BY rev " + ("ASC" if cursor is not None else "DESC") + " LIMIT ?"
+        args.append(limit + 1)
+        head = cursor
+        try:
+            conn = sqlite3.connect(f"file:{self._path}?mode=ro", uri=True)
+            try:
+                rows = conn.execute(sql, args).fetchall()
+                if not rows and cursor is None:
+                    # Nothing matches yet: start polling from the last committed revision
+                    head = int(conn.execute("SELECT MAX(rev) FROM events").fetchone()[0] or 0)
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            rows = []
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if cursor is None:
+            rows.reverse()
+            # The newest page is the starting point for polling: everything older is "seen"
+            more = False
+        events = [ThreatEvent.model_validate_json(data) for _rev, data in rows]
+        next_cursor = rows[-1][0] if rows else head
+        return events, next_cursor, more
+
+    async def query(
+        self,
+        cursor: Optional[int] = None,
+        since: Optional[float] = None,
+        min_severity: Optional[str] = None,
+        ip: Optional[str] = None,
+        source: Optional[str] = None,
+        limit: int = 200,
+    ) -> Tuple[List[ThreatEvent], Optional[int], bool]:
+        """Return (events, next_cursor, more).
+
+        Without a cursor: the newest `limit` matching events. With a cursor: events created or
+        updated after it, oldest change first; `more` means another page is waiting.
+        """
+        return await asyncio.to_thread(self._query, cursor, since, min_severity, ip, source, max(1, limit))
+
+    def stats(self) -> Dict[str, Any]:
+        size = 0
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                size += os.path.getsize(self._path + suffix)
+            except OSError:
+                pass
+        return {"rev": self._rev, "bytes": size, "max_events": self._max_events, "dropped": self.dropped}
+
+
+threat_store = ThreatStore()
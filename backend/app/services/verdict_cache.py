@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import hashlib
+import ipaddress
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+from ..utils.paths import get_app_data_dir
+
+
+# Volatile message parts, stripped before hashing
+_TIMESTAMP_RE = re.compile(
+    r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"
+    r"|\b\d{2}/\d{2}/\d{4}-\d{2}:\d{2}:\d{2}(?:\.\d+)?"
+)
+_SID_RE = re.compile(r"\[(\d+):(\d+):\d+\]")
+# Suricata severity (eve "(sev=N)" / fast.log "[Priority: N]"): part of the verdict, not volatile
+_SEVERITY_RE = re.compile(r"\(sev=(\d+)\)|\[Priority:\s*(\d+)\]", re.IGNORECASE)
+_IPV4_PORT_RE = re.compile(r"\b((?:\d{1,3}\.){3}\d{1,3})(?::\d+)?\b")
+_IPV6_PORT_RE = re.compile(r"\[([0-9a-fA-F:]+)\]:\d+")
+_PORT_KV_RE = re.compile(r"\b(s?port|dport|dst_port|src_port)=\d+", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"(?<![\w.<])\d+(?:\.\d+)?\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _ip_class(raw: str) -> str:
+    try:
+        ip = ipaddress.ip_address(raw)
+    except ValueError:
+        return "<ip>"
+    if ip.is_loopback:
+        return "<loopback>"
+    if ip.is_multicast:
+        return "<multicast>"
+    if ip.is_private or ip.is_link_local:
+        return "<private>"
+    return "<public>"
+
+
+def normalize_message(message: str) -> str:
+    """Reduce a threat message to its stable parts.
+
+    Keeps the signature id (gid:sid), the Suricata severity and the class of each address
+    (private/public/...), drops timestamps, ports, counts and other numbers.
+    """
+    sids = " ".join(f"sid:{m.group(1)}:{m.group(2)}" for m in _SID_RE.finditer(message))
+    sevs = " ".join(f"sev:{m.group(1) or m.group(2)}" for m in _SEVERITY_RE.finditer(message))
+    text = _SEVERITY_RE.sub("", _SID_RE.sub("", _TIMESTAMP_RE.sub("", message)))
+    text = _IPV6_PORT_RE.sub(lambda m: _ip_class(m.group(1)), text)
+    text = _IPV4_PORT_RE.sub(lambda m: _ip_class(m.group(1)), text)
+    text = _PORT_KV_RE.sub(lambda m: f"{m.group(1).lower()}=<n>", text)
+    text = _NUMBER_RE.sub("<n>", text)
+    return _SPACE_RE.sub(" ", f"{sids} {sevs} {text}").strip().lower()
+
+
+def message_signature(source: str, message: str) -> str:
+    norm = normalize_message(message)
+    return hashlib.blake2b(f"{source}|{norm}".encode("utf-8", errors="ignore"), digest_size=12).hexdigest()
+
+
+class VerdictCache:
+    """TTL + LRU cache of LLM verdicts keyed by normalized message signature.
+
+    Persisted under the app data dir so repeated alerts stay cheap across restarts.
+    """
+
+    def __init__(self) -> None:
+        self._path = os.path.join(get_app_data_dir(), "run", "verdict_cache.json")
+        self._ttl = max(1, settings.verdict_cache_ttl)
+        self._max_entries = max(1, settings.verdict_cache_size)
+        # signature -> (severity, explanation, expires_at)
+        self._entries: "OrderedDict[str, Tuple[str, Optional[str], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._last_save_ts = 0.0
+
+    def get(self, signature: str, now: Optional[float] = None, record: bool = True) -> Optional[Tuple[str, Optional[str]]]:
+        """Return (severity, explanation) if cached; `record=False` leaves hit/miss counters alone."""
+        now = time.time() if now is None else now
+        entry = self._entries.get(signature)
+        if entry is None or entry[2] <= now:
+            if entry is not None:
+                del self._entries[signature]
+                self._dirty = True
+            self.misses += record
+            return None
+        self._entries.move_to_end(signature)
+        self.hits += record
+        return entry[0], entry[1]
+
+    def put(self, signature: str, severity: str, explanation: Optional[str], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        self._entries[signature] = (severity, explanation, now + self._ttl)
+        self._entries.move_to_end(signature)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self._max_entries,
+            "ttl_seconds": self._ttl,
+        }
+
+    def load(self) -> None:
+        try:
+            if not os.path.exists(self._path):
+                return
+            with open(self._path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            now = time.time()
+            entries = [(sig, sev, expl, float(exp)) for sig, sev, expl, exp in payload.get("entries", [])]
+            self._entries = OrderedDict((sig, (sev, expl, exp)) for sig, sev, expl, exp in entries if exp > now)
+        except Exception:
+            # ignore load errors
+            self._entries = OrderedDict()
+
+    def save(self, force: bool = False) -> None:
+        now = time.time()
+        if not self._dirty or (not force and (now - self._last_save_ts) < 60.0):
+            return
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            payload = {
+                "version": 1,
+                "entries": [[sig, sev, expl, exp] for sig, (sev, expl, exp) in self._entries.items()],
+            }
+            tmp = self._path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp, self._path)
+            self._dirty = False
+            self._last_save_ts = now
+        except Exception:
+            # ignore save errors
+            pass
+
+
+verdict_cache = VerdictCache()
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import struct
+from typing import Tuple
+
+
+_HEADER = struct.Struct("<4sBIQQ")  # magic, k, capacity, m (bits), count
+_MAGIC = b"RGBF"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing of one blake2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        capacity = max(1, int(capacity))
+        m = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.capacity = capacity
+        self.m = max(8, m)
+        self.k = max(1, int(round(self.m / capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.m + 7) // 8)
+
+    def _positions(self, item: str) -> Tuple[int, ...]:
+        digest = hashlib.blake2b(item.encode("utf-8", errors="ignore"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        h2 |= 1
+        m = self.m
+        return tuple((h1 + i * h2) % m for i in range(self.k))
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def add(self, item: str) -> bool:
+        """Add item; return True if it was (probably) not present before."""
+        bits = self._bits
+        added = False
+        for p in self._positions(item):
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def to_bytes(self) -> bytes:
+        return _HEADER.pack(_MAGIC, self.k, self.capacity, self.m, self.count) + bytes(self._bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, offset: int = 0) -> "BloomFilter":
+        magic, k, capacity, m, count = _HEADER.unpack_from(data, offset)
+        if magic != _MAGIC:
+            raise ValueError("not a bloom filter")
+        start = offset + _HEADER.size
+        body = data[start:start + (m + 7) // 8]
+        if len(body) != (m + 7) // 8:
+            raise ValueError("truncated bloom filter")
+        bf = cls.__new__(cls)
+        bf.capacity = capacity
+        bf.m = m
+        bf.k = k
+        bf.count = count
+        bf._bits = bytearray(body)
+        return bf
+
+    @classmethod
+    def serialized_size(cls, data: bytes, offset: int = 0) -> int:
+        _, _, _, m, _ = _HEADER.unpack_from(data, offset)
+        return _HEADER.size + (m + 7) // 8
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Any, Dict, Optional
+
+
+# Relative accuracy: a reported quantile is within 1% of the true sample at that rank
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+_LN_GAMMA = math.log(GAMMA)
+# Rates below this (bytes/s) count as zero; they carry no capacity information
+MIN_VALUE = 1.0
+# 1% bins from 1 B/s to ~1 PB/s fit in ~1750; the cap only guards against garbage input
+MAX_BINS = 2048
+
+
+def _key(x: float) -> int:
+    return math.ceil(math.log(x) / _LN_GAMMA)
+
+
+def _value(key: int) -> float:
+    # Midpoint (in relative terms) of the bin (gamma^(key-1), gamma^key]
+    return 2 * GAMMA ** key / (GAMMA + 1)
+
+
+class DDSketch:
+    """Mergeable quantile sketch with relative error guarantees (DDSketch, positive values only).
+
+    - A value lands in the log-spaced bin ceil(log_gamma(x)); bin counts live in one dense array('d')
+      starting at `offset`, so a sketch is a few KB however many samples went in
+    - Merging adds counts bin by bin: sketches of hours merge into days, days into months, exactly as
+      if one sketch had seen every sample
+    - Past MAX_BINS the lowest bins are folded together, keeping the high quantiles accurate
+    """
+
+    __slots__ = ("offset", "bins", "zero", "count", "min", "max", "sum")
+
+    def __init__(self) -> None:
+        self.offset = 0
+        self.bins = array("d")
+        self.zero = 0.0
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sum = 0.0
+
+    def add(self, x: float, weight: float = 1.0) -> None:
+        if not math.isfinite(x):
+            return
+        self.count += weight
+        self.sum += x * weight
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        if x < MIN_VALUE:
+            self.zero += weight
+            return
+        key = _key(x)
+        self._reserve(key, key)
+        # A key below bins folded by the cap counts in the lowest remaining bin
+        self.bins[max(0, key - self.offset)] += weight
+
+    def _reserve(self, lo: int, hi: int) -> None:
+        bins = self.bins
+        if not bins:
+            self.offset = lo
+            self.bins = array("d", [0.0]) * (hi - lo + 1)
+            return
+        if lo < self.offset:
+            self.bins = array("d", [0.0]) * (self.offset - lo) + bins
+            self.offset = lo
+        end = self.offset + len(self.bins) - 1
+        if hi > end:
+            self.bins.extend(array("d", [0.0]) * (hi - end))
+        if len(self.bins) > MAX_BINS:
+            excess = len(self.bins) - MAX_BINS
+            folded = sum(self.bins[: excess + 1])
+            del self.bins[:excess]
+            self.bins[0] = folded
+            self.offset += excess
+
+    def copy(self) -> "DDSketch":
+        sk = DDSketch()
+        sk.offset, sk.bins, sk.zero, sk.count = self.offset, array("d", self.bins), self.zero, self.count
+        sk.min, sk.max, sk.sum = self.min, self.max, self.sum
+        return sk
+
+    def merge(self, other: "DDSketch") -> None:
+        if not other.count:
+            return
+        self.count += other.count
+        self.sum += other.sum
+        self.zero += other.zero
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if not other.bins:
+            return
+        self._reserve(other.offset, other.offset + len(other.bins) - 1)
+        base = other.offset - self.offset
+        bins = self.bins
+        if base < 0:
+            # Bins folded away by the cap above go to the lowest remaining one
+            bins[0] += sum(other.bins[:-base])
+            for i, c in enumerate(other.bins[-base:]):
+                bins[i] += c
+            return
+        for i, c in enumerate(other.bins, base):
+            bins[i] += c
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q in [0, 1]; None for an empty sketch."""
+        if not self.count:
+            return None
+        rank = max(0.0, min(1.0, q)) * (self.count - 1)
+        seen = self.zero
+        if seen > rank:
+            return max(0.0, self.min)
+        for i, c in enumerate(self.bins):
+            seen += c
+            if seen > rank:
+                return min(self.max, max(self.min, _value(self.offset + i)))
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Trailing and leading empty bins are not stored
+        bins = self.bins.tolist()
+        lo = next((i for i, c in enumerate(bins) if c), len(bins))
+        hi = len(bins) - next((i for i, c in enumerate(reversed(bins)) if c), len(bins))
+        return {
+            "o": self.offset + lo,
+            "b": [int(c) if c.is_integer() else c for c in bins[lo:hi]],
+            "z": self.zero,
+            "n": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "s": self.sum,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "DDSketch":
+        sk = cls()
+        sk.offset = int(d.get("o", 0))
+        sk.bins = array("d", map(float, d.get("b", [])))
+        sk.zero = float(d.get("z", 0.0))
+        sk.count = float(d.get("n", 0.0))
+        sk.sum = float(d.get("s", 0.0))
+        if sk.count:
+            sk.min = float(d["min"])
+            sk.max = float(d["max"])
+        return sk
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Sequence, Tuple
+
+
+# (ts, rx, tx)
+Point = Tuple[float, float, float]
+METHODS = ("lttb", "minmax", "avg")
+
+
+def _bounds(size: int, buckets: int) -> List[Tuple[int, int]]:
+    return [(i * size // buckets, (i + 1) * size // buckets) for i in range(buckets)]
+
+
+def lttb(ts: Sequence[float], rx: Sequence[float], tx: Sequence[float], n: int) -> List[Point]:
+    """Largest-Triangle-Three-Buckets down to `n` points, keeping first and last.
+
+    Points are chosen on rx + tx so both lines keep the same x positions; the visual shape
+    (spikes included) survives far better than with plain striding.
+    """
+    size = len(ts)
+    n = max(3, n)
+    if n >= size:
+        return list(zip(ts, rx, tx))
+    t = list(ts)
+    y = [r + x for r, x in zip(rx, tx)]
+    every = (size - 2) / (n - 2)
+    picked = [0]
+    a = 0
+    for i in range(n - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        # Average of the next bucket is the third triangle corner
+        nlo = hi
+        nhi = min(max(int((i + 2) * every) + 1, nlo + 1), size)
+        count = nhi - nlo
+        avg_t = sum(t[nlo:nhi]) / count
+        avg_y = sum(y[nlo:nhi]) / count
+        at, ay = t[a], y[a]
+        best, best_i = -1.0, lo
+        for j in range(lo, hi):
+            area = abs((at - avg_t) * (y[j] - ay) - (at - t[j]) * (avg_y - ay))
+            if area > best:
+                best, best_i = area, j
+        picked.append(best_i)
+        a = best_i
+    picked.append(size - 1)
+    return [(ts[i], rx[i], tx[i]) for i in picked]
+
+
+def minmax(ts: Sequence[float], rx: Sequence[float], tx: Sequence[float], n: int) -> List[Point]:
+    """Two points per bucket carrying each line's min and max, in the order they occurred.
+
+    Keeps every peak and trough, so nothing gets averaged away on bursty traffic.
+    """
+    size = len(ts)
+    if n >= size:
+        return list(zip(ts, rx, tx))
+    out: List[Point] = []
+    for lo, hi in _bounds(size, max(1, n // 2)):
+        if hi - lo == 1:
+            out.append((ts[lo], rx[lo], tx[lo]))
+            continue
+        if hi <= lo:
+            continue
+        pair = []
+        for col in (rx, tx):
+            seg = col[lo:hi]
+            i_min = min(range(len(seg)), key=seg.__getitem__)
+            i_max = max(range(len(seg)), key=seg.__getitem__)
+            first, second = (i_min, i_max) if i_min <= i_max else (i_max, i_min)
+            pair.append((seg[first], seg[second]))
+        out.append((ts[lo], pair[0][0], pair[1][0]))
+        out.append((ts[hi - 1], pair[0][1], pair[1][1]))
+    return out
+
+
+def avg(ts: Sequence[float], rx: Sequence[float], tx: Sequence[float], n: int) -> List[Point]:
+    """Bucket means (time included): smooth, but flattens short spikes."""
+    size = len(ts)
+    if n >= size:
+        return list(zip(ts, rx, tx))
+    out: List[Point] = []
+    for lo, hi in _bounds(size, max(1, n)):
+        count = hi - lo
+        if count:
+            out.append((sum(ts[lo:hi]) / count, sum(rx[lo:hi]) / count, sum(tx[lo:hi]) / count))
+    return out
+
+
+def decimate(ts: Sequence[float], rx: Sequence[float], tx: Sequence[float], n: int, method: str = "lttb") -> List[Point]:
+    """Reduce a (ts, rx, tx) series to at most `n` points; raises ValueError for an unknown method."""
+    if method == "lttb":
+        return lttb(ts, rx, tx, n)
+    if method == "minmax":
+        return minmax(ts, rx, tx, n)
+    if method == "avg":
+        return avg(ts, rx, tx, n)
+    raise ValueError(f"unknown decimation method: {method!r}")
+
+
+class DecimationCache:
+    """Small LRU of computed results, each valid while its source version is unchanged."""
+
+    def __init__(self, size: int = 64) -> None:
+        self._size = size
+        self._items: "OrderedDict[Hashable, Tuple[Any, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Any, compute: Callable[[], Any]) -> Any:
+        hit = self._items.get(key)
+        if hit is not None and hit[0] == version:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return hit[1]
+        self.misses += 1
+        value = compute()
+        self._items[key] = (version, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self._size:
+            self._items.popitem(last=False)
+        return value
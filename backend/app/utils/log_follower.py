@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import os
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+
+from .paths import get_app_data_dir
+
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+FILE_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF
+DIR_MASK = IN_CREATE | IN_MOVED_TO
+
+
+class _Inotify:
+    """Minimal ctypes binding: we only need wake-ups, not event details."""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm = libc.inotify_rm_watch
+        self._rm.argtypes = [ctypes.c_int, ctypes.c_int]
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.fd = fd
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._add(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._rm(self.fd, wd)
+
+    def drain(self) -> None:
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class LogFollower:
+    """Follow an append-only log file across logrotate (rename or copytruncate).
+
+    - Wakes on inotify events for the file and its directory; polls when inotify is unavailable
+    - Reads large chunks and yields complete lines in batches
+    - Persists (inode, offset) of consumed lines under the app data dir so restarts resume
+      without losing or replaying lines
+    """
+
+    def __init__(
+        self,
+        path: str,
+        state_name: str,
+        chunk_size: int = 256 * 1024,
+        max_batch: int = 2000,
+        poll_interval: float = 0.5,
+        recheck_interval: float = 5.0,
+    ) -> None:
+        self._path = path
+        self._state_path = os.path.join(get_app_data_dir(), "run", "followers", f"{state_name}.json")
+        self._chunk_size = chunk_size
+        self._max_batch = max_batch
+        self._poll_interval = poll_interval
+        # Even with inotify, re-stat periodically in case a rotation raced our watches
+        self._recheck_interval = recheck_interval
+        self._fd: Optional[int] = None
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._last_save_ts = 0.0
+        self._inotify: Optional[_Inotify] = None
+        self._file_wd: Optional[int] = None
+        self._wake = asyncio.Event()
+
+    # ---- offset state ----
+    def _load_state(self) -> Tuple[Optional[int], int]:
+        try:
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("path") != self._path:
+                return None, 0
+            return int(data["inode"]), int(data["offset"])
+        except Exception:
+            return None, 0
+
+    def _save_state(self, force: bool = False) -> None:
+        now = time.time()
+        if not force and (now - self._last_save_ts) < 2.0:
+            return
+        if self._inode is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._state_path), exist_ok=True)
+            tmp = self._state_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"path": self._path, "inode": self._inode, "offset": self._offset}, f)
+            os.replace(tmp, self._state_path)
+            self._last_save_ts = now
+        except Exception:
+            pass
+
+    # ---- file handling ----
+    def _open(self, path: str) -> Optional[os.stat_result]:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        self._close()
+        self._fd = fd
+        st = os.fstat(fd)
+        self._inode = st.st_ino
+        if self._inotify is not None and path == self._path:
+            try:
+                self._file_wd = self._inotify.add_watch(path, FILE_MASK)
+            except OSError:
+                self._file_wd = None
+        return st
+
+    def _close(self) -> None:
+        if self._inotify is not None and self._file_wd is not None:
+            self._inotify.rm_watch(self._file_wd)
+            self._file_wd = None
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def _resume(self) -> None:
+        """Open the log and pick the starting offset from persisted state."""
+        inode, offset = self._load_state()
+        if inode is not None:
+            # The file we were reading may have been rotated while we were down; finish it first
+            for candidate in (self._path, self._path + ".1"):
+                try:
+                    if os.stat(candidate).st_ino != inode:
+                        continue
+                except OSError:
+                    continue
+                st = self._open(candidate)
+                if st is not None:
+                    self._offset = offset if st.st_size >= offset else 0
+                    return
+        st = self._open(self._path)
+        if st is None:
+            self._offset = 0
+            return
+        # Fresh start tails from the end; a known-but-replaced file is read from the top
+        self._offset = 0 if inode is not None else st.st_size
+
+    def _reopen_if_rotated(self) -> bool:
+        """Switch to the file now at `path` if ours was renamed/deleted. True if switched."""
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            return False
+        if self._fd is not None and st.st_ino == self._inode:
+            return False
+        if self._open(self._path) is None:
+            return False
+        self._offset = 0
+        return True
+
+    def _truncated(self) -> bool:
+        if self._fd is None:
+            return False
+        try:
+            return os.fstat(self._fd).st_size < self._offset
+        except OSError:
+            return False
+
+    def _read_chunk(self, pos: int) -> bytes:
+        if self._fd is None:
+            return b""
+        return os.pread(self._fd, self._chunk_size, pos)
+
+    # ---- wake-ups ----
+    def _setup_inotify(self) -> None:
+        try:
+            self._inotify = _Inotify()
+            self._inotify.add_watch(os.path.dirname(self._path) or ".", DIR_MASK)
+            asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_inotify)
+        except Exception:
+            if self._inotify is not None:
+                self._inotify.close()
+            self._inotify = None
+
+    def _on_inotify(self) -> None:
+        if self._inotify is not None:
+            self._inotify.drain()
+        self._wake.set()
+
+    def _teardown_inotify(self) -> None:
+        if self._inotify is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._inotify.fd)
+        except Exception:
+            pass
+        self._inotify.close()
+        self._inotify = None
+        self._file_wd = None
+
+    async def _wait(self, stop: asyncio.Event) -> None:
+        timeout = self._recheck_interval if self._inotify is not None else self._poll_interval
+        waiters = [asyncio.ensure_future(self._wake.wait()), asyncio.ensure_future(stop.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for w in waiters:
+                w.cancel()
+        self._wake.clear()
+
+    # ---- public API ----
+    async def batches(self, stop: asyncio.Event) -> AsyncIterator[List[str]]:
+        """Yield lists of complete lines until `stop` is set.
+
+        The offset of a batch is committed once the consumer asks for the next batch.
+        """
+        self._setup_inotify()
+        self._resume()
+        pending = b""
+        try:
+            while not stop.is_set():
+                if self._fd is None:
+                    self._reopen_if_rotated()
+                    if self._fd is None:
+                        await self._wait(stop)
+                        continue
+                data = await asyncio.to_thread(self._read_chunk, self._offset + len(pending))
+                if data:
+                    pending += data
+                    cut = pending.rfind(b"\n")
+                    if cut < 0:
+                        continue
+                    complete, pending = pending[: cut + 1], pending[cut + 1:]
+                    lines = complete.decode("utf-8", errors="replace").splitlines()
+                    for i in range(0, len(lines), self._max_batch):
+                        yield lines[i:i + self._max_batch]
+                    self._offset += len(complete)
+                    self._save_state()
+                    continue
+                # EOF on our descriptor: rotation, truncation, or just idle
+                if self._truncated():
+                    self._offset = 0
+                    pending = b""
+                    continue
+                if self._reopen_if_rotated():
+                    if pending:
+                        # The rotated file ended without a newline; deliver what it had
+                        yield [pending.decode("utf-8", errors="replace")]
+                        pending = b""
+                    continue
+                self._save_state()
+                await self._wait(stop)
+        finally:
+            self._save_state(force=True)
+            self._teardown_inotify()
+            self._close()
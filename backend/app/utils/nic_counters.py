@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import os
+import socket
+import time
+from typing import Callable, Dict, Optional, Tuple, Union
+
+
+# name -> (ifindex, rx_bytes, tx_bytes); ifindex follows a device across renames
+Counters = Dict[str, Tuple[int, int, int]]
+
+SYSFS_NET = "/sys/class/net"
+# How often the sysfs source looks for new, renamed or removed interfaces
+RESCAN_SECONDS = 5.0
+
+
+def counter_delta(prev: int, cur: int) -> Optional[int]:
+    """Bytes between two readings of a monotonically increasing counter.
+
+    Handles 32-bit wrap (32-bit kernels/drivers) and 64-bit wrap; None means the counter
+    went backwards in a way a wrap cannot explain (device reset) and the sample should be skipped.
+    """
+    if cur >= prev:
+        return cur - prev
+    if prev < (1 << 32) and (cur + (1 << 32) - prev) < (1 << 31):
+        return cur + (1 << 32) - prev
+    if prev >= (1 << 63):
+        return cur + (1 << 64) - prev
+    return None
+
+
+class SysfsCounters:
+    """Per-interface byte counters read with pread() on file descriptors kept open.
+
+    - Only interfaces accepted by `wanted` get descriptors; nothing else is read
+    - A sysfs attribute is regenerated on every read from offset 0, so one pread per counter
+      per sample is all it costs (no open/close, no parsing of /proc/net/dev)
+    - Interfaces are matched by ifindex on rescan: a rename keeps its descriptors,
+      a removed device is dropped on the first failed read
+    """
+
+    name = "sysfs"
+
+    def __init__(self, wanted: Callable[[str], bool], root: str = SYSFS_NET) -> None:
+        self._wanted = wanted
+        self._root = root
+        # name -> (ifindex, rx fd, tx fd)
+        self._fds: Dict[str, Tuple[int, int, int]] = {}
+        self._last_scan = 0.0
+
+    @staticmethod
+    def available(root: str = SYSFS_NET) -> bool:
+        return os.path.isdir(root)
+
+    def _open(self, name: str) -> Optional[Tuple[int, int]]:
+        base = os.path.join(self._root, name, "statistics")
+        try:
+            rx = os.open(os.path.join(base, "rx_bytes"), os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            tx = os.open(os.path.join(base, "tx_bytes"), os.O_RDONLY)
+        except OSError:
+            os.close(rx)
+            return None
+        return rx, tx
+
+    def _scan(self) -> None:
+        self._last_scan = time.monotonic()
+        current: Dict[str, int] = {}
+        try:
+            names = os.listdir(self._root)
+        except OSError:
+            names = []
+        for name in names:
+            if not self._wanted(name):
+                continue
+            try:
+                with open(os.path.join(self._root, name, "ifindex"), "r") as f:
+                    current[name] = int(f.read().strip())
+            except (OSError, ValueError):
+                continue
+        by_index = {ifindex: name for name, (ifindex, _rx, _tx) in self._fds.items()}
+        fds: Dict[str, Tuple[int, int, int]] = {}
+        for name, ifindex in current.items():
+            old = self._fds.get(name)
+            if old is not None and old[0] == ifindex:
+                fds[name] = old
+                continue
+            old_name = by_index.get(ifindex)
+            if old_name is not None and old_name not in fds and current.get(old_name) != ifindex:
+                # Renamed: the open attributes still belong to the same device
+                fds[name] = self._fds[old_name]
+                continue
+            opened = self._open(name)
+            if opened is not None:
+                fds[name] = (ifindex, opened[0], opened[1])
+        keep = {(rx, tx) for _i, rx, tx in fds.values()}
+        for _i, rx, tx in self._fds.values():
+            if (rx, tx) not in keep:
+                self._close_pair(rx, tx)
+        self._fds = fds
+
+    @staticmethod
+    def _close_pair(rx: int, tx: int) -> None:
+        for fd in (rx, tx):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def read(self) -> Counters:
+        if time.monotonic() - self._last_scan >= RESCAN_SECONDS:
+            self._scan()
+        out: Counters = {}
+        for name, (ifindex, rx_fd, tx_fd) in list(self._fds.items()):
+            try:
+                rx = int(os.pread(rx_fd, 32, 0))
+                tx = int(os.pread(tx_fd, 32, 0))
+            except (OSError, ValueError):
+                # Device gone (ENODEV): forget it and look again on the next sample
+                del self._fds[name]
+                self._close_pair(rx_fd, tx_fd)
+                self._last_scan = 0.0
+                continue
+            out[name] = (ifindex, rx, tx)
+        return out
+
+    def close(self) -> None:
+        for _i, rx, tx in self._fds.values():
+            self._close_pair(rx, tx)
+        self._fds = {}
+
+
+class NetlinkCounters:
+    """IFLA_STATS64 from one RTM_GETLINK dump over a persistent pyroute2 socket."""
+
+    name = "netlink"
+
+    def __init__(self, wanted: Callable[[str], bool]) -> None:
+        from pyroute2 import IPRoute
+
+        self._wanted = wanted
+        self._ipr = IPRoute()
+
+    def read(self) -> Counters:
+        out: Counters = {}
+        for link in self._ipr.get_links():
+            name = link.get_attr("IFLA_IFNAME")
+            if not name or not self._wanted(name):
+                continue
+            stats = link.get_attr("IFLA_STATS64") or link.get_attr("IFLA_STATS")
+            if not stats:
+                continue
+            out[name] = (int(link["index"]), int(stats["rx_bytes"]), int(stats["tx_bytes"]))
+        return out
+
+    def close(self) -> None:
+        try:
+            self._ipr.close()
+        except Exception:
+            pass
+
+
+class PsutilCounters:
+    """Portable fallback: psutil.net_io_counters (parses /proc/net/dev on Linux)."""
+
+    name = "psutil"
+
+    def __init__(self, wanted: Callable[[str], bool]) -> None:
+        self._wanted = wanted
+        self._ifindex: Dict[str, int] = {}
+
+    def _index(self, name: str) -> int:
+        if name not in self._ifindex:
+            try:
+                self._ifindex[name] = socket.if_nametoindex(name)
+            except OSError:
+                self._ifindex[name] = -1
+        return self._ifindex[name]
+
+    def read(self) -> Counters:
+        import psutil
+
+        out: Counters = {}
+        for name, c in psutil.net_io_counters(pernic=True).items():
+            if self._wanted(name):
+                out[name] = (self._index(name), int(c.bytes_recv), int(c.bytes_sent))
+        return out
+
+    def close(self) -> None:
+        pass
+
+
+CounterSource = Union[SysfsCounters, NetlinkCounters, PsutilCounters]
+
+
+def open_counter_source(kind: str, wanted: Callable[[str], bool]) -> CounterSource:
+    """Counter source by name ("sysfs", "netlink", "psutil"); "auto" picks the cheapest that works.
+
+    The pyroute2 link dump decodes every attribute of every link in Python, which costs more
+    per sample than psutil, so "auto" only uses netlink when asked for explicitly.
+    """
+    order = ("sysfs", "psutil") if kind == "auto" else (kind, "psutil")
+    for candidate in order:
+        try:
+            if candidate == "sysfs" and SysfsCounters.available():
+                return SysfsCounters(wanted)
+            if candidate == "netlink":
+                return NetlinkCounters(wanted)
+            if candidate == "psutil":
+                return PsutilCounters(wanted)
+        except Exception:
+            continue
+    return PsutilCounters(wanted)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import ipaddress
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+Address = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+class _Node:
+    __slots__ = ("children", "value", "full")
+
+    def __init__(self) -> None:
+        self.children: List[Optional[_Node]] = [None, None]
+        # Payload of a prefix stored exactly at this node
+        self.value: Any = None
+        # Whole range covered: stored here, or both halves covered
+        self.full = False
+
+
+_ABSENT = object()
+
+
+def _network(version: int, value: int, prefixlen: int) -> Network:
+    if version == 4:
+        return ipaddress.IPv4Network((value, prefixlen))
+    return ipaddress.IPv6Network((value, prefixlen))
+
+
+class PrefixTrie:
+    """Binary radix trie of IPv4/IPv6 prefixes with a minimal covering view.
+
+    - lookup(ip) finds the most specific stored prefix covering an address in O(prefix length)
+    - collapsed() yields the smallest prefix set covering exactly the stored ranges: prefixes inside
+      another are dropped and sibling halves merge into their parent
+    - add()/remove() return the change to that collapsed set as (removed, added), touching only
+      the subtree whose coverage changed, so callers can apply deltas instead of full reloads
+    """
+
+    def __init__(self) -> None:
+        self._roots: Dict[int, _Node] = {4: _Node(), 6: _Node()}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @staticmethod
+    def _bits(version: int) -> int:
+        return 32 if version == 4 else 128
+
+    def _path(self, net: Network, create: bool) -> List[_Node]:
+        node = self._roots[net.version]
+        bits = self._bits(net.version)
+        value = int(net.network_address)
+        path = [node]
+        for depth in range(net.prefixlen):
+            bit = (value >> (bits - 1 - depth)) & 1
+            child = node.children[bit]
+            if child is None:
+                if not create:
+                    return path
+                child = node.children[bit] = _Node()
+            node = child
+            path.append(node)
+        return path
+
+    def _collect(self, node: _Node, version: int, value: int, depth: int, out: List[Network]) -> None:
+        bits = self._bits(version)
+        stack = [(node, value, depth)]
+        while stack:
+            n, v, d = stack.pop()
+            if n.full:
+                out.append(_network(version, v, d))
+                continue
+            for bit in (1, 0):
+                child = n.children[bit]
+                if child is not None:
+                    stack.append((child, v | (bit << (bits - 1 - d)), d + 1))
+
+    def _set(self, net: Network, value: Any) -> Tuple[List[Network], List[Network]]:
+        path = self._path(net, create=value is not _ABSENT)
+        if len(path) != net.prefixlen + 1:
+            return [], []
+        target = path[-1]
+        # Coverage of every node on the path once the change is made
+        new_full: List[bool] = [False] * len(path)
+        for i in range(len(path) - 1, -1, -1):
+            n = path[i]
+            if i == len(path) - 1:
+                has_value = value is not _ABSENT
+            else:
+                has_value = n.value is not None
+            if has_value:
+                new_full[i] = True
+                continue
+            kids = []
+            for bit in (0, 1):
+                child = n.children[bit]
+                if child is None:
+                    kids.append(False)
+                elif i + 1 < len(path) and child is path[i + 1]:
+                    kids.append(new_full[i + 1])
+                else:
+                    kids.append(child.full)
+            new_full[i] = kids[0] and kids[1]
+        top = next((i for i, n in enumerate(path) if n.full != new_full[i]), None)
+        bits = self._bits(net.version)
+        base = int(net.network_address)
+        removed: List[Network] = []
+        added: List[Network] = []
+        covered = top is None or any(path[j].full for j in range(top))
+        if not covered:
+            prefix = base & (((1 << top) - 1) << (bits - top)) if top else 0
+            self._collect(path[top], net.version, prefix, top, removed)
+        # Apply
+        if value is _ABSENT:
+            if target.value is not None:
+                self._count -= 1
+            target.value = None
+        else:
+            if target.value is None:
+                self._count += 1
+            target.value = value
+        for i, n in enumerate(path):
+            n.full = new_full[i]
+        if not covered:
+            self._collect(path[top], net.version, prefix, top, added)
+            common = set(removed) & set(added)
+            removed = [n for n in removed if n not in common]
+            added = [n for n in added if n not in common]
+        if value is _ABSENT:
+            # Prune branches left without prefixes
+            for i in range(len(path) - 1, 0, -1):
+                n = path[i]
+                if n.value is not None or n.children[0] is not None or n.children[1] is not None:
+                    break
+                parent = path[i - 1]
+                parent.children[parent.children.index(n)] = None
+        return removed, added
+
+    def add(self, net: Network, value: Any = True) -> Tuple[List[Network], List[Network]]:
+        """Store `net` with payload `value` (must not be None)."""
+        return self._set(net, value)
+
+    def remove(self, net: Network) -> Tuple[List[Network], List[Network]]:
+        return self._set(net, _ABSENT)
+
+    def get(self, net: Network) -> Any:
+        path = self._path(net, create=False)
+        return path[-1].value if len(path) == net.prefixlen + 1 else None
+
+    def lookup(self, addr: Address) -> Optional[Tuple[Network, Any]]:
+        """Most specific stored prefix containing `addr`, with its payload."""
+        node: Optional[_Node] = self._roots[addr.version]
+        bits = self._bits(addr.version)
+        value = int(addr)
+        best: Optional[Tuple[int, Any]] = None
+        depth = 0
+        while node is not None:
+            if node.value is not None:
+                best = (depth, node.value)
+            if depth == bits:
+                break
+            node = node.children[(value >> (bits - 1 - depth)) & 1]
+            depth += 1
+        if best is None:
+            return None
+        depth = best[0]
+        return _network(addr.version, value & ~((1 << (bits - depth)) - 1), depth), best[1]
+
+    def collapsed(self, version: Optional[int] = None) -> Iterator[Network]:
+        for v in ((version,) if version else (4, 6)):
+            out: List[Network] = []
+            self._collect(self._roots[v], v, 0, 0, out)
+            yield from out
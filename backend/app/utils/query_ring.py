@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class StringTable:
+    """Reference-counted string interning: each distinct string is stored once and addressed by id."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self._values: List[Optional[str]] = []
+        self._refs = array("I")
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def acquire(self, value: str) -> int:
+        sid = self._ids.get(value)
+        if sid is None:
+            if self._free:
+                sid = self._free.pop()
+                self._values[sid] = value
+                self._refs[sid] = 0
+            else:
+                sid = len(self._values)
+                self._values.append(value)
+                self._refs.append(0)
+            self._ids[value] = sid
+        self._refs[sid] += 1
+        return sid
+
+    def release(self, sid: int) -> None:
+        left = self._refs[sid] - 1
+        self._refs[sid] = left
+        if left == 0:
+            value = self._values[sid]
+            self._values[sid] = None
+            if value is not None:
+                del self._ids[value]
+            self._free.append(sid)
+
+    def lookup(self, sid: int) -> str:
+        return self._values[sid] or ""
+
+
+class QueryRing:
+    """Fixed-capacity columnar ring buffer of (ts, domain, client) DNS queries.
+
+    - Timestamps live in an array('d'); domains and clients are interned ids in array('I')
+    - Timestamps are kept non-decreasing so window lookups are binary searches
+    - Reads only materialize the rows they return
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self._cap = max(1, int(capacity))
+        self._ts = array("d", [0.0]) * self._cap
+        self._dom = array("I", [0]) * self._cap
+        self._cli = array("I", [0]) * self._cap
+        self._start = 0
+        self._len = 0
+        self._strings = StringTable()
+
+    def __len__(self) -> int:
+        return self._len
+
+    @property
+    def capacity(self) -> int:
+        return self._cap
+
+    def append(self, ts: float, domain: str, client: str) -> None:
+        if self._len:
+            last = self._ts[(self._start + self._len - 1) % self._cap]
+            if ts < last:
+                ts = last
+        if self._len == self._cap:
+            slot = self._start
+            self._strings.release(self._dom[slot])
+            self._strings.release(self._cli[slot])
+            self._start = (self._start + 1) % self._cap
+        else:
+            slot = (self._start + self._len) % self._cap
+            self._len += 1
+        self._ts[slot] = ts
+        self._dom[slot] = self._strings.acquire(domain)
+        self._cli[slot] = self._strings.acquire(client)
+
+    def bisect_ts(self, cutoff: float) -> int:
+        """Logical index of the first row with ts >= cutoff."""
+        ts, start, cap = self._ts, self._start, self._cap
+        lo, hi = 0, self._len
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ts[(start + mid) % cap] < cutoff:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def rows(self, first: int = 0, last: Optional[int] = None) -> Iterator[Tuple[float, str, str]]:
+        """Yield (ts, domain, client) for logical indexes [first, last)."""
+        last = self._len if last is None else min(last, self._len)
+        ts, dom, cli, start, cap = self._ts, self._dom, self._cli, self._start, self._cap
+        lookup = self._strings.lookup
+        for i in range(max(0, first), last):
+            slot = (start + i) % cap
+            yield ts[slot], lookup(dom[slot]), lookup(cli[slot])
+
+    def since(self, cutoff: float) -> Iterator[Tuple[float, str, str]]:
+        return self.rows(self.bisect_ts(cutoff))
+
+    def tail(self, limit: int) -> Iterator[Tuple[float, str, str]]:
+        return self.rows(self._len - max(0, limit))
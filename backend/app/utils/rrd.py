@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from typing import List, Optional, Tuple
+
+
+# One consolidated bucket: start ts, sample count, then sum/min/max of the rate and the byte total per direction
+FIELDS = ("start", "count", "rx_sum", "rx_min", "rx_max", "rx_bytes", "tx_sum", "tx_min", "tx_max", "tx_bytes")
+NFIELDS = len(FIELDS)
+START, COUNT, RX_SUM, RX_MIN, RX_MAX, RX_BYTES, TX_SUM, TX_MIN, TX_MAX, TX_BYTES = range(NFIELDS)
+
+MAGIC = b"RGRRD\x00\x01\x00"
+# magic, resolution, capacity, first slot, length
+HEADER = struct.Struct("=8sdqqq")
+HEADER_SIZE = 64
+
+Bucket = List[float]
+
+
+def new_bucket(start: float) -> Bucket:
+    return [start, 0.0, 0.0, float("inf"), float("-inf"), 0.0, 0.0, float("inf"), float("-inf"), 0.0]
+
+
+def add_sample(b: Bucket, rx: float, tx: float, rx_bytes: float, tx_bytes: float) -> None:
+    b[COUNT] += 1
+    b[RX_SUM] += rx
+    b[RX_MIN] = min(b[RX_MIN], rx)
+    b[RX_MAX] = max(b[RX_MAX], rx)
+    b[RX_BYTES] += rx_bytes
+    b[TX_SUM] += tx
+    b[TX_MIN] = min(b[TX_MIN], tx)
+    b[TX_MAX] = max(b[TX_MAX], tx)
+    b[TX_BYTES] += tx_bytes
+
+
+def merge(into: Bucket, b: Bucket) -> None:
+    """Consolidate a closed finer bucket into a coarser one."""
+    into[COUNT] += b[COUNT]
+    into[RX_SUM] += b[RX_SUM]
+    into[RX_MIN] = min(into[RX_MIN], b[RX_MIN])
+    into[RX_MAX] = max(into[RX_MAX], b[RX_MAX])
+    into[RX_BYTES] += b[RX_BYTES]
+    into[TX_SUM] += b[TX_SUM]
+    into[TX_MIN] = min(into[TX_MIN], b[TX_MIN])
+    into[TX_MAX] = max(into[TX_MAX], b[TX_MAX])
+    into[TX_BYTES] += b[TX_BYTES]
+
+
+def bucket_value(b: Bucket, stat: str) -> Tuple[float, float, float]:
+    """(start, rx, tx) for stat "avg", "max" or "min"."""
+    if stat == "max":
+        return b[START], b[RX_MAX], b[TX_MAX]
+    if stat == "min":
+        return b[START], b[RX_MIN], b[TX_MIN]
+    n = max(1.0, b[COUNT])
+    return b[START], b[RX_SUM] / n, b[TX_SUM] / n
+
+
+class Archive:
+    """Round-robin archive of buckets at one resolution, stored in a fixed-size memory-mapped file.
+
+    - A header plus `capacity` rows of NFIELDS doubles; a row lives at a fixed offset, so appending a
+      closed bucket writes one row and the header in place. The file never grows or gets rewritten
+    - The mapping is the storage: reads index straight into it, and the kernel writes dirty pages back
+      (flush() forces it)
+    - A file whose header does not match (other resolution/capacity, corrupt) is set aside and restarted
+    """
+
+    def __init__(self, path: str, resolution: float, capacity: int) -> None:
+        self.path = path
+        self.resolution = float(resolution)
+        self._cap = max(1, int(capacity))
+        size = HEADER_SIZE + self._cap * NFIELDS * 8
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fresh = not os.path.exists(path) or os.path.getsize(path) != size
+        if not fresh:
+            with open(path, "rb") as f:
+                magic, res, cap, first, length = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or res != self.resolution or cap != self._cap or not (0 <= first < cap and 0 <= length <= cap):
+                os.replace(path, path + ".bad")
+                fresh = True
+        if fresh:
+            with open(path, "wb") as f:
+                f.truncate(size)
+            first, length = 0, 0
+        self._fd = os.open(path, os.O_RDWR)
+        self._mm = mmap.mmap(self._fd, size)
+        self._rows = memoryview(self._mm)[HEADER_SIZE:].cast("d")
+        self._first = int(first)
+        self._len = int(length)
+        if fresh:
+            self._write_header()
+
+    def _write_header(self) -> None:
+        HEADER.pack_into(self._mm, 0, MAGIC, self.resolution, self._cap, self._first, self._len)
+
+    def __len__(self) -> int:
+        return self._len
+
+    @property
+    def capacity(self) -> int:
+        return self._cap
+
+    def _slot(self, i: int) -> int:
+        return ((self._first + i) % self._cap) * NFIELDS
+
+    def start_at(self, i: int) -> float:
+        return self._rows[self._slot(i)]
+
+    def row(self, i: int) -> Bucket:
+        off = self._slot(i)
+        return self._rows[off:off + NFIELDS].tolist()
+
+    def last_start(self) -> Optional[float]:
+        return self.start_at(self._len - 1) if self._len else None
+
+    def append(self, b: Bucket) -> None:
+        """Store a closed bucket; buckets must arrive in start order (older ones are ignored)."""
+        last = self.last_start()
+        if last is not None and b[START] <= last:
+            return
+        if self._len == self._cap:
+            off = self._slot(0)
+            self._first = (self._first + 1) % self._cap
+        else:
+            off = self._slot(self._len)
+            self._len += 1
+        rows = self._rows
+        for k in range(NFIELDS):
+            rows[off + k] = b[k]
+        self._write_header()
+
+    def bisect(self, ts: float) -> int:
+        """Logical index of the first bucket starting at or after ts."""
+        lo, hi = 0, self._len
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.start_at(mid) < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def rows(self, start: float, end: Optional[float] = None) -> List[Bucket]:
+        """Buckets starting in [start, end)."""
+        first = self.bisect(start)
+        last = self._len if end is None else self.bisect(end)
+        return [self.row(i) for i in range(first, last)]
+
+    def flush(self) -> None:
+        try:
+            self._mm.flush()
+        except (OSError, ValueError):
+            pass
+
+    def close(self) -> None:
+        self.flush()
+        self._rows.release()
+        self._mm.close()
+        os.close(self._fd)
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+
+MAGIC = b"RGSEG\x00\x01\x00"
+# magic, format version, record size, first record ts, crc32 of the preceding fields
+HEADER = struct.Struct("=8sIIdI4x")
+# ts, rx, tx, crc32 of the three doubles
+RECORD = struct.Struct("=dddI4x")
+_PAYLOAD = struct.Struct("=ddd")
+SUFFIX = ".seg"
+
+
+def _header(first_ts: float) -> bytes:
+    head = struct.pack("=8sIId", MAGIC, 1, RECORD.size, first_ts)
+    return HEADER.pack(MAGIC, 1, RECORD.size, first_ts, zlib.crc32(head))
+
+
+def _record(ts: float, rx: float, tx: float) -> bytes:
+    payload = _PAYLOAD.pack(ts, rx, tx)
+    return RECORD.pack(ts, rx, tx, zlib.crc32(payload))
+
+
+class SegmentLog:
+    """Append-only log of fixed-width (ts, rx, tx) records, split into time-bounded segment files.
+
+    - A segment is a checksummed header followed by 32-byte records, each with its own CRC32, so a
+      torn write at the tail only loses the records it touched
+    - Appends are buffered and written with one write() per flush: disk writes grow with new samples,
+      not with history size
+    - A new segment starts every `segment_seconds`; compaction deletes segments that lie entirely
+      before the retention cutoff, so old data goes away without rewriting anything
+    - Loading maps each segment and unpacks records straight from the mapping
+    """
+
+    def __init__(self, directory: str, segment_seconds: float = 300.0) -> None:
+        self._dir = directory
+        self._segment_seconds = segment_seconds
+        self._lock = threading.Lock()
+        self._buf: List[bytes] = []
+        self._fd: Optional[int] = None
+        self._active_first: Optional[float] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _segments(self) -> List[str]:
+        try:
+            names = sorted(n for n in os.listdir(self._dir) if n.endswith(SUFFIX))
+        except OSError:
+            return []
+        return [os.path.join(self._dir, n) for n in names]
+
+    @staticmethod
+    def _first_ts(path: str) -> float:
+        # File names are the first record's timestamp in ms, zero-padded so they sort chronologically
+        return int(os.path.basename(path)[: -len(SUFFIX)]) / 1000.0
+
+    # ---- writing ----
+    def append(self, ts: float, rx: float, tx: float) -> None:
+        with self._lock:
+            self._buf.append(_record(ts, rx, tx))
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._buf:
+                return
+            buf, self._buf = self._buf, []
+            first_ts = RECORD.unpack_from(buf[0])[0]
+            if self._fd is None or self._active_first is None or first_ts - self._active_first >= self._segment_seconds:
+                self._rotate(first_ts)
+            if self._fd is not None:
+                os.write(self._fd, b"".join(buf))
+
+    def _rotate(self, first_ts: float) -> None:
+        self._close_active()
+        path = os.path.join(self._dir, f"{int(first_ts * 1000):016d}{SUFFIX}")
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o600)
+        except FileExistsError:
+            # Same millisecond as an existing segment (clock stepped back): keep writing to that one
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        else:
+            os.write(fd, _header(first_ts))
+        self._fd = fd
+        self._active_first = first_ts
+
+    def _close_active(self) -> None:
+        if self._fd is not None:
+            try:
+                # A finished segment never changes again: make it durable once
+                os.fsync(self._fd)
+            except OSError:
+                pass
+            os.close(self._fd)
+        self._fd = None
+        self._active_first = None
+
+    def compact(self, cutoff: float) -> int:
+        """Delete segments whose records are all older than `cutoff`; returns how many went."""
+        with self._lock:
+            segments = self._segments()
+            removed = 0
+            # A segment ends where the next one starts; the newest is still being written
+            for path, following in zip(segments, segments[1:]):
+                if self._first_ts(following) > cutoff:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            return removed
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._close_active()
+
+    # ---- reading ----
+    def load(self, cutoff: float = float("-inf")) -> Iterator[Tuple[float, float, float]]:
+        """Yield valid records with ts >= cutoff, oldest first; stops at the first damaged record of a segment."""
+        for path in self._segments():
+            try:
+                with open(path, "rb") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    if size < HEADER.size:
+                        continue
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        magic, version, rec_size, _first, crc = HEADER.unpack_from(mm, 0)
+                        if magic != MAGIC or rec_size != RECORD.size or zlib.crc32(mm[: HEADER.size - 8]) != crc:
+                            continue
+                        end = HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+                        view = memoryview(mm)[HEADER.size:end]
+                        try:
+                            for ts, rx, tx, rec_crc in RECORD.iter_unpack(view):
+                                if zlib.crc32(_PAYLOAD.pack(ts, rx, tx)) != rec_crc:
+                                    break
+                                if ts >= cutoff:
+                                    yield ts, rx, tx
+                        finally:
+                            view.release()
+            except (OSError, ValueError):
+                continue
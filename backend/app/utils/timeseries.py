@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+from array import array
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# (timestamps, rx, tx) as read-only float views over one contiguous range
+SeriesViews = Tuple[memoryview, memoryview, memoryview]
+# (sample count, rx mean, tx mean, rx peak, tx peak)
+WindowStats = Tuple[int, float, float, float, float]
+
+
+class RingSeries:
+    """Fixed-capacity columnar ring of (ts, rx, tx) float samples.
+
+    - Three array('d') columns: 24 bytes per sample live, instead of a tuple of three floats
+    - Every sample is written twice, at slot and slot + capacity, so any run of consecutive samples is
+      contiguous in memory and can be handed out as memoryviews without copying or wrap handling
+    - Timestamps are kept non-decreasing so window lookups are binary searches
+    - Views are only valid until the next append (a slot may be reused); consume them before yielding
+      to the event loop
+    - Two more columns hold running (prefix) sums of rx and tx, so the mean over any index range is
+      two subtractions. They are rebased once per capacity appends to keep their magnitude, and so
+      their rounding error, at the size of the window
+    - For each of the `windows` (seconds, relative to the newest sample) the index of its oldest sample
+      and a monotonic max queue per direction are kept up to date on append, amortized O(1); stats()
+      answers those windows without searching or scanning
+    """
+
+    def __init__(self, capacity: int, windows: Iterable[float] = ()) -> None:
+        self._cap = max(1, int(capacity))
+        self._ts = array("d", [0.0]) * (2 * self._cap)
+        self._rx = array("d", [0.0]) * (2 * self._cap)
+        self._tx = array("d", [0.0]) * (2 * self._cap)
+        self._crx = array("d", [0.0]) * (2 * self._cap)
+        self._ctx = array("d", [0.0]) * (2 * self._cap)
+        self._start = 0
+        self._len = 0
+        # Samples ever appended: the absolute index of the next one
+        self._seq = 0
+        self._since_rebase = 0
+        # Per tracked window: absolute index of its oldest sample, and (index, value) max queues
+        self._heads: Dict[float, int] = {float(w): 0 for w in windows}
+        self._peaks: Dict[float, Tuple[Deque[Tuple[int, float]], Deque[Tuple[int, float]]]] = {
+            w: (deque(), deque()) for w in self._heads
+        }
+
+    def __len__(self) -> int:
+        return self._len
+
+    @property
+    def capacity(self) -> int:
+        return self._cap
+
+    def append(self, ts: float, rx: float, tx: float) -> None:
+        crx = ctx = 0.0
+        if self._len:
+            i = self._start + self._len - 1
+            last = self._ts[i]
+            if ts < last:
+                ts = last
+            crx, ctx = self._crx[i], self._ctx[i]
+        if self._len == self._cap:
+            slot = self._start
+            self._start = (self._start + 1) % self._cap
+        else:
+            slot = (self._start + self._len) % self._cap
+            self._len += 1
+        for col, value in ((self._ts, ts), (self._rx, rx), (self._tx, tx), (self._crx, crx + rx), (self._ctx, ctx + tx)):
+            col[slot] = value
+            col[slot + self._cap] = value
+        seq = self._seq
+        self._seq += 1
+        self._since_rebase += 1
+        if self._since_rebase >= self._cap:
+            self._rebase()
+        for w in self._heads:
+            self._track(w, seq, ts, rx, tx)
+
+    def _rebase(self) -> None:
+        # Subtract the sum of everything before the oldest sample; differences are unchanged
+        self._since_rebase = 0
+        first = self._start
+        base_rx = self._crx[first] - self._rx[first]
+        base_tx = self._ctx[first] - self._tx[first]
+        for i in range(2 * self._cap):
+            self._crx[i] -= base_rx
+            self._ctx[i] -= base_tx
+
+    def _track(self, w: float, seq: int, ts: float, rx: float, tx: float) -> None:
+        head = max(self._heads[w], self._seq - self._len)
+        cutoff = ts - w
+        while head < seq and self._ts[self._start + head - (self._seq - self._len)] < cutoff:
+            head += 1
+        self._heads[w] = head
+        for q, value in zip(self._peaks[w], (rx, tx)):
+            while q and q[-1][1] <= value:
+                q.pop()
+            q.append((seq, value))
+            while q[0][0] < head:
+                q.popleft()
+
+    def bisect_ts(self, cutoff: float, after: bool = False) -> int:
+        """Logical index of the first sample with ts >= cutoff (ts > cutoff with `after`)."""
+        ts, start = self._ts, self._start
+        lo, hi = 0, self._len
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ts[start + mid] < cutoff or (after and ts[start + mid] == cutoff):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def drop_before(self, cutoff: float) -> int:
+        """Forget samples older than `cutoff`; returns how many were dropped."""
+        n = self.bisect_ts(cutoff)
+        if n:
+            self._start = (self._start + n) % self._cap
+            self._len -= n
+        return n
+
+    def sums(self, first: int = 0, last: Optional[int] = None) -> Tuple[int, float, float]:
+        """(count, rx sum, tx sum) of logical indexes [first, last) from the prefix sums, O(1)."""
+        last = self._len if last is None else max(0, min(last, self._len))
+        first = max(0, min(first, last))
+        if first == last:
+            return 0, 0.0, 0.0
+        lo, hi = self._start + first, self._start + last - 1
+        return (
+            last - first,
+            self._crx[hi] - (self._crx[lo] - self._rx[lo]),
+            self._ctx[hi] - (self._ctx[lo] - self._tx[lo]),
+        )
+
+    def aggregate(self, start: float, end: Optional[float] = None) -> WindowStats:
+        """Mean and peak of samples with start <= ts < end: two binary searches, prefix sums for the means and
+        a max over views (no copy) for the peaks."""
+        first = self.bisect_ts(start)
+        last = self._len if end is None else self.bisect_ts(end)
+        n, rx_sum, tx_sum = self.sums(first, last)
+        if not n:
+            return 0, 0.0, 0.0, 0.0, 0.0
+        _ts, rx, tx = self.views(first, last)
+        return n, rx_sum / n, tx_sum / n, max(rx), max(tx)
+
+    def stats(self, window: float) -> Optional[WindowStats]:
+        """Mean and peak over the last `window` seconds before the newest sample, for a window given at
+        construction; None for any other window (use aggregate())."""
+        window = float(window)
+        if window not in self._heads:
+            return None
+        if not self._len:
+            return 0, 0.0, 0.0, 0.0, 0.0
+        oldest = self._seq - self._len
+        n, rx_sum, tx_sum = self.sums(max(self._heads[window], oldest) - oldest)
+        if not n:
+            return 0, 0.0, 0.0, 0.0, 0.0
+        peaks = []
+        for q in self._peaks[window]:
+            # Samples dropped by drop_before() may still head the queue
+            while len(q) > 1 and q[0][0] < oldest:
+                q.popleft()
+            peaks.append(q[0][1])
+        return n, rx_sum / n, tx_sum / n, peaks[0], peaks[1]
+
+    def views(self, first: int = 0, last: Optional[int] = None) -> SeriesViews:
+        """Zero-copy (ts, rx, tx) views of logical indexes [first, last)."""
+        last = self._len if last is None else max(0, min(last, self._len))
+        first = max(0, min(first, last))
+        lo, hi = self._start + first, self._start + last
+        return (
+            memoryview(self._ts)[lo:hi].toreadonly(),
+            memoryview(self._rx)[lo:hi].toreadonly(),
+            memoryview(self._tx)[lo:hi].toreadonly(),
+        )
+
+    def window(self, start: float, end: Optional[float] = None) -> SeriesViews:
+        """Views of samples with start <= ts < end."""
+        return self.views(self.bisect_ts(start), None if end is None else self.bisect_ts(end))
+
+    def points(self, first: int = 0, last: Optional[int] = None) -> List[Tuple[float, float, float]]:
+        """Materialized [(ts, rx, tx), ...] for logical indexes [first, last)."""
+        ts, rx, tx = self.views(first, last)
+        return list(zip(ts.tolist(), rx.tolist(), tx.tolist()))
+
+    def since(self, cutoff: float) -> List[Tuple[float, float, float]]:
+        return self.points(self.bisect_ts(cutoff))
+
+    def __iter__(self) -> Iterator[Tuple[float, float, float]]:
+        return iter(self.points())
+
+    def last(self) -> Optional[Tuple[float, float, float]]:
+        if not self._len:
+            return None
+        i = self._start + self._len - 1
+        return self._ts[i], self._rx[i], self._tx[i]
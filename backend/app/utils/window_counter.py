@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import heapq
+import math
+from operator import itemgetter
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+
+class SlidingWindowCounter:
+    """Time-bucketed per-key counters with running totals for a fixed set of windows.
+
+    - Events are added to the bucket covering their timestamp
+    - Each configured window keeps a running total that is decremented bucket-by-bucket
+      as buckets age out, so reads never rescan raw events
+    - Windows that are not configured are answered by merging buckets (bucket granularity)
+    """
+
+    def __init__(self, bucket_seconds: float = 10.0, windows: Iterable[int] = (60, 300, 600, 3600)) -> None:
+        self._bucket_seconds = float(bucket_seconds)
+        self._windows: List[int] = sorted({int(w) for w in windows if int(w) > 0})
+        if not self._windows:
+            raise ValueError("at least one window is required")
+        self._spans: Dict[int, int] = {w: max(1, math.ceil(w / self._bucket_seconds)) for w in self._windows}
+        self._horizon_span = self._spans[self._windows[-1]]
+        # bucket index -> per-key counts
+        self._buckets: Dict[int, Dict[Hashable, int]] = {}
+        self._totals: Dict[int, Dict[Hashable, int]] = {w: {} for w in self._windows}
+        # per window: oldest bucket index still included in its running total
+        self._floors: Dict[int, int] = {w: 0 for w in self._windows}
+        self._current = 0
+        self._last_added = -1
+
+    @property
+    def windows(self) -> List[int]:
+        return list(self._windows)
+
+    def _index(self, ts: float) -> int:
+        return int(ts // self._bucket_seconds)
+
+    def advance(self, now: float) -> None:
+        """Expire buckets that fell out of each window as of `now`."""
+        cur = self._index(now)
+        if cur <= self._current:
+            return
+        self._current = cur
+        for w in self._windows:
+            new_floor = cur - self._spans[w] + 1
+            floor = self._floors[w]
+            if new_floor <= floor:
+                continue
+            totals = self._totals[w]
+            if new_floor > self._last_added:
+                totals.clear()
+            else:
+                for idx in range(floor, new_floor):
+                    bucket = self._buckets.get(idx)
+                    if not bucket:
+                        continue
+                    for key, n in bucket.items():
+                        left = totals.get(key, 0) - n
+                        if left > 0:
+                            totals[key] = left
+                        else:
+                            totals.pop(key, None)
+            self._floors[w] = new_floor
+        oldest = cur - self._horizon_span + 1
+        if self._buckets and min(self._buckets) < oldest:
+            for idx in [i for i in self._buckets if i < oldest]:
+                del self._buckets[idx]
+
+    def add(self, key: Hashable, now: float, n: int = 1) -> None:
+        self.advance(now)
+        idx = max(self._index(now), self._current)
+        bucket = self._buckets.setdefault(idx, {})
+        bucket[key] = bucket.get(key, 0) + n
+        for totals in self._totals.values():
+            totals[key] = totals.get(key, 0) + n
+        self._last_added = idx
+
+    def counts(self, window_seconds: int, now: float) -> Dict[Hashable, int]:
+        """Return per-key counts within the window. Configured windows are returned by reference."""
+        self.advance(now)
+        window_seconds = min(int(window_seconds), self._windows[-1])
+        totals = self._totals.get(window_seconds)
+        if totals is not None:
+            return totals
+        floor = self._current - max(1, math.ceil(window_seconds / self._bucket_seconds)) + 1
+        merged: Dict[Hashable, int] = {}
+        for idx, bucket in self._buckets.items():
+            if idx < floor:
+                continue
+            for key, n in bucket.items():
+                merged[key] = merged.get(key, 0) + n
+        return merged
+
+    def top(self, window_seconds: int, limit: int, now: float) -> List[Tuple[Hashable, int]]:
+        return heapq.nlargest(max(0, limit), self.counts(window_seconds, now).items(), key=itemgetter(1))
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Service singletons resolve their data directory at import: keep test runs away from the real one
+os.environ.setdefault("APP_DATA_DIR", tempfile.mkdtemp(prefix="routergeist-test-"))
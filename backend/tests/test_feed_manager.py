@@ -0,0 +1,77 @@
+import asyncio
+import re
+from typing import Dict, Set, Tuple
+
+import pytest
+
+import app.services.feed_manager as feed_module
+from app.config import settings
+from app.services.feed_manager import FeedManager
+
+
+class FakeNft:
+    """Stand-in for `nft -f -` that keeps set contents in memory; reboot() empties the kernel."""
+
+    def __init__(self) -> None:
+        self.sets: Dict[str, Set[str]] = {}
+
+    def run(self, script: str, timeout: float = 60.0) -> Tuple[bool, str]:
+        for line in script.splitlines():
+            line = line.strip()
+            if m := re.match(r"^add set \S+ \S+ (\S+) ", line):
+                self.sets.setdefault(m.group(1), set())
+            elif m := re.match(r"^delete set \S+ \S+ (\S+)$", line):
+                self.sets.pop(m.group(1), None)
+            elif m := re.match(r"^flush set \S+ \S+ (\S+)$", line):
+                self.sets[m.group(1)].clear()
+            elif m := re.match(r"^(add|delete) element \S+ \S+ (\S+) \{ (.*) \}$", line):
+                items = {e.strip() for e in m.group(3).split(",")}
+                if m.group(1) == "add":
+                    self.sets[m.group(2)] |= items
+                else:
+                    self.sets[m.group(2)] -= items
+        return True, ""
+
+    def exists(self, name: str) -> bool:
+        return name in self.sets
+
+    def reboot(self) -> None:
+        self.sets.clear()
+
+
+@pytest.fixture
+def nft(monkeypatch: pytest.MonkeyPatch, tmp_path) -> FakeNft:
+    fake = FakeNft()
+    monkeypatch.setattr(settings, "app_data_dir", str(tmp_path / "data"))
+    monkeypatch.setattr(feed_module, "run_nft_script", fake.run)
+    monkeypatch.setattr(feed_module, "nft_set_exists", fake.exists)
+    return fake
+
+
+def test_restart_reloads_feed_into_emptied_sets(nft: FakeNft, tmp_path) -> None:
+    feed_file = tmp_path / "feed.txt"
+    feed_file.write_text("203.0.113.7\n198.51.100.0/24\n")
+
+    async def boot() -> FeedManager:
+        manager = FeedManager()
+        await manager._load_all()
+        return manager
+
+    first = asyncio.run(boot())
+    asyncio.run(first.register("intel", str(feed_file)))
+    assert nft.sets["feed_intel_v4"] == {"203.0.113.7", "198.51.100.0/24"}
+
+    # Reboot: kernel sets gone, snapshot and config still on disk, feed file unchanged
+    nft.reboot()
+    asyncio.run(boot())
+    assert nft.sets["feed_intel_v4"] == {"203.0.113.7", "198.51.100.0/24"}
+
+
+def test_unchanged_feed_is_a_delta_within_one_process(nft: FakeNft, tmp_path) -> None:
+    feed_file = tmp_path / "feed.txt"
+    feed_file.write_text("203.0.113.7\n")
+    manager = FeedManager()
+    asyncio.run(manager.register("intel", str(feed_file)))
+    stats = asyncio.run(manager.reload("intel"))
+    assert stats["ok"] and not stats["full"] and stats["transactions"] == 0
+    assert nft.sets["feed_intel_v4"] == {"203.0.113.7"}
@@ -0,0 +1,43 @@
+from app.services.first_seen_store import FirstSeenStore
+from app.utils.bloom import BloomFilter
+
+
+def _store(capacity: int, recent: int) -> FirstSeenStore:
+    store = FirstSeenStore()
+    store._capacity = capacity
+    store._recent_cap = recent
+    store._current = BloomFilter(capacity)
+    store._previous = None
+    store._recent.clear()
+    store._order.clear()
+    return store
+
+
+def _fill(store: FirstSeenStore, prefix: str, count: int, now: float) -> None:
+    for i in range(count):
+        assert store.observe(f"{prefix}{i}.example", now)
+
+
+def test_domain_still_in_use_survives_rotation() -> None:
+    store = _store(capacity=50, recent=5)
+    assert store.observe("kept.example", 0.0)
+    _fill(store, "a", 60, 1.0)  # rotates once: kept.example now only in the previous generation
+    assert not store.observe("kept.example", 2.0)  # found there and carried into the current one
+    _fill(store, "b", 60, 3.0)  # rotates again: the generation it was first recorded in is gone
+    assert not store.observe("kept.example", 4.0)
+
+
+def test_recent_domains_are_copied_into_a_new_generation() -> None:
+    store = _store(capacity=50, recent=10)
+    _fill(store, "a", 50, 0.0)  # current generation is full
+    assert store.observe("rotating.example", 1.0)  # starts a new generation
+    assert all(f"a{i}.example" in store._current for i in range(41, 50))
+
+
+def test_domain_forgotten_with_its_generation_is_reported_again() -> None:
+    # Documented false positive: last seen before the previous generation began
+    store = _store(capacity=50, recent=5)
+    assert store.observe("rare.example", 0.0)
+    _fill(store, "a", 60, 1.0)
+    _fill(store, "b", 60, 2.0)
+    assert store.observe("rare.example", 3.0)
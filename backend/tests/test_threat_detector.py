@@ -0,0 +1,140 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List, Set
+
+import pytest
+
+import app.services.threat_detector as detector_module
+from app.config import settings
+from app.services.threat_detector import ThreatDetector, host_address
+from app.services.verdict_cache import VerdictCache
+
+
+class FakeCompletions:
+    """Stand-in for the chat completions endpoint: records prompts, answers with a canned reply."""
+
+    def __init__(self) -> None:
+        self.prompts: List[str] = []
+        self.reply = "[]"
+
+    async def create(self, model: str, messages: List[Dict[str, Any]], temperature: float) -> Any:
+        self.prompts.append(messages[-1]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply))])
+
+
+class FakeBlocklist:
+    def __init__(self) -> None:
+        self.added: Set[str] = set()
+
+    def contains(self, addr: str) -> bool:
+        return addr in self.added
+
+    def add_auto(self, addr: str) -> None:
+        self.added.add(addr)
+
+
+@pytest.fixture
+def completions(monkeypatch: pytest.MonkeyPatch, tmp_path) -> FakeCompletions:
+    fake = FakeCompletions()
+    monkeypatch.setattr(settings, "app_data_dir", str(tmp_path / "data"))
+    monkeypatch.setattr(detector_module, "verdict_cache", VerdictCache())
+    monkeypatch.setattr(detector_module, "blocklist_store", FakeBlocklist())
+    monkeypatch.setattr(ThreatDetector, "_api_key", lambda self: "test-key")
+    monkeypatch.setattr(ThreatDetector, "_get_client", lambda self, key: SimpleNamespace(chat=SimpleNamespace(completions=fake)))
+    return fake
+
+
+def _listing(prompt: str) -> List[str]:
+    return [line for line in prompt.split("Events:\n", 1)[1].splitlines() if line]
+
+
+def test_queued_events_share_one_request(completions: FakeCompletions) -> None:
+    completions.reply = json.dumps([
+        {"id": 0, "severity": "medium", "explanation": "beaconing", "ip": "203.0.113.7"},
+        {"id": 1, "severity": "low", "explanation": "noise", "ip": None},
+    ])
+
+    async def run() -> List[Any]:
+        detector = ThreatDetector()
+        events = [
+            await detector.analyze("syslog", "odd beacon to 203.0.113.7"),
+            await detector.analyze("syslog", "odd beacon to 203.0.113.7"),
+            await detector.analyze("syslog", "kernel: martian source"),
+        ]
+        assert all(e.context["analyzer"] == "pending" for e in events)
+        worker = asyncio.create_task(detector._worker())
+        await asyncio.wait_for(detector._queue.join(), timeout=5)
+        worker.cancel()
+        await asyncio.wait([worker])
+        return events
+
+    events = asyncio.run(run())
+    assert len(completions.prompts) == 1
+    # Repeats of one message share a prompt line
+    assert _listing(completions.prompts[0]) == ["0. [syslog] odd beacon to 203.0.113.7", "1. [syslog] kernel: martian source"]
+    assert [e.severity for e in events] == ["medium", "medium", "low"]
+    assert all(e.context == {"analyzer": "llm"} for e in events)
+    assert events[0].explanation == "beaconing"
+
+
+def test_full_queue_keeps_the_rules_verdict(completions: FakeCompletions, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "llm_queue_size", 1)
+
+    async def run() -> List[Any]:
+        detector = ThreatDetector()
+        return [await detector.analyze("syslog", f"unusual event {i}") for i in range(2)]
+
+    queued, dropped = asyncio.run(run())
+    assert queued.context["analyzer"] == "pending"
+    assert dropped.context == {"analyzer": "rules", "reason": "no rule matched", "degraded": True}
+    assert dropped.severity == "info"
+    assert completions.prompts == []
+
+
+def test_model_cannot_block_a_network(completions: FakeCompletions) -> None:
+    completions.reply = json.dumps([{"id": 0, "severity": "critical", "explanation": "scan", "ip": "0.0.0.0/1"}])
+
+    async def run() -> Any:
+        detector = ThreatDetector()
+        event = await detector.analyze("syslog", "port sweep from the internet")
+        await detector._enrich(await detector._next_batch())
+        return event
+
+    event = asyncio.run(run())
+    assert event.severity == "critical"
+    assert event.ip is None
+    assert event.action is None
+    assert detector_module.blocklist_store.added == set()
+
+
+def test_parse_verdicts_skips_bad_items() -> None:
+    parse = ThreatDetector()._parse_verdicts
+    text = 'Sure:\n[{"id": 1, "severity": "HIGH", "explanation": "x"}, "junk", {"id": 9, "severity": "low"}, {"id": "a", "severity": "bogus", "explanation": "medium risk"}]'
+    verdicts = parse(text, 4)
+    assert set(verdicts) == {1, 3}
+    assert verdicts[1]["severity"] == "high"
+    # Unknown severity falls back to the explanation's keywords; a bad id to the item's position
+    assert verdicts[3]["severity"] == "medium"
+
+
+def test_parse_verdicts_truncated_reply() -> None:
+    parse = ThreatDetector()._parse_verdicts
+    assert parse('[{"id": 0, "severity": "high", "explanation": "cut o', 2) == {}
+    assert parse("", 1) == {}
+    # A lone event keeps a free-form or single-object answer
+    single = parse('{"severity": "low", "explanation": "benign", "ip": "198.51.100.0/24"}', 1)
+    assert single[0] == {"severity": "low", "explanation": "benign", "ip": None}
+    assert parse("This looks critical.", 1)[0]["severity"] == "critical"
+
+
+def test_parse_verdicts_keeps_host_addresses_only() -> None:
+    parse = ThreatDetector()._parse_verdicts
+    reply = json.dumps([
+        {"id": 0, "severity": "high", "ip": " 203.0.113.7 "},
+        {"id": 1, "severity": "high", "ip": "0.0.0.0/1"},
+        {"id": 2, "severity": "high", "ip": "10.0.0.1-10.0.0.9"},
+    ])
+    assert [v["ip"] for _i, v in sorted(parse(reply, 3).items())] == ["203.0.113.7", None, None]
+    assert host_address("2001:DB8::1") == "2001:db8::1"
+    assert host_address("::/0") is None
@@ -0,0 +1,17 @@
+from app.services.verdict_cache import message_signature, normalize_message
+
+
+def test_severity_is_part_of_the_signature() -> None:
+    sev1 = "Suricata alert: ET SCAN Nmap (sev=1) src=203.0.113.7 dst=192.168.1.10"
+    sev3 = "Suricata alert: ET SCAN Nmap (sev=3) src=203.0.113.7 dst=192.168.1.10"
+    assert message_signature("suricata", sev1) != message_signature("suricata", sev3)
+    fast1 = "[1:2001219:20] ET SCAN Potential SSH Scan [Priority: 1] {TCP} 203.0.113.7:4711 -> 192.168.1.10:22"
+    fast2 = "[1:2001219:20] ET SCAN Potential SSH Scan [Priority: 2] {TCP} 203.0.113.7:4711 -> 192.168.1.10:22"
+    assert message_signature("suricata", fast1) != message_signature("suricata", fast2)
+
+
+def test_variable_fields_still_share_a_signature() -> None:
+    a = "[1:2001219:20] ET SCAN Potential SSH Scan [Priority: 2] {TCP} 203.0.113.7:4711 -> 192.168.1.10:22"
+    b = "[1:2001219:21] ET SCAN Potential SSH Scan [Priority: 2] {TCP} 198.51.100.9:5123 -> 192.168.1.11:22"
+    assert message_signature("suricata", a) == message_signature("suricata", b)
+    assert "sev:2" in normalize_message(a)
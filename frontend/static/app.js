@@ -13,15 +13,55 @@ async function ensureAuth(){
   catch{ location.href = '/static/login.html'; }
 }
 
+// Live push channel: one WebSocket carrying every subscribed panel's updates. While it is open the
+// matching pollers pause. After each (re)connect every topic resyncs over HTTP once; pushes that
+// arrive meanwhile are held back and applied afterwards.
+const live = { open: false, topics: {}, retry: 1000 };
+
+function liveTopic(name, resync, apply){ live.topics[name] = { resync, apply }; }
+
+function liveDispatch(msg){
+  const t = live.topics[msg.topic];
+  if(t){ try{ t.apply(msg.items || []); }catch{} }
+}
+
+function liveConnect(){
+  if(typeof WebSocket === 'undefined') return;
+  const ws = new WebSocket(`${location.protocol === 'https:' ? 'wss' : 'ws'}://${location.host}/api/live/ws`);
+  let backlog = [];
+  ws.onopen = async ()=>{
+    live.retry = 1000;
+    ws.send(JSON.stringify({ subscribe: Object.keys(live.topics) }));
+    await Promise.all(Object.values(live.topics).map(t=> Promise.resolve().then(t.resync).catch(()=>{})));
+    if(ws.readyState !== WebSocket.OPEN) return;
+    const held = backlog; backlog = null;
+    live.open = true;
+    held.forEach(liveDispatch);
+  };
+  ws.onmessage = (ev)=>{
+    let msg; try{ msg = JSON.parse(ev.data); }catch{ return; }
+    if(backlog) backlog.push(msg); else liveDispatch(msg);
+  };
+  ws.onclose = ()=>{
+    live.open = false;
+    setTimeout(liveConnect, live.retry);
+    live.retry = Math.min(30000, live.retry * 2);
+  };
+}
+
 async function loadInterfaces(){
   const data = await api('/api/interfaces/');
+  renderInterfaces(data.interfaces);
+}
+
+function renderInterfaces(interfaces){
   const el = document.getElementById('interfaces');
   el.innerHTML = '';
   const table = document.createElement('table');
   table.className = 'iface-table';
   table.innerHTML = `<thead><tr><th>Name</th><th>Type</th><th>State</th><th>IPv4</th><th>Role</th><th class="th-actions"></th></tr></thead>`;
   const tbody = document.createElement('tbody');
-  for(const i of data.interfaces){
+  for(const i of interfaces){
     const tr = document.createElement('tr');
     const roleBadge = i.role === 'AP' ? '<span class="badge ap">AP</span>' : i.role === 'WAN' ? '<span class="badge wan">WAN</span>' : '<span class="badge">—</span>';
     tr.innerHTML = `<td>${i.name}</td><td>${i.is_wireless ? 'Wi‑Fi' : 'Ethernet'}</td><td>${i.is_up ? 'up' : 'down'}</td><td>${(i.ipv4_addresses||[]).join(', ')||'—'}</td><td>${roleBadge}</td>`;
@@ -44,17 +84,32 @@ async function assignRole(name, role){
   }catch(e){ alert('Failed: ' + e.message); }
 }
 
+// Threat events by id; polls only fetch what was created or updated since `threatCursor`
+const threatEvents = new Map();
+let threatCursor = null;
+
 async function loadThreats(){
-  const data = await api('/api/threats/');
+  let data;
+  do{
+    data = await api('/api/threats/' + (threatCursor !== null ? `?cursor=${threatCursor}` : ''));
+    for(const ev of data.events){ threatEvents.delete(ev.id); threatEvents.set(ev.id, ev); }
+    threatCursor = data.cursor;
+  }while(data.more);
+  renderThreats();
+}
+
+function renderThreats(){
+  const events = Array.from(threatEvents.values()).sort((a,b)=> new Date(a.timestamp) - new Date(b.timestamp));
+  for(const ev of events.slice(0, Math.max(0, events.length - 200))) threatEvents.delete(ev.id);
   const el = document.getElementById('threats');
   el.innerHTML = '';
-  if(!data.events.length){ el.innerHTML = '<p class="muted">No events.</p>'; return; }
+  if(!events.length){ el.innerHTML = '<p class="muted">No events.</p>'; return; }
   const table = document.createElement('table');
   table.innerHTML = `<thead><tr><th>Time</th><th>Severity</th><th>Source</th><th>Message</th><th>IP</th><th>Action</th><th></th></tr></thead>`;
   const tbody = document.createElement('tbody');
-  for(const ev of data.events.slice(-50).reverse()){
+  for(const ev of events.slice(-50).reverse()){
     const tr = document.createElement('tr');
-    tr.innerHTML = `<td>${new Date(ev.timestamp).toLocaleString()}</td><td>${ev.severity}</td><td>${ev.source}</td><td title="${ev.explanation||''}">${ev.message}</td><td>${ev.ip||'—'}</td><td>${ev.action||'—'}</td>`;
+    tr.innerHTML = `<td>${new Date(ev.timestamp).toLocaleString()}</td><td>${ev.severity}</td><td>${ev.source}</td><td title="${ev.explanation||''}">${ev.message}${ev.count>1?` <span class="muted">×${ev.count}</span>`:''}</td><td>${ev.ip||'—'}</td><td>${ev.action||'—'}</td>`;
     const td = document.createElement('td');
     const btn = document.createElement('button'); btn.className='small'; btn.textContent='Why?'; btn.onclick = ()=> showWhy(ev);
     td.appendChild(btn); tr.appendChild(td);
@@ -94,22 +149,32 @@ async function init(){
   await loadNewDomains();
   await loadActivity();
   await refreshBlocklist();
-  setInterval(()=>isTabActive('interfaces')&&loadInterfaces(), 5000);
-  setInterval(()=>isTabActive('security')&&loadThreats(), 7000);
+  liveTopic('interfaces', loadInterfaces, items=>{ const last = items[items.length-1]; if(last) renderInterfaces(last.interfaces); });
+  liveTopic('threats', loadThreats, items=>{ for(const ev of items){ threatEvents.delete(ev.id); threatEvents.set(ev.id, ev); } renderThreats(); });
+  liveTopic('dns', loadDomains, items=>{ for(const rows of items) recentDomains.push(...rows); recentDomains = recentDomains.slice(-100); renderDomains(); });
+  liveTopic('activity', loadActivity, items=>{ const last = items[items.length-1]; if(last) renderActivity(last); });
+  liveTopic('blocklist', refreshBlocklist, items=>{
+    for(const it of items){ if(it.op === 'add') blocklistEntries.set(it.entry.ip, it.entry); else blocklistEntries.delete(it.ip); }
+    renderBlocklist();
+  });
+  liveConnect();
+  // Pollers below only run while the live channel is down
+  setInterval(()=>isTabActive('interfaces')&&!live.open&&loadInterfaces(), 5000);
+  setInterval(()=>isTabActive('security')&&!live.open&&loadThreats(), 7000);
   // traffic chart is animated via requestAnimationFrame; no interval needed
-  setInterval(()=>isTabActive('analytics')&&loadDomains(), 8000);
+  setInterval(()=>isTabActive('analytics')&&!live.open&&loadDomains(), 8000);
   setInterval(()=>isTabActive('analytics')&&loadTopDomains(), 10000);
   setInterval(()=>isTabActive('analytics')&&loadSummary(), 6000);
   setInterval(()=>isTabActive('analytics')&&loadConnections(), 12000);
   setInterval(()=>isTabActive('analytics')&&loadTopDomainsByClient(), 12000);
   setInterval(()=>isTabActive('analytics')&&loadClientsByDomain(), 15000);
   setInterval(()=>isTabActive('analytics')&&loadNewDomains(), 30000);
-  setInterval(()=>isTabActive('analytics')&&loadActivity(), 2000);
+  setInterval(()=>isTabActive('analytics')&&!live.open&&loadActivity(), 2000);
   // Persist per-minute WAN averages for long-term charts (guarded)
   if(typeof recordLongTermSample === 'function'){
     setInterval(recordLongTermSample, 60000);
   }
-  setInterval(()=>isTabActive('security')&&refreshBlocklist(), 8000);
+  setInterval(()=>isTabActive('security')&&!live.open&&refreshBlocklist(), 8000);
   setupTabs();
   // Bind buttons to avoid inline handlers (CSP safe)
   const saveKeyBtn = document.getElementById('saveKeyBtn'); if(saveKeyBtn) saveKeyBtn.addEventListener('click', saveOpenAIKey);
@@ -136,8 +201,11 @@ async function loadOpenAIState(){
 }
 
 async function loadActivity(){
+  try{ renderActivity(await api('/api/stats/activity')); }catch{}
+}
+
+function renderActivity(data){
   try{
-    const data = await api('/api/stats/activity');
     const el = document.getElementById('activity'); if(!el) return;
     el.innerHTML='';
     const table = document.createElement('table');
@@ -303,13 +371,51 @@ async function startTrafficChart(){
   }
   // optional NIC selector (legacy single-chart UI)
   const nicSel = document.getElementById('trafficNic');
+  // Full history is fetched once; later polls pass the cursor and only receive new points
+  const series = {};
+  let cursor = null;
+  let summaryData = null, summaryFetch = 0, inFlight = false;
+  // Polled deltas and live pushes share one shape; points at or before a NIC's last one are skipped
+  function mergeTraffic(tData){
+    for(const [nic, pts] of Object.entries(tData.pernic || {})){
+      const arr = series[nic] || (series[nic] = []);
+      const last = arr.length ? arr[arr.length-1][0] : -Infinity;
+      for(const p of pts) if(p[0] > last) arr.push(p);
+    }
+    if(cursor === null || tData.cursor > cursor) cursor = tData.cursor;
+    // Same one-hour window as the backend keeps
+    const cutoff = (cursor || Date.now()/1000) - 3600;
+    for(const arr of Object.values(series)){
+      let drop = 0; while(drop < arr.length && arr[drop][0] < cutoff) drop++;
+      if(drop) arr.splice(0, drop);
+    }
+  }
+  async function pollTraffic(){
+    // The first load is downsampled server-side to about two points per pixel; deltas come raw
+    const width = Math.max(320, (single || cvsWan || cvsLan).clientWidth || 800);
+    mergeTraffic(await api('/api/stats/traffic' + (cursor !== null ? `?since=${cursor}` : `?points=${2*width}&method=minmax`)));
+  }
+  liveTopic('traffic', pollTraffic, items=> items.forEach(mergeTraffic));
+  async function fetchTraffic(){
+    // While the live channel is open new points arrive as pushes
+    if(!live.open || cursor === null) await pollTraffic();
+    return series;
+  }
+  async function fetchSummary(){
+    // Roles change rarely: refresh every few seconds rather than on every traffic poll
+    if(!summaryData || (performance.now() - summaryFetch) > 5000){
+      summaryData = await api('/api/stats/summary');
+      summaryFetch = performance.now();
+    }
+    return summaryData;
+  }
   async function fetchData(){
+    // A slow poll must not overlap the next one, or the same delta would be appended twice
+    if(inFlight) return;
+    inFlight = true;
     try{
-      const [tData, sData] = await Promise.all([
-        api('/api/stats/traffic'),
-        api('/api/stats/summary')
-      ]);
-      const pernic = tData.pernic || {}; const nics = Object.keys(pernic);
+      const [pernic, sData] = await Promise.all([fetchTraffic(), fetchSummary()]);
+      const nics = Object.keys(pernic);
       if(nics.length===0) return;
       // Prefer roles from summary when available
       const perSummary = (sData && sData.pernic) ? sData.pernic : {};
@@ -344,8 +450,8 @@ async function startTrafficChart(){
         }
         __traffic.nic = bestWan || (candidates[0] || nics[0]);
         const lanPick = bestLan && bestLan !== __traffic.nic ? bestLan : ((candidates.find(n=>n!==__traffic.nic)) || __traffic.nic);
-        __traffic.buffer = (pernic[__traffic.nic] || []).slice(-7200);
-        __traffic.bufferLan = (pernic[lanPick] || []).slice(-7200);
+        __traffic.buffer = pernic[__traffic.nic] || [];
+        __traffic.bufferLan = pernic[lanPick] || [];
         if(wanNicName) wanNicName.textContent = __traffic.nic;
         if(lanNicName) lanNicName.textContent = lanPick;
         __traffic.lanNic = lanPick;
@@ -370,9 +476,8 @@ async function startTrafficChart(){
         nicSel.addEventListener('change', ()=>{ __traffic.nic = nicSel.value; });
       }
       if(!__traffic.nic){ __traffic.nic = nicSel && nicSel.value ? nicSel.value : nics[0]; if(nicSel && !nicSel.value) nicSel.value = __traffic.nic; }
-      const points = pernic[__traffic.nic] || [];
-      // Backend now keeps 1 hour at ~2 Hz. We keep the whole hour (7200 points max)
-      __traffic.buffer = points.slice(-7200);
+      // Backend keeps 1 hour; so does the series store above
+      __traffic.buffer = pernic[__traffic.nic] || [];
       __traffic.lastFetch = performance.now();
       if(!__traffic.ltLastFetch || (performance.now() - __traffic.ltLastFetch) > 30000){
         try{
@@ -384,6 +489,7 @@ async function startTrafficChart(){
         }catch{}
       }
     }catch{}
+    finally{ inFlight = false; }
   }
   function draw(){
     if(isDual){
@@ -612,7 +718,7 @@ async function startLongTermCharts(){
     if(!wan) return;
     try{
       if(ctx24){
-        const d24 = await api(`/api/stats/longterm?window_seconds=${24*3600}&nic=${encodeURIComponent(wan)}`);
+        const d24 = await api(`/api/stats/longterm?window_seconds=${24*3600}&nic=${encodeURIComponent(wan)}&points=${ltPoints(c24)}`);
         let pts24 = (d24.pernic && d24.pernic[wan]) ? d24.pernic[wan] : [];
         if((!pts24 || pts24.length < 2)){
           // Fallback: aggregate all NICs so user still sees activity
@@ -623,7 +729,7 @@ async function startLongTermCharts(){
         drawLongTerm(c24, ctx24, pts24, 24*3600);
       }
       if(ctx7){
-        const d7 = await api(`/api/stats/longterm?window_seconds=${7*24*3600}&nic=${encodeURIComponent(wan)}`);
+        const d7 = await api(`/api/stats/longterm?window_seconds=${7*24*3600}&nic=${encodeURIComponent(wan)}&points=${ltPoints(c7)}`);
         let pts7 = (d7.pernic && d7.pernic[wan]) ? d7.pernic[wan] : [];
         if((!pts7 || pts7.length < 2)){
           const all7 = await api(`/api/stats/longterm?window_seconds=${7*24*3600}`);
@@ -635,6 +741,9 @@ async function startLongTermCharts(){
     }catch{}
   }
 
+  // Min/max per pixel column keeps peaks; the server does the reduction
+  function ltPoints(cvs){ return 2 * Math.max(320, cvs.clientWidth || 800); }
+
   function mergeAllNics(pernic){
     // Merge by minute bucket to handle slightly different sample times
     const bucket = new Map();
@@ -673,22 +782,40 @@ function isTabActive(name){
 async function blockIpNow(){
   const ip = document.getElementById('blockIp').value.trim();
   if(!ip) return;
+  const durEl = document.getElementById('blockDuration');
+  const duration = durEl && durEl.value ? parseInt(durEl.value, 10) : null;
   try{
-    await api('/api/security/block', { method:'POST', body: JSON.stringify({ ip }) });
+    await api('/api/security/block', { method:'POST', body: JSON.stringify({ ip, duration }) });
     await refreshBlocklist();
     document.getElementById('blockIp').value='';
   }catch(e){ alert('Block failed: '+e.message); }
 }
 
+// Blocklist entries by ip; live pushes add/remove single entries
+const blocklistEntries = new Map();
+
 async function refreshBlocklist(){
   try{
     const data = await api('/api/security/blocklist');
+    blocklistEntries.clear();
+    (data.entries||[]).forEach(e=> blocklistEntries.set(e.ip, e));
+    renderBlocklist();
+  }catch{}
+}
+
+function renderBlocklist(){
+  try{
     const el = document.getElementById('blocklist'); if(!el) return;
     el.innerHTML = '';
     const table = document.createElement('table');
-    table.innerHTML = '<thead><tr><th>Blocked IPs</th></tr></thead>';
+    table.innerHTML = '<thead><tr><th>Blocked IPs</th><th>Source</th><th>Expires</th></tr></thead>';
     const tbody = document.createElement('tbody');
-    (data.ips||[]).forEach(ip=>{ const tr = document.createElement('tr'); tr.innerHTML = `<td>${ip}</td>`; tbody.appendChild(tr); });
+    Array.from(blocklistEntries.values()).sort((a,b)=> a.ip < b.ip ? -1 : 1).forEach(e=>{
+      const tr = document.createElement('tr');
+      const expires = e.expires_at ? new Date(e.expires_at*1000).toLocaleString() : 'never';
+      tr.innerHTML = `<td>${e.ip}</td><td>${e.source}</td><td>${expires}</td>`;
+      tbody.appendChild(tr);
+    });
     table.appendChild(tbody);
     el.appendChild(table);
   }catch{}
@@ -810,10 +937,20 @@ async function logoutNow(){
   location.href = '/static/login.html';
 }
 
+// Most recent DNS queries as [ts, domain]; live pushes append to it
+let recentDomains = [];
+
 async function loadDomains(){
   try{
     const data = await api('/api/stats/domains?limit=100');
-    const list = data.recent || [];
+    recentDomains = data.recent || [];
+    renderDomains();
+  }catch{}
+}
+
+function renderDomains(){
+  try{
+    const list = recentDomains;
     const el = document.getElementById('domains');
     if(!el) return;
     el.innerHTML = '';